@@ -20,6 +20,40 @@ DISCORDPROXY_HOST = getattr(settings, "DISCORDPROXY_HOST", "localhost")
 # Timeout for Discord Proxy communication
 DISCORDPROXY_TIMEOUT = getattr(settings, "DISCORDPROXY_TIMEOUT", 300)
 
+# Timeout for a Discord DM about a new personal message (in seconds).
+# Failed DMs are retried in the background, so this can be short.
+AA_FORUM_DISCORD_DM_TIMEOUT = getattr(settings, "AA_FORUM_DISCORD_DM_TIMEOUT", 30)
+
+# How many requests to Discord Proxy can run at the same time per process
+AA_FORUM_DISCORDPROXY_MAX_CONCURRENT_REQUESTS = getattr(
+    settings, "AA_FORUM_DISCORDPROXY_MAX_CONCURRENT_REQUESTS", 10
+)
+
+# How long the number of unread topics in the sidebar menu is cached (in seconds)
+AA_FORUM_UNREAD_TOPICS_COUNT_CACHE_TIMEOUT = getattr(
+    settings, "AA_FORUM_UNREAD_TOPICS_COUNT_CACHE_TIMEOUT", 60
+)
+
+# Search backend: auto, mysql, postgresql or python (see aa_forum.search.backends)
+AA_FORUM_SEARCH_BACKEND = getattr(settings, "AA_FORUM_SEARCH_BACKEND", "auto")
+
+# Length of the excerpts shown for search results (in characters)
+AA_FORUM_SEARCH_SNIPPET_LENGTH = getattr(
+    settings, "AA_FORUM_SEARCH_SNIPPET_LENGTH", 300
+)
+
+# Languages of the stopwords that are left out of searches, e.g. ["en", "de"].
+# None uses the stopwords of all languages.
+AA_FORUM_SEARCH_STOPWORD_LANGUAGES = getattr(
+    settings, "AA_FORUM_SEARCH_STOPWORD_LANGUAGES", None
+)
+
+# Search results are only counted up to this number, more are shown as e.g.
+# "1000+ Results". None counts all search results.
+AA_FORUM_SEARCH_RESULTS_COUNT_LIMIT = getattr(
+    settings, "AA_FORUM_SEARCH_RESULTS_COUNT_LIMIT", None
+)
+
 
 def discordproxy_installed() -> bool:
     """
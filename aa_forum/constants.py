@@ -3,8 +3,6 @@ Constants
 """
 
 # Standard Library
-import glob
-import json
 import os
 from enum import Enum
 
@@ -30,14 +28,6 @@ INTERNAL_URL_PREFIX = "-"
 # Default sort order for new categories and boards
 DEFAULT_CATEGORY_AND_BOARD_SORT_ORDER = 999999
 
-# Search stop words. These words and characters will be removed from the search phrase
-SEARCH_STOPWORDS = ['"', "<", ">", "(", ")", "{", "}"]
-
-# Add stopwords from all files (Files downloaded from: https://github.com/stopwords-iso)
-for file in glob.glob(os.path.join(APP_BASE_DIR, "search/stopwords", "*.json")):
-    with open(file, encoding="utf-8") as f:
-        SEARCH_STOPWORDS.extend(json.load(f))
-
 
 class DiscordEmbedColor(Enum):
     """
@@ -58,3 +48,7 @@ DISCORD_EMBED_COLOR_MAP = {
 }
 
 DISCORD_EMBED_MESSAGE_LENGTH = 1000
+
+# Discord limits for a single webhook message
+DISCORD_WEBHOOK_MAX_EMBEDS = 10
+DISCORD_WEBHOOK_MAX_EMBED_CHARACTERS = 6000
@@ -266,6 +266,18 @@ class EditBoardForm(ModelForm):
         if groups_queryset:
             self.fields["groups"].queryset = groups_queryset
 
+        self.fields["discord_webhook_reply_window"].required = False
+
+    def clean_discord_webhook_reply_window(self) -> int:
+        """
+        An empty reply window means replies are posted right away
+
+        :return:
+        :rtype:
+        """
+
+        return self.cleaned_data["discord_webhook_reply_window"] or 0
+
     class Meta:  # pylint: disable=too-few-public-methods
         """
         Meta definitions
@@ -279,6 +291,7 @@ class EditBoardForm(ModelForm):
             "groups",
             "discord_webhook",
             "use_webhook_for_replies",
+            "discord_webhook_reply_window",
             "is_announcement_board",
             "announcement_groups",
         ]
@@ -290,6 +303,9 @@ class EditBoardForm(ModelForm):
             "use_webhook_for_replies": _(
                 "Use this Discord webhook for replies as well?"
             ),
+            "discord_webhook_reply_window": _(
+                "Collect replies for Discord (in seconds)"
+            ),
             "is_announcement_board": _('Mark board as "Announcement Board"'),
             "announcement_groups": _(
                 'Start topic restrictions for "Announcement Boards"'
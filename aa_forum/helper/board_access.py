@@ -0,0 +1,165 @@
+"""
+Helper functions for the boards a user has access to
+"""
+
+# Standard Library
+import hashlib
+
+# Django
+from django.core.cache import cache
+from django.db.models import Q
+
+# Alliance Auth
+from allianceauth.authentication.models import User
+
+# Cache timeout for the group IDs of a user and the boards they can see (in seconds)
+BOARD_ACCESS_CACHE_TIMEOUT = 3600
+
+# Changes whenever boards, their groups or group memberships change
+BOARD_ACCESS_GENERATION_CACHE_KEY = "aa_forum:board_access:generation"
+
+
+def _user_group_ids_cache_key(user_id: int) -> str:
+    """
+    Cache key for the group IDs of a user
+
+    :param user_id:
+    :type user_id:
+    :return:
+    :rtype:
+    """
+
+    return f"aa_forum:board_access:user:{user_id}"
+
+
+def _visible_board_ids_cache_key(group_ids: tuple, generation: int) -> str:
+    """
+    Cache key for the boards that can be seen with a set of groups
+
+    Users with the same groups share it.
+
+    :param group_ids: Sorted group IDs
+    :type group_ids:
+    :param generation:
+    :type generation:
+    :return:
+    :rtype:
+    """
+
+    groups_hash = hashlib.sha256(
+        ",".join(str(group_id) for group_id in group_ids).encode()
+    ).hexdigest()
+
+    return f"aa_forum:board_access:boards:{generation}:{groups_hash}"
+
+
+def _get_user_group_ids(user: User, generation: int, cached: dict) -> tuple:
+    """
+    Get the sorted group IDs of a user from the cache, or fetch them
+
+    :param user:
+    :type user:
+    :param generation:
+    :type generation:
+    :param cached: Result of the cache lookup
+    :type cached:
+    :return:
+    :rtype:
+    """
+
+    cache_key = _user_group_ids_cache_key(user_id=user.pk)
+
+    try:
+        cached_generation, group_ids = cached[cache_key]
+    except KeyError:
+        pass
+    else:
+        if cached_generation == generation:
+            return group_ids
+
+    group_ids = tuple(
+        user.groups.order_by("pk").values_list("pk", flat=True).distinct()
+    )
+
+    cache.set(
+        key=cache_key,
+        value=(generation, group_ids),
+        timeout=BOARD_ACCESS_CACHE_TIMEOUT,
+    )
+
+    return group_ids
+
+
+def get_visible_board_ids(user: User) -> list[int] | None:
+    """
+    Get the IDs of the boards a user has access to
+
+    Boards are visible to their groups, boards without groups to everyone.
+    The result is cached per set of groups, so it can be shared between users,
+    until boards, their groups or group memberships change.
+
+    :param user:
+    :type user:
+    :return: `None` for forum managers, who have access to all boards
+    :rtype:
+    """
+
+    # Forum manager always has access, so assign this permission wisely
+    if user.has_perm(perm="aa_forum.manage_forum"):
+        return None
+
+    cached = cache.get_many(
+        keys=[
+            BOARD_ACCESS_GENERATION_CACHE_KEY,
+            _user_group_ids_cache_key(user_id=user.pk),
+        ]
+    )
+    generation = cached.get(BOARD_ACCESS_GENERATION_CACHE_KEY, 0)
+    group_ids = _get_user_group_ids(user=user, generation=generation, cached=cached)
+    cache_key = _visible_board_ids_cache_key(group_ids=group_ids, generation=generation)
+    board_ids = cache.get(key=cache_key)
+
+    if board_ids is None:
+        # AA Forum
+        from aa_forum.models import (  # pylint: disable=import-outside-toplevel
+            Board,
+        )
+
+        board_ids = sorted(
+            Board.objects.filter(Q(groups__in=group_ids) | Q(groups__isnull=True))
+            .order_by()
+            .values_list("pk", flat=True)
+            .distinct()
+        )
+
+        cache.set(key=cache_key, value=board_ids, timeout=BOARD_ACCESS_CACHE_TIMEOUT)
+
+    return board_ids
+
+
+def invalidate_user_board_access(user_id: int) -> None:
+    """
+    Invalidate the cached group IDs of a user, after they joined or left groups
+
+    :param user_id:
+    :type user_id:
+    :return:
+    :rtype:
+    """
+
+    cache.delete(key=_user_group_ids_cache_key(user_id=user_id))
+
+
+def bump_board_access_generation() -> None:
+    """
+    Start a new generation, which invalidates the cached boards and group IDs
+    of all users at once
+
+    :return:
+    :rtype:
+    """
+
+    try:
+        cache.incr(key=BOARD_ACCESS_GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(key=BOARD_ACCESS_GENERATION_CACHE_KEY, value=1, timeout=None)
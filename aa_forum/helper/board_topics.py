@@ -0,0 +1,53 @@
+"""
+Helper functions for the list of topics of a board
+"""
+
+# Django
+from django.core.cache import cache
+
+
+def _board_topics_version_cache_key(board_id: int) -> str:
+    """
+    Cache key for the version of the topic list of a board
+
+    :param board_id:
+    :type board_id:
+    :return:
+    :rtype:
+    """
+
+    return f"aa_forum:board_topics:version:{board_id}"
+
+
+def get_board_topics_version(board_id: int) -> int:
+    """
+    Get the version of the topic list of a board
+
+    It changes when the order of the topics changes in a way the board's
+    counters and last message don't show, e.g. when a topic becomes (non-)sticky.
+
+    :param board_id:
+    :type board_id:
+    :return:
+    :rtype:
+    """
+
+    return cache.get(key=_board_topics_version_cache_key(board_id=board_id), default=0)
+
+
+def bump_board_topics_version(board_id: int) -> None:
+    """
+    Start a new version of the topic list of a board
+
+    :param board_id:
+    :type board_id:
+    :return:
+    :rtype:
+    """
+
+    cache_key = _board_topics_version_cache_key(board_id=board_id)
+
+    try:
+        cache.incr(key=cache_key)
+    except ValueError:
+        cache.set(key=cache_key, value=1, timeout=None)
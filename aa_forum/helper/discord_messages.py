@@ -3,14 +3,21 @@ Helper functions to send messages to Discord
 """
 
 # Standard Library
-from datetime import datetime
+import hashlib
+import math
+import time
+from datetime import datetime, timedelta
+from http import HTTPStatus
 
 # Third Party
 from dhooks_lite import Embed as DhooksLiteEmbed
-from dhooks_lite import Footer, Image, UserAgent, Webhook
+from dhooks_lite import Footer, Image, UserAgent, Webhook, WebhookResponse
 
 # Django
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 # Alliance Auth
 from allianceauth.services.hooks import get_extension_logger
@@ -18,8 +25,6 @@ from allianceauth.services.hooks import get_extension_logger
 # AA Forum
 from aa_forum import __title__, __version__
 from aa_forum.app_settings import (
-    DISCORDPROXY_HOST,
-    DISCORDPROXY_PORT,
     DISCORDPROXY_TIMEOUT,
     allianceauth_discordbot_installed,
     discordproxy_installed,
@@ -27,19 +32,32 @@ from aa_forum.app_settings import (
 from aa_forum.constants import (
     APP_NAME_VERBOSE_USERAGENT,
     DISCORD_EMBED_COLOR_MAP,
+    DISCORD_WEBHOOK_MAX_EMBED_CHARACTERS,
+    DISCORD_WEBHOOK_MAX_EMBEDS,
     GITHUB_URL,
 )
 from aa_forum.helper.eve_images import get_character_portrait_from_evecharacter
 from aa_forum.helper.text import (
-    get_first_image_url_from_text,
+    get_discord_excerpt_and_first_image_url,
+    make_absolute_url,
     prepare_message_for_discord,
 )
 from aa_forum.helper.urls import reverse_absolute
-from aa_forum.models import Board, Message, PersonalMessage, Topic
+from aa_forum.models import (
+    Board,
+    DiscordWebhookMessage,
+    Message,
+    PersonalMessage,
+    Topic,
+)
 from aa_forum.providers.applogger import AppLogger
+from aa_forum.providers.discordproxy_client import get_discordproxy_client
 
 logger = AppLogger(get_extension_logger(__name__))
 
+# Seconds to wait after a 429 response from Discord without a `retry_after`
+DISCORD_WEBHOOK_DEFAULT_RETRY_AFTER = 5
+
 
 def _dhooks_lite_user_agent() -> UserAgent:
     """
@@ -106,8 +124,14 @@ def _aadiscordbot_send_private_message(
         )
 
 
-def _discordproxy_send_private_message(
-    user_id: int, level: str, title: str, message: str, embed_message: bool = True
+def _discordproxy_send_private_message(  # pylint: disable=too-many-arguments
+    user_id: int,
+    level: str,
+    title: str,
+    message: str,
+    embed_message: bool = True,
+    timeout: float = DISCORDPROXY_TIMEOUT,
+    fallback: bool = True,
 ):
     """
     Try to send a PM to a user on Discord via `discordproxy`
@@ -122,20 +146,23 @@ def _discordproxy_send_private_message(
     :type message:
     :param embed_message:
     :type embed_message:
+    :param timeout: Timeout for the request to discordproxy (in seconds)
+    :type timeout:
+    :param fallback: Fall back to `allianceauth-discordbot` when discordproxy
+        cannot be reached. If `False`, the gRPC error is raised instead, so the
+        caller can retry.
+    :type fallback:
     :return:
     :rtype:
     """
 
     # Third Party
-    from discordproxy.client import (  # pylint: disable=import-outside-toplevel
-        DiscordClient,
-    )
     from discordproxy.exceptions import (  # pylint: disable=import-outside-toplevel
         DiscordProxyException,
+        DiscordProxyGrpcError,
     )
 
-    target = f"{DISCORDPROXY_HOST}:{DISCORDPROXY_PORT}"
-    client = DiscordClient(target=target, timeout=DISCORDPROXY_TIMEOUT)
+    client = get_discordproxy_client()
 
     try:
         logger.debug(msg="Trying to send a direct message via discordproxy")
@@ -154,12 +181,16 @@ def _discordproxy_send_private_message(
                 footer=footer,
             )
 
-            client.create_direct_message(user_id=user_id, embed=embed)
+            client.create_direct_message(user_id=user_id, embed=embed, timeout=timeout)
         else:
             client.create_direct_message(
-                user_id=user_id, content=f"**{title}**\n\n{message}"
+                user_id=user_id, content=f"**{title}**\n\n{message}", timeout=timeout
             )
     except DiscordProxyException as ex:
+        # discordproxy could not be reached or timed out, let the caller retry
+        if not fallback and isinstance(ex, DiscordProxyGrpcError):
+            raise
+
         # Something went wrong with discordproxy
         # Fail silently and try if allianceauth-discordbot is available
         # as a last ditch effort to get the message out to Discord
@@ -181,7 +212,10 @@ def _discordproxy_send_private_message(
 
 
 def send_new_personal_message_notification(
-    message: PersonalMessage, embed_message: bool = True
+    message: PersonalMessage,
+    embed_message: bool = True,
+    timeout: float = DISCORDPROXY_TIMEOUT,
+    fallback: bool = True,
 ) -> None:
     """
     Send a notification to Discord about a new personal message
@@ -190,6 +224,10 @@ def send_new_personal_message_notification(
     :type message:
     :param embed_message:
     :type embed_message:
+    :param timeout: Timeout for the request to discordproxy (in seconds)
+    :type timeout:
+    :param fallback: See `_discordproxy_send_private_message`
+    :type fallback:
     :return:
     :rtype:
     """
@@ -240,6 +278,8 @@ def send_new_personal_message_notification(
                 title=dm_title,
                 message=dm_text,
                 embed_message=embed_message,
+                timeout=timeout,
+                fallback=fallback,
             )
         else:
             # discordproxy not available, try if allianceauth-discordbot is
@@ -260,11 +300,11 @@ def send_new_personal_message_notification(
             )
 
 
-def send_message_to_discord_webhook(
-    board: Board, topic: Topic, message: Message, headline: str
-):
+def _discord_webhook_embed(
+    board: Board, topic: Topic, message: Message
+) -> DhooksLiteEmbed:
     """
-    Send a message to a Discord webhook
+    Build the Discord embed for a forum message
 
     :param board:
     :type board:
@@ -272,18 +312,21 @@ def send_message_to_discord_webhook(
     :type topic:
     :param message:
     :type message:
-    :param headline:
-    :type headline:
     :return:
     :rtype:
     """
 
-    discord_webhook = Webhook(
-        url=board.discord_webhook, user_agent=_dhooks_lite_user_agent()
-    )
-    message_to_send = prepare_message_for_discord(message=message.message)
+    # Excerpt and image URL are computed when the message is saved,
+    # messages from before that are parsed here
+    if message.discord_excerpt:
+        message_to_send, image_url = message.discord_excerpt, message.first_image_url
+    else:
+        message_to_send, image_url = get_discord_excerpt_and_first_image_url(
+            text=message.message
+        )
+
     embed_color = DISCORD_EMBED_COLOR_MAP.get("info", None)
-    image_url = get_first_image_url_from_text(text=message.message)
+    image_url = make_absolute_url(url=image_url)
     author_eve_avatar = get_character_portrait_from_evecharacter(
         character=message.user_created.profile.main_character, size=256
     )
@@ -302,7 +345,7 @@ def send_message_to_discord_webhook(
             args=[board.category.slug, board.slug, topic.slug, message.pk],
         )
 
-    embed = DhooksLiteEmbed(
+    return DhooksLiteEmbed(
         description=message_to_send,
         title=title,
         url=url,
@@ -322,10 +365,289 @@ def send_message_to_discord_webhook(
         # ],
     )
 
-    discord_webhook.execute(
-        content=headline,
-        # username=author_eve_name,
-        # avatar_url=author_eve_avatar,
-        embeds=[embed],
+
+def send_message_to_discord_webhook(
+    board: Board, topic: Topic, message: Message, headline: str, coalesce: bool = False
+) -> DiscordWebhookMessage:
+    """
+    Send a message to a Discord webhook
+
+    The message is queued and sent in the background once the current
+    transaction has been committed, see `queue_discord_webhook_message`.
+
+    :param board:
+    :type board:
+    :param topic:
+    :type topic:
+    :param message:
+    :type message:
+    :param headline:
+    :type headline:
+    :param coalesce: Post the message together with other replies, if the
+        board has a reply window (`Board.discord_webhook_reply_window`)
+    :type coalesce:
+    :return:
+    :rtype:
+    """
+
+    embed = _discord_webhook_embed(board=board, topic=topic, message=message)
+
+    if coalesce and board.discord_webhook_reply_window:
+        return queue_coalesced_discord_webhook_message(
+            webhook_url=board.discord_webhook,
+            coalesce_key=f"board-{board.pk}",
+            window=board.discord_webhook_reply_window,
+            content=headline,
+            coalesced_content=(
+                f'**New replies have been posted in board "{board.name}"**'
+            ),
+            embed=embed,
+        )
+
+    return queue_discord_webhook_message(
+        webhook_url=board.discord_webhook, content=headline, embeds=[embed]
+    )
+
+
+def queue_discord_webhook_message(
+    webhook_url: str, content: str, embeds: list[DhooksLiteEmbed]
+) -> DiscordWebhookMessage:
+    """
+    Put a message for a Discord webhook into the outbox and send it
+    via Celery after the current transaction has been committed
+
+    :param webhook_url:
+    :type webhook_url:
+    :param content:
+    :type content:
+    :param embeds:
+    :type embeds:
+    :return:
+    :rtype:
+    """
+
+    # Needs to be imported here, otherwise it's a circular import
+    # AA Forum
+    from aa_forum.tasks import (  # pylint: disable=import-outside-toplevel
+        send_discord_webhook_message,
+    )
+
+    webhook_message = DiscordWebhookMessage.objects.create(
+        webhook_url=webhook_url,
+        content=content,
+        embeds=[embed.asdict() for embed in embeds],
+    )
+
+    transaction.on_commit(
+        lambda: send_discord_webhook_message.delay(message_id=webhook_message.pk)
+    )
+
+    return webhook_message
+
+
+def _discord_embeds_fit_into_message(embeds: list[dict]) -> bool:
+    """
+    Check if the embeds can be sent with a single webhook message
+
+    :param embeds: Embeds as dicts, see `DhooksLiteEmbed.asdict`
+    :type embeds:
+    :return:
+    :rtype:
+    """
+
+    characters = sum(
+        len(embed.get("title", ""))
+        + len(embed.get("description", ""))
+        + len(embed.get("footer", {}).get("text", ""))
+        + len(embed.get("author", {}).get("name", ""))
+        + sum(
+            len(field.get("name", "")) + len(field.get("value", ""))
+            for field in embed.get("fields", [])
+        )
+        for embed in embeds
+    )
+
+    return (
+        len(embeds) <= DISCORD_WEBHOOK_MAX_EMBEDS
+        and characters <= DISCORD_WEBHOOK_MAX_EMBED_CHARACTERS
+    )
+
+
+def queue_coalesced_discord_webhook_message(  # pylint: disable=too-many-arguments
+    webhook_url: str,
+    coalesce_key: str,
+    window: int,
+    content: str,
+    coalesced_content: str,
+    embed: DhooksLiteEmbed,
+) -> DiscordWebhookMessage:
+    """
+    Add an embed to the pending webhook message with the same key, or put a
+    new message into the outbox that is sent after `window` seconds
+
+    :param webhook_url:
+    :type webhook_url:
+    :param coalesce_key: Messages with the same key are sent together
+    :type coalesce_key:
+    :param window: How long a new message waits for more embeds (in seconds)
+    :type window:
+    :param content: Content for a message with only this embed
+    :type content:
+    :param coalesced_content: Content for a message with more than one embed
+    :type coalesced_content:
+    :param embed:
+    :type embed:
+    :return:
+    :rtype:
+    """
+
+    # Needs to be imported here, otherwise it's a circular import
+    # AA Forum
+    from aa_forum.tasks import (  # pylint: disable=import-outside-toplevel
+        send_discord_webhook_message,
+    )
+
+    embed_dict = embed.asdict()
+
+    with transaction.atomic():
+        webhook_message = (
+            DiscordWebhookMessage.objects.select_for_update()
+            .filter(coalesce_key=coalesce_key, webhook_url=webhook_url)
+            .order_by("-pk")
+            .first()
+        )
+
+        if webhook_message is not None and _discord_embeds_fit_into_message(
+            embeds=webhook_message.embeds + [embed_dict]
+        ):
+            webhook_message.embeds.append(embed_dict)
+            webhook_message.content = coalesced_content
+            webhook_message.save(update_fields=["content", "embeds"])
+
+            return webhook_message
+
+        webhook_message = DiscordWebhookMessage.objects.create(
+            webhook_url=webhook_url,
+            content=content,
+            embeds=[embed_dict],
+            coalesce_key=coalesce_key,
+            time_next_attempt=timezone.now() + timedelta(seconds=window),
+        )
+
+    transaction.on_commit(
+        lambda: send_discord_webhook_message.apply_async(
+            kwargs={
+                "message_id": webhook_message.pk,
+                "claim": webhook_message.time_next_attempt.isoformat(),
+            },
+            countdown=window,
+        )
+    )
+
+    return webhook_message
+
+
+def execute_discord_webhook_message(
+    webhook_message: DiscordWebhookMessage,
+) -> WebhookResponse:
+    """
+    Send a message from the outbox to its Discord webhook, without any retries
+
+    :param webhook_message:
+    :type webhook_message:
+    :return:
+    :rtype:
+    """
+
+    embeds = [
+        DhooksLiteEmbed.from_dict(
+            {**embed, "timestamp": parse_datetime(embed["timestamp"])}
+            if embed.get("timestamp")
+            else embed
+        )
+        for embed in webhook_message.embeds
+    ]
+
+    return Webhook(
+        url=webhook_message.webhook_url, user_agent=_dhooks_lite_user_agent()
+    ).execute(
+        content=webhook_message.content or None,
+        embeds=embeds,
         wait_for_response=True,
+        max_retries=0,
     )
+
+
+def _discord_webhook_rate_limit_cache_key(webhook_url: str) -> str:
+    """
+    Cache key for the rate limit of a Discord webhook
+
+    :param webhook_url:
+    :type webhook_url:
+    :return:
+    :rtype:
+    """
+
+    url_hash = hashlib.sha256(webhook_url.encode()).hexdigest()
+
+    return f"aa_forum:discord_webhook_rate_limit:{url_hash}"
+
+
+def get_discord_webhook_rate_limit_wait(webhook_url: str) -> float:
+    """
+    Seconds to wait before the webhook can be used again, 0 if it is not
+    rate limited
+
+    :param webhook_url:
+    :type webhook_url:
+    :return:
+    :rtype:
+    """
+
+    limited_until = cache.get(
+        key=_discord_webhook_rate_limit_cache_key(webhook_url=webhook_url)
+    )
+
+    if limited_until is None:
+        return 0
+
+    return max(0, limited_until - time.time())
+
+
+def update_discord_webhook_rate_limit(
+    webhook_url: str, response: WebhookResponse
+) -> float:
+    """
+    Remember the rate limit of a webhook from the response of Discord
+
+    Discord answers with 429 and `retry_after` when the limit has been hit,
+    and announces it with `X-RateLimit-Remaining: 0` before that.
+
+    :param webhook_url:
+    :type webhook_url:
+    :param response:
+    :type response:
+    :return: Seconds to wait before the webhook can be used again
+    :rtype:
+    """
+
+    headers = {name.lower(): value for name, value in response.headers.items()}
+    wait = 0
+
+    if response.status_code == HTTPStatus.TOO_MANY_REQUESTS:
+        wait = float(
+            (response.content or {}).get("retry_after")
+            or headers.get("retry-after")
+            or DISCORD_WEBHOOK_DEFAULT_RETRY_AFTER
+        )
+    elif headers.get("x-ratelimit-remaining") == "0":
+        wait = float(headers.get("x-ratelimit-reset-after", 0))
+
+    if wait > 0:
+        cache.set(
+            key=_discord_webhook_rate_limit_cache_key(webhook_url=webhook_url),
+            value=time.time() + wait,
+            timeout=math.ceil(wait) + 1,
+        )
+
+    return wait
@@ -0,0 +1,367 @@
+"""
+Helper functions for highlighting search terms
+"""
+
+# Standard Library
+import hashlib
+import html
+import re
+from collections import Counter
+from collections.abc import Iterable
+from functools import lru_cache
+from itertools import islice
+
+# Django
+from django.core.cache import cache
+
+# AA Forum
+from aa_forum.app_settings import AA_FORUM_SEARCH_SNIPPET_LENGTH
+
+# Cache timeout for highlighted messages (in seconds)
+SEARCH_HIGHLIGHT_CACHE_TIMEOUT = 3600
+
+# Shorter texts are highlighted faster than they are fetched from the cache
+SEARCH_HIGHLIGHT_CACHE_MIN_LENGTH = 2048
+
+# A search snippet has up to this many fragments, when the search terms are
+# too far apart for one
+SEARCH_SNIPPET_MAX_FRAGMENTS = 3
+
+# Only the first matches of a text are considered for its search snippet
+SEARCH_SNIPPET_MAX_MATCHES = 1000
+
+SEARCH_HIGHLIGHT_START = '<span class="aa-forum-search-term-highlight">'
+SEARCH_HIGHLIGHT_END = "</span>"
+
+# Splits HTML into text and markup. Markup are tags (attribute values may
+# contain ">"), comments and character references, which are never highlighted.
+_RE_MARKUP = re.compile(
+    pattern=(
+        r"(<!--.*?-->"
+        r"|<(?:[^>\"']|\"[^\"]*\"|'[^']*')*>"
+        r"|&(?:#[0-9]+|#[xX][0-9a-fA-F]+|[a-zA-Z][a-zA-Z0-9]*);)"
+    ),
+    flags=re.S,
+)
+
+# Start and end tags of elements whose content is not text
+_RE_RAW_TEXT_ELEMENT = re.compile(pattern=r"<(/?)(?:script|style)\b", flags=re.I)
+
+
+@lru_cache(maxsize=256)
+def get_search_terms_pattern(search_terms: frozenset) -> re.Pattern | None:
+    """
+    Compile the search terms into one case-insensitive alternation
+
+    Longer terms come first, so a term that contains another one is
+    highlighted as a whole.
+
+    :param search_terms: Lower case search terms
+    :type search_terms:
+    :return: `None` when there is nothing to highlight
+    :rtype:
+    """
+
+    search_terms = sorted(
+        (term for term in search_terms if term), key=lambda term: (-len(term), term)
+    )
+
+    if not search_terms:
+        return None
+
+    return re.compile(
+        pattern="|".join(re.escape(term) for term in search_terms), flags=re.I
+    )
+
+
+def _highlight(text: str, pattern: re.Pattern) -> str:
+    """
+    Highlight all matches of the pattern in the text nodes of the HTML
+
+    :param text:
+    :type text:
+    :param pattern:
+    :type pattern:
+    :return:
+    :rtype:
+    """
+
+    replacement = rf"{SEARCH_HIGHLIGHT_START}\g<0>{SEARCH_HIGHLIGHT_END}"
+    tokens = _RE_MARKUP.split(text)
+    in_raw_text_element = False
+
+    # Text and markup alternate, text has the even indexes
+    for index, token in enumerate(tokens):
+        if index % 2:
+            element = _RE_RAW_TEXT_ELEMENT.match(token)
+
+            if element is not None:
+                in_raw_text_element = not element.group(1)
+        elif token and not in_raw_text_element:
+            tokens[index] = pattern.sub(repl=replacement, string=token)
+
+    return "".join(tokens)
+
+
+def _highlight_cache_key(text: str, pattern: re.Pattern) -> str:
+    """
+    Cache key for a highlighted text
+
+    The text itself is part of the key, so edited messages are highlighted
+    again.
+
+    :param text:
+    :type text:
+    :param pattern:
+    :type pattern:
+    :return:
+    :rtype:
+    """
+
+    text_hash = hashlib.sha256(text.encode()).hexdigest()
+    pattern_hash = hashlib.sha256(pattern.pattern.encode()).hexdigest()
+
+    return f"aa_forum:search_highlight:{text_hash}:{pattern_hash}"
+
+
+def highlight_search_terms(text: str, search_terms: Iterable[str]) -> str:
+    """
+    Highlight search terms in the HTML of a message
+
+    Only text is highlighted, tags and their attributes are left untouched.
+    Highlighted messages are cached per message text and set of search terms,
+    unless they are shorter than `SEARCH_HIGHLIGHT_CACHE_MIN_LENGTH`.
+
+    :param text:
+    :type text:
+    :param search_terms:
+    :type search_terms:
+    :return:
+    :rtype:
+    """
+
+    pattern = get_search_terms_pattern(
+        search_terms=frozenset(term.lower() for term in search_terms)
+    )
+
+    if not text or pattern is None:
+        return text or ""
+
+    if len(text) < SEARCH_HIGHLIGHT_CACHE_MIN_LENGTH:
+        return _highlight(text=text, pattern=pattern)
+
+    cache_key = _highlight_cache_key(text=text, pattern=pattern)
+    highlighted = cache.get(key=cache_key)
+
+    if highlighted is None:
+        highlighted = _highlight(text=text, pattern=pattern)
+
+        cache.set(
+            key=cache_key, value=highlighted, timeout=SEARCH_HIGHLIGHT_CACHE_TIMEOUT
+        )
+
+    return highlighted
+
+
+def _best_window(
+    matches: list, size: int, text_length: int, fragments: list, covered: set
+) -> tuple | None:
+    """
+    Find the window of the given size with the most search terms, that are
+    not covered yet, and the most matches
+
+    Each window starts a bit before one of the matches, windows that overlap
+    with already selected fragments are skipped.
+
+    :param matches:
+    :type matches:
+    :param size:
+    :type size:
+    :param text_length:
+    :type text_length:
+    :param fragments: Already selected fragments as (start, end)
+    :type fragments:
+    :param covered: Search terms in the already selected fragments
+    :type covered:
+    :return: (start, end, search terms), `None` when no window adds a new term
+    :rtype:
+    """
+
+    best_window, best_score = None, (0, 0)
+    counts = Counter()
+    end_index = 0
+
+    # Both ends of the window only move forward, so every match is counted
+    # once when it enters the window and once when it leaves it
+    for index, match in enumerate(matches):
+        if index > 0 and end_index >= index:
+            previous_term = matches[index - 1].group().lower()
+            counts[previous_term] -= 1
+
+            if not counts[previous_term]:
+                del counts[previous_term]
+
+        end_index = max(end_index, index)
+        start = max(0, min(match.start() - size // 4, text_length - size))
+        end = start + size
+
+        while end_index < len(matches) and matches[end_index].end() <= end:
+            counts[matches[end_index].group().lower()] += 1
+            end_index += 1
+
+        if any(
+            start < fragment_end and fragment_start < end
+            for fragment_start, fragment_end in fragments
+        ):
+            continue
+
+        score = (len(counts.keys() - covered), sum(counts.values()))
+
+        if score[0] and score > best_score:
+            best_window, best_score = (start, end, set(counts)), score
+
+    return best_window
+
+
+def _snippet_fragments(text: str, matches: list, length: int) -> list:
+    """
+    Select the fragments of the text for the search snippet
+
+    One window of the full length is used, when it contains all search
+    terms that were found. Otherwise, up to `SEARCH_SNIPPET_MAX_FRAGMENTS`
+    shorter windows are selected, each with the most search terms that are
+    not in the others.
+
+    :param text:
+    :type text:
+    :param matches:
+    :type matches:
+    :param length:
+    :type length:
+    :return: Fragments as (start, end), in the order of the text
+    :rtype:
+    """
+
+    if len(text) <= length:
+        return [(0, len(text))]
+
+    if not matches:
+        return [(0, length)]
+
+    found_terms = {match.group().lower() for match in matches}
+    window = _best_window(
+        matches=matches, size=length, text_length=len(text), fragments=[], covered=set()
+    )
+
+    # No match fits into the snippet, so it starts with the first one, clipped
+    if window is None:
+        start = min(matches[0].start(), len(text) - length)
+
+        return [(start, start + length)]
+
+    start, end, window_terms = window
+
+    if window_terms == found_terms or SEARCH_SNIPPET_MAX_FRAGMENTS == 1:
+        return [(start, end)]
+
+    fragments, covered = [], set()
+
+    while len(fragments) < SEARCH_SNIPPET_MAX_FRAGMENTS and covered != found_terms:
+        window = _best_window(
+            matches=matches,
+            size=length // SEARCH_SNIPPET_MAX_FRAGMENTS,
+            text_length=len(text),
+            fragments=fragments,
+            covered=covered,
+        )
+
+        if window is None:
+            break
+
+        fragments.append(window[:2])
+        covered |= window[2]
+
+    # Long search terms may only fit into the full window
+    return sorted(fragments) or [(start, end)]
+
+
+def _snap_to_words(text: str, start: int, end: int) -> tuple[int, int]:
+    """
+    Move the fragment boundaries, so no words are cut
+
+    :param text:
+    :type text:
+    :param start:
+    :type start:
+    :param end:
+    :type end:
+    :return:
+    :rtype:
+    """
+
+    if start > 0 and not text[start - 1].isspace():
+        start = text.rfind(" ", 0, start) + 1
+
+    if end < len(text) and not text[end].isspace():
+        word_end = text.rfind(" ", start, end)
+
+        if word_end > start:
+            end = word_end
+
+    return start, end
+
+
+def get_search_snippet(
+    text: str, search_terms: Iterable[str], length: int = None
+) -> str:
+    """
+    Get a short, highlighted excerpt of the plain text of a message, around
+    the places where the search terms are found
+
+    :param text: Plain text of the message, may contain HTML entities
+    :type text:
+    :param search_terms:
+    :type search_terms:
+    :param length: Length of the snippet (in characters), defaults to
+        `AA_FORUM_SEARCH_SNIPPET_LENGTH`
+    :type length:
+    :return: HTML
+    :rtype:
+    """
+
+    length = length or AA_FORUM_SEARCH_SNIPPET_LENGTH
+    text = " ".join(html.unescape(text or "").split())
+    pattern = get_search_terms_pattern(
+        search_terms=frozenset(term.lower() for term in search_terms)
+    )
+    matches = (
+        []
+        if pattern is None
+        else list(islice(pattern.finditer(text), SEARCH_SNIPPET_MAX_MATCHES))
+    )
+    fragments = [
+        _snap_to_words(text=text, start=start, end=end)
+        for start, end in _snippet_fragments(text=text, matches=matches, length=length)
+    ]
+    parts = []
+
+    for start, end in fragments:
+        part = []
+        position = start
+
+        for match in pattern.finditer(text, start, end) if pattern else ():
+            part.append(html.escape(text[position : match.start()]))
+            part.append(
+                f"{SEARCH_HIGHLIGHT_START}{html.escape(match.group())}"
+                f"{SEARCH_HIGHLIGHT_END}"
+            )
+            position = match.end()
+
+        part.append(html.escape(text[position:end]))
+        parts.append("".join(part))
+
+    return (
+        ("…" if fragments[0][0] > 0 else "")
+        + " … ".join(parts)
+        + ("…" if fragments[-1][1] < len(text) else "")
+    )
@@ -2,13 +2,31 @@
 Pagination helper functions
 """
 
+# Standard Library
+from collections.abc import Sequence
+from functools import reduce
+from operator import or_
+
 # Django
+from django.core.cache import cache
 from django.core.paginator import Page, Paginator
+from django.db.models import F, Q
+from django.db.models.constants import LOOKUP_SEP
 from django.db.models.query import QuerySet
+from django.utils.functional import cached_property
+
+# Cache timeout for the cursor anchors of the keyset paginator (in seconds)
+KEYSET_ANCHOR_CACHE_TIMEOUT = 3600
+
+# How many pages the keyset paginator looks back for a cached cursor anchor
+KEYSET_ANCHOR_LOOKBACK = 50
 
 
 def get_paginated_page_object(
-    queryset: QuerySet, items_per_page: int = 10, page_number: int = None
+    queryset: QuerySet,
+    items_per_page: int = 10,
+    page_number: int = None,
+    count: int = None,
 ) -> Page:
     """
     Return a paginated page object
@@ -19,11 +37,406 @@ def get_paginated_page_object(
     :type items_per_page:
     :param page_number:
     :type page_number:
+    :param count: Number of items, if already known
+    :type count:
+    :return:
+    :rtype:
+    """
+
+    paginator = CountedPaginator(
+        object_list=queryset, per_page=items_per_page, count=count
+    )
+    page_obj = paginator.get_page(number=page_number)
+
+    return page_obj
+
+
+def get_keyset_paginated_page_object(  # pylint: disable=too-many-arguments
+    queryset: QuerySet,
+    ordering: Sequence[str],
+    cache_key: str,
+    items_per_page: int = 10,
+    page_number: int = None,
+    count: int = None,
+) -> Page:
+    """
+    Return a page object, paginated via keyset (seek) pagination
+
+    :param queryset:
+    :type queryset:
+    :param ordering: Key fields, the last one has to be unique (e.g. `pk`)
+    :type ordering:
+    :param cache_key: Identifies the list and its state, see `KeysetPaginator`
+    :type cache_key:
+    :param items_per_page:
+    :type items_per_page:
+    :param page_number:
+    :type page_number:
+    :param count: Number of items, if already known
+    :type count:
     :return:
     :rtype:
     """
 
-    paginator = Paginator(object_list=queryset, per_page=items_per_page)
+    paginator = KeysetPaginator(
+        object_list=queryset,
+        per_page=items_per_page,
+        ordering=ordering,
+        cache_key=cache_key,
+        count=count,
+    )
     page_obj = paginator.get_page(number=page_number)
 
     return page_obj
+
+
+def count_with_limit(queryset: QuerySet, limit: int = None) -> tuple[int, bool]:
+    """
+    Count the items of a queryset, but stop counting after `limit` items
+
+    :param queryset:
+    :type queryset:
+    :param limit: Count all items when `None`
+    :type limit:
+    :return: (number of items, whether there are more than `limit` items)
+    :rtype:
+    """
+
+    if limit is None:
+        return queryset.count(), False
+
+    # Counting a sliced queryset only reads `limit + 1` rows
+    count = queryset.order_by().values("pk")[: limit + 1].count()
+
+    if count > limit:
+        return limit, True
+
+    return count, False
+
+
+class CountedPaginator(Paginator):
+    """
+    Paginator that uses the number of items, when it is already known,
+    instead of counting them again
+    """
+
+    def __init__(self, object_list, per_page: int, count: int = None, **kwargs):
+        """
+        Initialize the paginator
+
+        :param object_list:
+        :type object_list:
+        :param per_page:
+        :type per_page:
+        :param count: Number of items, if already known
+        :type count:
+        :param kwargs:
+        :type kwargs:
+        """
+
+        self._count = count
+
+        super().__init__(object_list=object_list, per_page=per_page, **kwargs)
+
+    @cached_property
+    def count(self) -> int:
+        """
+        Total number of items
+
+        :return:
+        :rtype:
+        """
+
+        if self._count is not None:
+            return self._count
+
+        return super().count
+
+
+class KeysetPaginator(CountedPaginator):
+    """
+    Paginator that seeks to a page via its sort key instead of using OFFSET
+
+    A page is fetched with `WHERE (key) > (last key of the previous page)`, so
+    the database can go straight to the page through the index, no matter how
+    deep the page is. The last key of each page (its "cursor anchor") is cached,
+    which keeps the usual "page N" URLs working.
+
+    The `cache_key` has to change whenever items are added, removed or
+    re-ordered, otherwise stale cursor anchors will be used. The number of
+    items is always part of the cache key.
+
+    Pages are Django `Page` objects, so templates can use them like any other
+    paginated page.
+    """
+
+    def __init__(  # pylint: disable=too-many-arguments
+        self,
+        object_list: QuerySet,
+        per_page: int,
+        ordering: Sequence[str],
+        cache_key: str,
+        count: int = None,
+        **kwargs,
+    ):
+        """
+        Initialize the paginator
+
+        :param object_list:
+        :type object_list:
+        :param per_page:
+        :type per_page:
+        :param ordering:
+        :type ordering:
+        :param cache_key:
+        :type cache_key:
+        :param count:
+        :type count:
+        :param kwargs:
+        :type kwargs:
+        """
+
+        self.key_fields = [field.lstrip("-") for field in ordering]
+        self.key_descending = [field.startswith("-") for field in ordering]
+        self.key_nullable = [
+            _lookup_is_nullable(model=object_list.model, lookup=field)
+            for field in self.key_fields
+        ]
+        self.cache_key = cache_key
+
+        super().__init__(
+            object_list=object_list.order_by(*self._order_by()),
+            per_page=per_page,
+            count=count,
+            **kwargs,
+        )
+
+    def page(self, number) -> Page:
+        """
+        Return a page object for the given 1-based page number
+
+        :param number:
+        :type number:
+        :return:
+        :rtype:
+        """
+
+        number = self.validate_number(number=number)
+        queryset = self._keyed_queryset()
+        anchor = self._get_anchor(number=number)
+
+        if anchor is not None:
+            queryset = queryset.filter(self._seek_filter(anchor=anchor))
+
+        object_list = list(queryset[: self.per_page])
+
+        if object_list and number < self.num_pages:
+            self._set_anchor(
+                number=number + 1, anchor=self._key_of(obj=object_list[-1])
+            )
+
+        return self._get_page(object_list, number, self)
+
+    def _order_by(self) -> list:
+        """
+        Order by expressions for the key fields
+
+        NULL values are sorted last for nullable fields, which is what the
+        seek filter expects. Non-nullable fields are ordered plainly, so the
+        database can use their indexes.
+
+        :return:
+        :rtype:
+        """
+
+        order_by = []
+
+        for field, descending, nullable in zip(
+            self.key_fields, self.key_descending, self.key_nullable
+        ):
+            if not nullable:
+                order_by.append(f"-{field}" if descending else field)
+            elif descending:
+                order_by.append(F(field).desc(nulls_last=True))
+            else:
+                order_by.append(F(field).asc(nulls_last=True))
+
+        return order_by
+
+    def _keyed_queryset(self) -> QuerySet:
+        """
+        The ordered queryset, with the key values annotated
+
+        :return:
+        :rtype:
+        """
+
+        return self.object_list.annotate(
+            **{
+                f"keyset_value_{index}": F(field)
+                for index, field in enumerate(self.key_fields)
+            }
+        )
+
+    def _key_of(self, obj) -> tuple:
+        """
+        Key values of an object from the keyed queryset
+
+        :param obj:
+        :type obj:
+        :return:
+        :rtype:
+        """
+
+        return tuple(
+            getattr(obj, f"keyset_value_{index}")
+            for index in range(len(self.key_fields))
+        )
+
+    def _seek_filter(self, anchor: tuple) -> Q:
+        """
+        Filter for all items sorted after the given key
+
+        :param anchor:
+        :type anchor:
+        :return:
+        :rtype:
+        """
+
+        conditions = []
+        equal_so_far = Q()
+
+        for field, descending, nullable, value in zip(
+            self.key_fields, self.key_descending, self.key_nullable, anchor
+        ):
+            if value is None:
+                # NULL values are sorted last, so nothing comes after them
+                equal_so_far &= Q(**{f"{field}__isnull": True})
+
+                continue
+
+            after = Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+
+            if nullable:
+                after |= Q(**{f"{field}__isnull": True})
+
+            conditions.append(equal_so_far & after)
+            equal_so_far &= Q(**{field: value})
+
+        return reduce(or_, conditions)
+
+    def _anchor_cache_key(self, number: int) -> str:
+        """
+        Cache key for the cursor anchor of a page
+
+        :param number:
+        :type number:
+        :return:
+        :rtype:
+        """
+
+        return (
+            f"aa_forum:keyset_anchor:{self.cache_key}:{self.count}:"
+            f"{self.per_page}:{number}"
+        )
+
+    def _set_anchor(self, number: int, anchor: tuple) -> None:
+        """
+        Cache the cursor anchor of a page
+
+        :param number:
+        :type number:
+        :param anchor:
+        :type anchor:
+        :return:
+        :rtype:
+        """
+
+        cache.set(
+            key=self._anchor_cache_key(number=number),
+            value=anchor,
+            timeout=KEYSET_ANCHOR_CACHE_TIMEOUT,
+        )
+
+    def _get_anchor(self, number: int) -> tuple | None:
+        """
+        Get the cursor anchor of a page, which is the key of the last item
+        of the previous page. Page 1 has no anchor.
+
+        When the anchor is not cached yet, we seek from the closest cached
+        anchor before it and skip the pages in between, only reading the
+        key columns.
+
+        :param number:
+        :type number:
+        :return:
+        :rtype:
+        """
+
+        if number == 1:
+            return None
+
+        lookback = range(max(2, number - KEYSET_ANCHOR_LOOKBACK), number + 1)
+        cached_anchors = cache.get_many(
+            keys=[self._anchor_cache_key(number=page) for page in lookback]
+        )
+
+        start_page, start_anchor = 1, None
+
+        for page in reversed(lookback):
+            anchor = cached_anchors.get(self._anchor_cache_key(number=page))
+
+            if anchor is not None:
+                if page == number:
+                    return anchor
+
+                start_page, start_anchor = page, anchor
+
+                break
+
+        queryset = self._keyed_queryset()
+
+        if start_anchor is not None:
+            queryset = queryset.filter(self._seek_filter(anchor=start_anchor))
+
+        skip = (number - start_page) * self.per_page - 1
+        keys = queryset.values_list(
+            *[f"keyset_value_{index}" for index in range(len(self.key_fields))]
+        )[skip : skip + 1]
+
+        try:
+            anchor = tuple(keys[0])
+        except IndexError:
+            return start_anchor
+
+        self._set_anchor(number=number, anchor=anchor)
+
+        return anchor
+
+
+def _lookup_is_nullable(model, lookup: str) -> bool:
+    """
+    Check if a field lookup (e.g. `last_message__time_posted`) can be NULL
+
+    :param model:
+    :type model:
+    :param lookup:
+    :type lookup:
+    :return:
+    :rtype:
+    """
+
+    nullable = False
+
+    for part in lookup.split(LOOKUP_SEP):
+        if part == "pk":
+            field = model._meta.pk
+        else:
+            field = model._meta.get_field(part)
+
+        nullable = nullable or field.null
+
+        if field.is_relation:
+            model = field.related_model
+
+    return nullable
@@ -0,0 +1,136 @@
+"""
+Helper functions for personal messages
+"""
+
+# Django
+from django.core.cache import cache
+from django.db import transaction
+
+# Alliance Auth
+from allianceauth.authentication.models import User
+
+# AA Forum
+from aa_forum.models import PersonalMessage
+from aa_forum.tasks import send_personal_message_notifications
+
+# Cache timeout for the number of unread personal messages (in seconds).
+# The number is invalidated on every change, this is just a safety net.
+PERSONAL_MESSAGES_UNREAD_COUNT_CACHE_TIMEOUT = 3600
+
+
+class _NotificationBatch:
+    """
+    On-commit callback that queues the Discord DMs for the personal messages
+    of a transaction with a single task
+
+    It only lives in the on-commit callbacks of its transaction, so it is
+    dropped together with them when the transaction is rolled back.
+    """
+
+    def __init__(self, message_id: int):
+        """
+        Start the batch with its first message
+
+        :param message_id:
+        :type message_id:
+        """
+
+        self.message_ids = [message_id]
+        self.is_queued = False
+
+    def __call__(self) -> None:
+        """
+        Queue the Discord DMs
+
+        :return:
+        :rtype:
+        """
+
+        self.is_queued = True
+
+        send_personal_message_notifications.delay(message_ids=self.message_ids)
+
+
+def _unread_count_cache_key(user_id: int) -> str:
+    """
+    Cache key for the number of unread personal messages of a user
+
+    :param user_id:
+    :type user_id:
+    :return:
+    :rtype:
+    """
+
+    return f"aa_forum:personal_messages_unread_count:{user_id}"
+
+
+def get_personal_messages_unread_count(user: User | int) -> int:
+    """
+    Get the number of unread personal messages of a user from the cache,
+    or count them
+
+    :param user: The user or its ID
+    :type user:
+    :return:
+    :rtype:
+    """
+
+    cache_key = _unread_count_cache_key(user_id=getattr(user, "pk", user))
+    unread_count = cache.get(key=cache_key)
+
+    if unread_count is None:
+        unread_count = (
+            PersonalMessage.objects.get_personal_message_unread_count_for_user(
+                user=user
+            )
+        )
+        cache.set(
+            key=cache_key,
+            value=unread_count,
+            timeout=PERSONAL_MESSAGES_UNREAD_COUNT_CACHE_TIMEOUT,
+        )
+
+    return unread_count
+
+
+def invalidate_personal_messages_unread_count(user_id: int) -> None:
+    """
+    Invalidate the cached number of unread personal messages of a user
+
+    :param user_id:
+    :type user_id:
+    :return:
+    :rtype:
+    """
+
+    cache.delete(key=_unread_count_cache_key(user_id=user_id))
+
+
+def queue_new_personal_message_notification(message: PersonalMessage) -> None:
+    """
+    Queue the Discord DM about a new personal message, it is sent by a
+    Celery worker once the current transaction has been committed
+
+    All messages of a transaction are added to the batch that is already
+    waiting in its on-commit callbacks. Django drops the callbacks of rolled
+    back savepoints, then the next message starts a new batch. Messages that
+    have been rolled back while their batch was kept are skipped by the task.
+
+    :param message:
+    :type message:
+    :return:
+    :rtype:
+    """
+
+    connection = transaction.get_connection(using=message._state.db)
+
+    if connection.in_atomic_block:
+        for _, callback, _ in connection.run_on_commit:
+            if isinstance(callback, _NotificationBatch) and not callback.is_queued:
+                callback.message_ids.append(message.pk)
+
+                return
+
+    transaction.on_commit(
+        _NotificationBatch(message_id=message.pk), using=message._state.db
+    )
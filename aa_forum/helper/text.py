@@ -5,12 +5,11 @@ Helper functions for text processing
 # Standard Library
 import html
 import re
-
-# Third Party
-from bs4 import BeautifulSoup
+from html.parser import HTMLParser
 
 # Django
 from django.conf import settings
+from django.utils.functional import cached_property
 from django.utils.html import strip_tags
 
 # Alliance Auth
@@ -46,46 +45,378 @@ def verify_image_url(image_url):
     )
 
 
-def get_first_image_url_from_text(text):
+def make_absolute_url(url: str) -> str:
     """
-    Get the first image URL from a text
+    Make a URL on this site absolute, by prefixing it with `SITE_URL`
 
-    :param text:
-    :type text:
+    :param url:
+    :type url:
     :return:
     :rtype:
     """
 
-    soup = BeautifulSoup(markup=text, features="html.parser")
+    if url and not url.startswith(("http://", "https://")):
+        return f"{settings.SITE_URL}{url}"
 
-    images = soup.findAll(name="img")
+    return url
 
-    # The first image to verify we will use
-    if images:
-        for image in images:
-            image__src = image["src"]
 
-            logger.debug(msg=f"Image found: {image__src}")
+class MessageParser(HTMLParser):
+    """
+    Single pass over the HTML of a message
+
+    While parsing, the HTML is sanitized (`head`, `script` and `style`
+    elements are removed with their content, comments, declarations and
+    processing instructions are dropped), the plain text is extracted
+    (like Django's `strip_tags` does it) and the URLs of images and links are
+    collected. Use `parse_message` to get a parsed message.
+    """
+
+    REMOVED_ELEMENTS = frozenset({"head", "script", "style"})
+
+    def __init__(self):
+        """
+        Initialize the parser
+        """
+
+        super().__init__(convert_charrefs=False)
+
+        self.image_urls = []
+        self.link_urls = []
+
+        self._html_parts = []
+        self._text_parts = []
+        self._removed_element = None
+        self._removed_element_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        """
+        Handle a start tag
+
+        :param tag:
+        :type tag:
+        :param attrs:
+        :type attrs:
+        :return:
+        :rtype:
+        """
+
+        if self._removed_element is not None:
+            if tag == self._removed_element:
+                self._removed_element_depth += 1
+
+            return
 
-            if not image__src.startswith(("http://", "https://")):
-                logger.debug(msg="Image has no absolute URL, fixing!")
+        if tag in self.REMOVED_ELEMENTS:
+            self._removed_element = tag
+            self._removed_element_depth = 1
 
-                absolute_site_url = settings.SITE_URL
-                image__src = f"{absolute_site_url}{image__src}"
+            return
 
-            if verify_image_url(image_url=image__src):
+        if tag == "img":
+            self.image_urls.extend(
+                value for name, value in attrs if name == "src" and value
+            )
+        elif tag == "a":
+            self.link_urls.extend(
+                value for name, value in attrs if name == "href" and value
+            )
+
+        self._html_parts.append(self.get_starttag_text())
+
+    def handle_startendtag(self, tag, attrs):
+        """
+        Handle a self-closing tag (e.g. `<br/>`)
+
+        :param tag:
+        :type tag:
+        :param attrs:
+        :type attrs:
+        :return:
+        :rtype:
+        """
+
+        # Removed elements that close themselves have no content to skip
+        if tag in self.REMOVED_ELEMENTS and self._removed_element is None:
+            return
+
+        self.handle_starttag(tag=tag, attrs=attrs)
+
+    def handle_endtag(self, tag):
+        """
+        Handle an end tag
+
+        :param tag:
+        :type tag:
+        :return:
+        :rtype:
+        """
+
+        if self._removed_element is not None:
+            if tag == self._removed_element:
+                self._removed_element_depth -= 1
+
+                if self._removed_element_depth == 0:
+                    self._removed_element = None
+
+            return
+
+        if tag not in self.REMOVED_ELEMENTS:
+            self._html_parts.append(f"</{tag}>")
+
+    def _append_text(self, text: str, html_text: str = None) -> None:
+        """
+        Append text to the plain text and the HTML
+
+        :param text:
+        :type text:
+        :param html_text: The text in the HTML, if it differs
+        :type html_text:
+        :return:
+        :rtype:
+        """
+
+        if self._removed_element is None:
+            self._text_parts.append(text)
+            self._html_parts.append(text if html_text is None else html_text)
+
+    def handle_data(self, data):
+        """
+        Handle text
+
+        :param data:
+        :type data:
+        :return:
+        :rtype:
+        """
+
+        # Python passes markup it doesn't parse (e.g. an unterminated
+        # comment) on as text, which a browser would still parse as markup
+        self._append_text(text=data, html_text=data.replace("<", "&lt;"))
+
+    def handle_entityref(self, name):
+        """
+        Handle a named character reference (e.g. `&gt;`)
+
+        :param name:
+        :type name:
+        :return:
+        :rtype:
+        """
+
+        self._append_text(text=f"&{name};")
+
+    def handle_charref(self, name):
+        """
+        Handle a numeric character reference (e.g. `&#62;`)
+
+        :param name:
+        :type name:
+        :return:
+        :rtype:
+        """
+
+        self._append_text(text=f"&#{name};")
+
+    def handle_comment(self, data):
+        """
+        Handle a comment
+
+        Comments are dropped, since browsers don't always end them where
+        Python does (e.g. `<!-->` or `--!>`), and the markup hidden in them
+        would not have been sanitized.
+
+        :param data:
+        :type data:
+        :return:
+        :rtype:
+        """
+
+    def handle_decl(self, decl):
+        """
+        Handle a doctype declaration, dropped like comments
+
+        :param decl:
+        :type decl:
+        :return:
+        :rtype:
+        """
+
+    def handle_pi(self, data):
+        """
+        Handle a processing instruction, dropped like comments
+
+        :param data:
+        :type data:
+        :return:
+        :rtype:
+        """
+
+    def unknown_decl(self, data):
+        """
+        Handle a CDATA section or another marked section, dropped like comments
+
+        :param data:
+        :type data:
+        :return:
+        :rtype:
+        """
+
+    @cached_property
+    def html(self) -> str:
+        """
+        The sanitized HTML
+
+        :return:
+        :rtype:
+        """
+
+        return "".join(self._html_parts)
+
+    @cached_property
+    def plaintext(self) -> str:
+        """
+        The text without HTML tags, entities are kept as they are
+
+        :return:
+        :rtype:
+        """
+
+        return "".join(self._text_parts)
+
+    @cached_property
+    def text(self) -> str:
+        """
+        The plain text, unescaped and with normal spaces instead of
+        non-breaking ones
+
+        :return:
+        :rtype:
+        """
+
+        # Remove formerly escaped HTML tags as well
+        return strip_tags(value=html.unescape(self.plaintext)).replace("\xa0", " ")
+
+    @property
+    def length(self) -> int:
+        """
+        Number of characters of the text
+
+        :return:
+        :rtype:
+        """
+
+        return len(self.text)
+
+    @property
+    def word_count(self) -> int:
+        """
+        Number of words of the text
+
+        :return:
+        :rtype:
+        """
+
+        return len(self.text.split())
+
+    @cached_property
+    def first_image_url(self) -> str | None:
+        """
+        The first image URL that can be used for Discord embeds
+
+        Images on this site keep their relative URL, use `make_absolute_url`
+        before sending it.
+
+        :return:
+        :rtype:
+        """
+
+        for image__src in self.image_urls:
+            logger.debug(msg=f"Image found: {image__src}")
+
+            if verify_image_url(image_url=make_absolute_url(url=image__src)):
                 logger.debug(f"Image verified: {image__src}")
 
                 return image__src
 
-    logger.debug(msg="No images found.")
+        logger.debug(msg="No images found.")
+
+        return None
+
+    def get_discord_excerpt(
+        self, excerpt_length: int = DISCORD_EMBED_MESSAGE_LENGTH
+    ) -> str:
+        """
+        The text, shortened to `excerpt_length` characters
+
+        :param excerpt_length:
+        :type excerpt_length:
+        :return:
+        :rtype:
+        """
+
+        if len(self.text) > excerpt_length:
+            return self.text[:excerpt_length] + "…"
 
-    return None
+        return self.text
+
+
+def parse_message(text: str) -> MessageParser:
+    """
+    Parse the HTML of a message in a single pass, see `MessageParser`
+
+    :param text:
+    :type text:
+    :return:
+    :rtype:
+    """
+
+    parser = MessageParser()
+    parser.feed(data=text or "")
+    parser.close()
+
+    return parser
+
+
+def get_first_image_url_from_text(text):
+    """
+    Get the first image URL from a text
+
+    :param text:
+    :type text:
+    :return:
+    :rtype:
+    """
+
+    return make_absolute_url(url=parse_message(text=text).first_image_url)
+
+
+def get_discord_excerpt_and_first_image_url(
+    text: str, excerpt_length: int = DISCORD_EMBED_MESSAGE_LENGTH
+) -> tuple[str, str | None]:
+    """
+    Get the Discord excerpt and the first verified image URL of a message,
+    both from a single parse of the HTML, as they are stored with the message
+
+    :param text:
+    :type text:
+    :param excerpt_length:
+    :type excerpt_length:
+    :return:
+    :rtype:
+    """
+
+    parsed_message = parse_message(text=text)
+
+    return (
+        parsed_message.get_discord_excerpt(excerpt_length=excerpt_length),
+        parsed_message.first_image_url,
+    )
 
 
 def string_cleanup(string: str) -> str:
     """
-    Clean up a string
+    Clean up a string, see `MessageParser` for what is removed
 
     :param string:
     :type string:
@@ -94,20 +425,7 @@ def string_cleanup(string: str) -> str:
     """
 
     if string:
-        re_head = re.compile(
-            pattern=r"<\s*head[^>]*>.*?<\s*/\s*head\s*>", flags=re.S | re.I
-        )
-        re_script = re.compile(
-            pattern=r"<\s*script[^>]*>.*?<\s*/\s*script\s*>", flags=re.S | re.I
-        )
-        re_css = re.compile(
-            pattern=r"<\s*style[^>]*>.*?<\s*/\s*style\s*>", flags=re.S | re.I
-        )
-
-        # Strip JS
-        string = re_head.sub(repl="", string=string)
-        string = re_script.sub(repl="", string=string)
-        string = re_css.sub(repl="", string=string)
+        string = parse_message(text=string).html
 
     logger.debug(msg=f"Cleaned up string: {string}")
 
@@ -0,0 +1,120 @@
+"""
+Helper functions for the number of unread topics
+"""
+
+# Django
+from django.core.cache import cache
+
+# Alliance Auth
+from allianceauth.authentication.models import User
+
+# AA Forum
+from aa_forum.app_settings import AA_FORUM_UNREAD_TOPICS_COUNT_CACHE_TIMEOUT
+from aa_forum.helper.board_access import BOARD_ACCESS_GENERATION_CACHE_KEY
+from aa_forum.models import Topic
+
+# Changes whenever messages are posted or deleted anywhere in the forum
+UNREAD_TOPICS_GENERATION_CACHE_KEY = "aa_forum:unread_topics_count:generation"
+
+
+def _unread_topics_count_cache_key(user: User) -> str:
+    """
+    Cache key for the number of unread topics of a user
+
+    :param user:
+    :type user:
+    :return:
+    :rtype:
+    """
+
+    return f"aa_forum:unread_topics_count:user:{user.pk}"
+
+
+def count_unread_topics(user: User) -> int:
+    """
+    Count the unread topics in all boards the user has access to
+
+    :param user:
+    :type user:
+    :return:
+    :rtype:
+    """
+
+    return Topic.objects.user_has_access(user=user).unread(user=user).count()
+
+
+def get_unread_topics_count(user: User) -> int:
+    """
+    Get the number of unread topics of a user from the cache, or count them
+
+    The cached number is tied to the current generation of the forum and of
+    the board access, so it is recounted after new messages have been posted
+    (or deleted), or after boards have changed. Reading it costs one cache
+    round trip, no matter how many boards there are.
+    It's never older than `AA_FORUM_UNREAD_TOPICS_COUNT_CACHE_TIMEOUT`.
+
+    :param user:
+    :type user:
+    :return:
+    :rtype:
+    """
+
+    cache_key = _unread_topics_count_cache_key(user=user)
+    cached = cache.get_many(
+        keys=[
+            UNREAD_TOPICS_GENERATION_CACHE_KEY,
+            BOARD_ACCESS_GENERATION_CACHE_KEY,
+            cache_key,
+        ]
+    )
+    generations = (
+        cached.get(UNREAD_TOPICS_GENERATION_CACHE_KEY, 0),
+        cached.get(BOARD_ACCESS_GENERATION_CACHE_KEY, 0),
+    )
+
+    try:
+        cached_generations, count = cached[cache_key]
+    except KeyError:
+        pass
+    else:
+        if cached_generations == generations:
+            return count
+
+    count = count_unread_topics(user=user)
+
+    cache.set(
+        key=cache_key,
+        value=(generations, count),
+        timeout=AA_FORUM_UNREAD_TOPICS_COUNT_CACHE_TIMEOUT,
+    )
+
+    return count
+
+
+def invalidate_unread_topics_count(user: User) -> None:
+    """
+    Invalidate the cached number of unread topics of a user,
+    e.g. after the user has read a topic
+
+    :param user:
+    :type user:
+    :return:
+    :rtype:
+    """
+
+    cache.delete(key=_unread_topics_count_cache_key(user=user))
+
+
+def bump_unread_topics_generation() -> None:
+    """
+    Start a new generation, which invalidates the cached number of unread
+    topics of all users at once
+
+    :return:
+    :rtype:
+    """
+
+    try:
+        cache.incr(key=UNREAD_TOPICS_GENERATION_CACHE_KEY)
+    except ValueError:
+        cache.set(key=UNREAD_TOPICS_GENERATION_CACHE_KEY, value=1, timeout=None)
@@ -0,0 +1,3 @@
+"""
+Initialize the management package
+"""
@@ -0,0 +1,73 @@
+"""
+Build the built-in search index for all existing messages
+"""
+
+# Django
+from django.core.management.base import BaseCommand
+
+# AA Forum
+from aa_forum.models import Message
+from aa_forum.search.index import index_messages, search_index_enabled
+
+
+class Command(BaseCommand):
+    """
+    Build the search index
+    """
+
+    help = (
+        "Builds the search index of the index search backend for all messages, "
+        "in batches."
+    )
+
+    def add_arguments(self, parser):
+        """
+        Add arguments
+
+        :param parser:
+        :type parser:
+        :return:
+        :rtype:
+        """
+
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of messages to index per transaction (default: 500).",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Run the command
+
+        :param args:
+        :type args:
+        :param options:
+        :type options:
+        :return:
+        :rtype:
+        """
+
+        if not search_index_enabled():
+            self.stdout.write(
+                msg=self.style.WARNING(
+                    'AA_FORUM_SEARCH_BACKEND is not "index", the search index '
+                    "will not be kept up to date after this."
+                )
+            )
+
+        messages = Message.objects.order_by("pk").only("pk", "message_plaintext")
+        total = messages.count()
+        indexed = 0
+        last_pk = 0
+
+        while batch := list(messages.filter(pk__gt=last_pk)[: options["batch_size"]]):
+            index_messages(messages=batch)
+
+            indexed += len(batch)
+            last_pk = batch[-1].pk
+
+            self.stdout.write(msg=f"Indexed {indexed} of {total} messages.")
+
+        self.stdout.write(msg=self.style.SUCCESS("The search index has been built."))
@@ -0,0 +1,178 @@
+"""
+Rebuild and verify the topic and message counters of boards and topics, and the
+positions of the messages in their topics
+"""
+
+# Django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, Func, OuterRef, Q, Subquery, Window
+from django.db.models.functions import Coalesce, RowNumber
+
+# AA Forum
+from aa_forum.models import Board, Message, Topic
+
+
+def _subquery_count(queryset) -> Coalesce:
+    """
+    Count the rows of a correlated subquery
+
+    :param queryset:
+    :type queryset:
+    :return:
+    :rtype:
+    """
+
+    return Coalesce(
+        Subquery(
+            queryset.order_by()
+            .annotate(count=Func(F("pk"), function="COUNT"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def _expected_topic_counters() -> dict:
+    """
+    Expressions for the expected counters of a topic
+
+    :return:
+    :rtype:
+    """
+
+    return {
+        "message_count": _subquery_count(
+            queryset=Message.objects.filter(topic=OuterRef("pk"))
+        )
+    }
+
+
+def _expected_board_counters() -> dict:
+    """
+    Expressions for the expected counters of a board, including its child boards
+
+    :return:
+    :rtype:
+    """
+
+    return {
+        "topic_count": _subquery_count(
+            queryset=Topic.objects.filter(
+                Q(board=OuterRef("pk")) | Q(board__parent_board=OuterRef("pk"))
+            )
+        ),
+        "message_count": _subquery_count(
+            queryset=Message.objects.filter(
+                Q(topic__board=OuterRef("pk"))
+                | Q(topic__board__parent_board=OuterRef("pk"))
+            )
+        ),
+    }
+
+
+def _mismatches(queryset, expected_counters: dict):
+    """
+    Objects with at least one counter that doesn't match the expected value
+
+    :param queryset:
+    :type queryset:
+    :param expected_counters:
+    :type expected_counters:
+    :return:
+    :rtype:
+    """
+
+    return queryset.annotate(
+        **{f"expected_{field}": value for field, value in expected_counters.items()}
+    ).exclude(**{field: F(f"expected_{field}") for field in expected_counters})
+
+
+def _wrong_message_ordinals():
+    """
+    Messages whose ordinal doesn't match their position in the topic
+
+    :return:
+    :rtype:
+    """
+
+    return Message.objects.annotate(
+        expected_ordinal=Window(
+            expression=RowNumber(),
+            partition_by=F("topic_id"),
+            order_by=(F("time_posted").asc(), F("pk").asc()),
+        )
+    ).exclude(ordinal=F("expected_ordinal"))
+
+
+class Command(BaseCommand):
+    """
+    Rebuild and verify the counters
+    """
+
+    help = (
+        "Rebuilds the topic and message counters of all boards and topics, and "
+        "the positions of the messages in their topics, from the actual data and "
+        "verifies them."
+    )
+
+    def add_arguments(self, parser):
+        """
+        Add arguments
+
+        :param parser:
+        :type parser:
+        :return:
+        :rtype:
+        """
+
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Only verify the counters, don't change them.",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Run the command
+
+        :param args:
+        :type args:
+        :param options:
+        :type options:
+        :return:
+        :rtype:
+        """
+
+        if not options["check"]:
+            with transaction.atomic():
+                Topic.objects.update(**_expected_topic_counters())
+                Board.objects.update(**_expected_board_counters())
+
+                messages = list(_wrong_message_ordinals().only("pk", "ordinal"))
+
+                for message in messages:
+                    message.ordinal = message.expected_ordinal
+
+                Message.objects.bulk_update(
+                    messages, fields=["ordinal"], batch_size=500
+                )
+
+            self.stdout.write(msg="Counters have been rebuilt.")
+
+        wrong_topics = _mismatches(
+            queryset=Topic.objects.all(), expected_counters=_expected_topic_counters()
+        ).count()
+        wrong_boards = _mismatches(
+            queryset=Board.objects.all(), expected_counters=_expected_board_counters()
+        ).count()
+
+        wrong_messages = _wrong_message_ordinals().count()
+
+        if wrong_topics or wrong_boards or wrong_messages:
+            raise CommandError(
+                f"Counters are out of sync for {wrong_boards} board(s), "
+                f"{wrong_topics} topic(s) and {wrong_messages} message(s)."
+            )
+
+        self.stdout.write(msg=self.style.SUCCESS("All counters are correct."))
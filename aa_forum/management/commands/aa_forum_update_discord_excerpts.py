@@ -0,0 +1,75 @@
+"""
+Compute the Discord excerpt and the first image URL of all existing messages
+"""
+
+# Django
+from django.core.management.base import BaseCommand
+
+# AA Forum
+from aa_forum.helper.text import get_discord_excerpt_and_first_image_url
+from aa_forum.models import Message
+
+
+class Command(BaseCommand):
+    """
+    Update the Discord excerpts
+    """
+
+    help = (
+        "Computes the Discord excerpt and the first image URL of all messages, "
+        "in batches."
+    )
+
+    def add_arguments(self, parser):
+        """
+        Add arguments
+
+        :param parser:
+        :type parser:
+        :return:
+        :rtype:
+        """
+
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of messages to update per query (default: 500).",
+        )
+
+    def handle(self, *args, **options):
+        """
+        Run the command
+
+        :param args:
+        :type args:
+        :param options:
+        :type options:
+        :return:
+        :rtype:
+        """
+
+        messages = Message.objects.order_by("pk").only("pk", "message")
+        total = messages.count()
+        updated = 0
+        last_pk = 0
+
+        while batch := list(messages.filter(pk__gt=last_pk)[: options["batch_size"]]):
+            for message in batch:
+                message.discord_excerpt, first_image_url = (
+                    get_discord_excerpt_and_first_image_url(text=message.message)
+                )
+                message.first_image_url = first_image_url or ""
+
+            Message.objects.bulk_update(
+                batch, fields=["discord_excerpt", "first_image_url"]
+            )
+
+            updated += len(batch)
+            last_pk = batch[-1].pk
+
+            self.stdout.write(msg=f"Updated {updated} of {total} messages.")
+
+        self.stdout.write(
+            msg=self.style.SUCCESS("The Discord excerpts have been updated.")
+        )
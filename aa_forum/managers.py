@@ -4,13 +4,38 @@ Managers for AA Forum models
 
 # pylint: disable=cyclic-import
 
+# Standard Library
+import time
+
 # Django
+from django.core.cache import cache
 from django.db import models
-from django.db.models import Prefetch, Q, QuerySet
+from django.db.models import (
+    BooleanField,
+    Count,
+    ExpressionWrapper,
+    F,
+    FilteredRelation,
+    Q,
+    QuerySet,
+)
 
 # Alliance Auth
 from allianceauth.authentication.models import User
 
+# AA Forum
+from aa_forum.helper.board_access import get_visible_board_ids
+
+# The forum settings, in the shared cache
+SETTING_VALUES_CACHE_KEY = "aa_forum:setting:values"
+
+# How long other processes may still use the former settings after they have
+# been changed (in seconds)
+SETTING_LOCAL_CACHE_TIMEOUT = 10
+
+# The forum settings, in the cache of this process
+_setting_values_local_cache = {}
+
 
 class SettingQuerySet(models.QuerySet):
     """
@@ -46,7 +71,55 @@ class SettingManager(models.Manager):
         :rtype:
         """
 
-        return getattr(self.first(), setting_key)
+        return self.get_setting_values()[setting_key]
+
+    def get_setting_values(self) -> dict:
+        """
+        Get all setting values
+
+        The values are cached in this process for `SETTING_LOCAL_CACHE_TIMEOUT`
+        seconds, and in the shared cache until the settings are saved again.
+        So they are read from the database only once after each change.
+
+        :return:
+        :rtype:
+        """
+
+        values, expires = _setting_values_local_cache.get("values", (None, 0.0))
+
+        if values is not None and expires > time.monotonic():
+            return values
+
+        values = cache.get(key=SETTING_VALUES_CACHE_KEY)
+
+        if values is None:
+            setting = self.model.get_solo()
+            values = {
+                field.name: getattr(setting, field.attname)
+                for field in self.model._meta.concrete_fields
+            }
+
+            cache.set(key=SETTING_VALUES_CACHE_KEY, value=values, timeout=None)
+
+        _setting_values_local_cache["values"] = (
+            values,
+            time.monotonic() + SETTING_LOCAL_CACHE_TIMEOUT,
+        )
+
+        return values
+
+    @staticmethod
+    def clear_cache() -> None:
+        """
+        Remove the setting values from the cache of this process and the
+        shared cache
+
+        :return:
+        :rtype:
+        """
+
+        _setting_values_local_cache.clear()
+        cache.delete(key=SETTING_VALUES_CACHE_KEY)
 
     def get_queryset(self):
         """
@@ -74,14 +147,15 @@ class BoardQuerySet(models.QuerySet):
         :rtype:
         """
 
-        # Forum manager always has access, so assign this permission wisely
-        if user.has_perm(perm="aa_forum.manage_forum"):
+        board_ids = get_visible_board_ids(user=user)
+
+        # Forum managers have access to all boards
+        if board_ids is None:
             return self
 
-        # If not a forum manager, check if the user has access to the board
-        return self.filter(
-            Q(groups__in=user.groups.all()) | Q(groups__isnull=True)
-        ).distinct()
+        # Filtering by the IDs of the visible boards doesn't need a join
+        # through the board groups, so no DISTINCT either
+        return self.filter(pk__in=board_ids)
 
 
 class BoardManagerBase(models.Manager):
@@ -110,14 +184,15 @@ class TopicQuerySet(models.QuerySet):
         :rtype:
         """
 
-        # Forum manager always has access, so assign this permission wisely
-        if user.has_perm(perm="aa_forum.manage_forum"):
+        board_ids = get_visible_board_ids(user=user)
+
+        # Forum managers have access to all boards
+        if board_ids is None:
             return self
 
-        # If not a forum manager, check if the user has access to the board
-        return self.filter(
-            Q(board__groups__in=user.groups.all()) | Q(board__groups__isnull=True)
-        ).distinct()
+        # Filtering by the IDs of the visible boards doesn't need a join
+        # through the board groups, so no DISTINCT either
+        return self.filter(board_id__in=board_ids)
 
     def get_from_slugs(
         self,
@@ -141,9 +216,9 @@ class TopicQuerySet(models.QuerySet):
         :rtype:
         """
 
-        # AA Forum
-        from aa_forum.models import Message  # pylint: disable=import-outside-toplevel
-
+        # The topic's messages are deliberately not prefetched here.
+        # Views only need the messages of a single page, so they fetch them
+        # via `Message.objects.get_messages_for_topic()` and paginate in the database.
         try:
             topic = (
                 self.select_related(
@@ -154,24 +229,12 @@ class TopicQuerySet(models.QuerySet):
                     "first_message__topic__board",
                     "first_message__topic__board__category",
                 )
-                .prefetch_related(
-                    Prefetch(
-                        lookup="messages",
-                        queryset=Message.objects.select_related(
-                            "user_created",
-                            "user_created__profile__main_character",
-                            "user_created__aa_forum_user_profile",
-                        ).order_by("time_posted"),
-                        to_attr="messages_sorted",
-                    )
-                )
                 .filter(
                     board__category__slug=str(category_slug),
                     board__slug=str(board_slug),
                     slug=str(topic_slug),
                 )
                 .user_has_access(user=user)
-                .distinct()
                 .get()
             )
         except self.model.DoesNotExist:
@@ -179,6 +242,127 @@ class TopicQuerySet(models.QuerySet):
 
         return topic
 
+    def get_topics_for_board(self, board: models.Model) -> QuerySet:
+        """
+        Get the topics of a board, ready to be paginated and displayed
+
+        Sticky topics come first, then the topics with the most recent message.
+        Per-topic numbers (posts, unread state) are not annotated here, so they
+        can be added for the topics of a single page only.
+
+        :param board:
+        :type board:
+        :return:
+        :rtype:
+        """
+
+        topics = (
+            self.filter(board=board)
+            .select_related(
+                "last_message",
+                "last_message__user_created",
+                "last_message__user_created__profile__main_character",
+                "first_message",
+                "first_message__user_created",
+                "first_message__user_created__profile__main_character",
+            )
+            .order_by("-is_sticky", "-last_message__time_posted", "-pk")
+        )
+
+        return topics
+
+    def _with_read_markers(self, user: User) -> models.QuerySet:
+        """
+        Join the board read watermark and the last message seen of the user
+
+        Both are plain LEFT JOINs on unique (board, user) and (topic, user)
+        rows, so no correlated subquery is needed per topic.
+
+        :param user:
+        :type user:
+        :return:
+        :rtype:
+        """
+
+        return self.alias(
+            user_read_watermark=FilteredRelation(
+                "board__read_watermarks",
+                condition=Q(board__read_watermarks__user=user),
+            ),
+            user_last_message_seen=FilteredRelation(
+                "last_message_seen", condition=Q(last_message_seen__user=user)
+            ),
+        )
+
+    @staticmethod
+    def _unread_condition() -> Q:
+        """
+        Condition for topics with messages the user has not read yet
+
+        :return:
+        :rtype:
+        """
+
+        last_message_time = F("last_message__time_posted")
+
+        return (
+            Q(user_read_watermark__read_until__isnull=True)
+            | Q(user_read_watermark__read_until__lt=last_message_time)
+        ) & (
+            Q(user_last_message_seen__message_time__isnull=True)
+            | Q(user_last_message_seen__message_time__lt=last_message_time)
+        )
+
+    def annotate_unread_state(self, user: User) -> models.QuerySet:
+        """
+        Annotate `has_unread_messages` for the given user
+
+        :param user:
+        :type user:
+        :return:
+        :rtype:
+        """
+
+        return self._with_read_markers(user=user).annotate(
+            has_unread_messages=ExpressionWrapper(
+                self._unread_condition(), output_field=BooleanField()
+            )
+        )
+
+    def unread(self, user: User) -> models.QuerySet:
+        """
+        Filter topics with messages the given user has not read yet
+
+        :param user:
+        :type user:
+        :return:
+        :rtype:
+        """
+
+        return self._with_read_markers(user=user).filter(self._unread_condition())
+
+    def unread_count_per_board(self, user: User) -> dict:
+        """
+        Number of unread topics per board for the given user, in one query
+
+        Boards without unread topics are not included. Access restrictions
+        are not checked here, the result is meant to be applied to boards
+        that have been fetched with `user_has_access()`.
+
+        :param user:
+        :type user:
+        :return: {board_id: number of unread topics}
+        :rtype:
+        """
+
+        return dict(
+            self.unread(user=user)
+            .order_by()
+            .values("board")
+            .annotate(num_unread=Count("pk", distinct=True))
+            .values_list("board", "num_unread")
+        )
+
 
 class TopicManagerBase(models.Manager):
     """
@@ -206,15 +390,15 @@ class MessageQuerySet(models.QuerySet):
         :rtype:
         """
 
-        # Forum manager always has access, so assign this permission wisely
-        if user.has_perm(perm="aa_forum.manage_forum"):
+        board_ids = get_visible_board_ids(user=user)
+
+        # Forum managers have access to all boards
+        if board_ids is None:
             return self
 
-        # If not a forum manager, check if the user has access to the board.
-        return self.filter(
-            Q(topic__board__groups__in=user.groups.all())
-            | Q(topic__board__groups__isnull=True)
-        ).distinct()
+        # Filtering by the IDs of the visible boards doesn't need a join
+        # through the board groups, so no DISTINCT either
+        return self.filter(topic__board_id__in=board_ids)
 
     def get_from_slugs(  # pylint: disable=too-many-arguments,too-many-positional-arguments
         self,
@@ -259,7 +443,6 @@ class MessageQuerySet(models.QuerySet):
                     pk=message_id,
                 )
                 .user_has_access(user=user)
-                .distinct()
                 .get()
             )
         except self.model.DoesNotExist:
@@ -267,6 +450,72 @@ class MessageQuerySet(models.QuerySet):
 
         return message
 
+    def permalinks(self) -> dict[int, str]:
+        """
+        URLs of the messages on their topic pages, with a single query
+
+        :return: {message ID: URL}
+        :rtype:
+        """
+
+        # AA Forum
+        from aa_forum.models import (  # pylint: disable=import-outside-toplevel
+            Setting,
+        )
+
+        messages_per_page = int(
+            Setting.objects.get_setting(setting_key=Setting.Field.MESSAGESPERPAGE)
+        )
+
+        return {
+            message_id: self.model.build_permalink(
+                category_slug=category_slug,
+                board_slug=board_slug,
+                topic_slug=topic_slug,
+                message_id=message_id,
+                ordinal=ordinal,
+                messages_per_page=messages_per_page,
+            )
+            for message_id, ordinal, topic_slug, board_slug, category_slug in (
+                self.order_by().values_list(
+                    "pk",
+                    "ordinal",
+                    "topic__slug",
+                    "topic__board__slug",
+                    "topic__board__category__slug",
+                )
+            )
+        }
+
+    def get_messages_for_topic(self, topic: models.Model) -> QuerySet:
+        """
+        Get the messages of a topic, ready to be paginated and displayed
+
+        The queryset is lazy, so slicing it (e.g. through a paginator) will
+        only fetch the messages of the requested page from the database.
+
+        :param topic:
+        :type topic:
+        :return:
+        :rtype:
+        """
+
+        # The topic, board and category are needed for the message links
+        messages = (
+            self.filter(topic=topic)
+            .select_related(
+                "topic",
+                "topic__board",
+                "topic__board__category",
+                "user_created",
+                "user_created__profile__main_character",
+                "user_created__aa_forum_user_profile",
+            )
+            .order_by("time_posted", "pk")
+        )
+
+        return messages
+
 
 class MessageManagerBase(models.Manager):
     """
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:17
+
+# Django
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aa_forum", "0019_alliance_auth_proxy_models"),
+        ("authentication", "0026_alter_characterownership_user_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["topic", "time_posted"], name="message_topic_time_posted"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="personalmessage",
+            index=models.Index(
+                fields=["recipient", "time_sent"], name="pm_recipient_time_sent"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="personalmessage",
+            index=models.Index(
+                fields=["sender", "time_sent"], name="pm_sender_time_sent"
+            ),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:25
+
+# Django
+from django.db import migrations, models
+from django.db.models import F, Func, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _subquery_count(queryset):
+    """
+    Count the rows of a correlated subquery
+    :param queryset:
+    :return:
+    """
+
+    return Coalesce(
+        Subquery(
+            queryset.order_by()
+            .annotate(count=Func(F("pk"), function="COUNT"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+def on_migrate(apps, schema_editor):
+    """
+    Populate the counters, boards include their child boards
+    :param apps:
+    :param schema_editor:
+    :return:
+    """
+
+    Board = apps.get_model("aa_forum", "Board")
+    Message = apps.get_model("aa_forum", "Message")
+    Topic = apps.get_model("aa_forum", "Topic")
+    db_alias = schema_editor.connection.alias
+
+    Topic.objects.using(db_alias).update(
+        message_count=_subquery_count(
+            queryset=Message.objects.filter(topic=OuterRef("pk"))
+        )
+    )
+    Board.objects.using(db_alias).update(
+        topic_count=_subquery_count(
+            queryset=Topic.objects.filter(
+                Q(board=OuterRef("pk")) | Q(board__parent_board=OuterRef("pk"))
+            )
+        ),
+        message_count=_subquery_count(
+            queryset=Message.objects.filter(
+                Q(topic__board=OuterRef("pk"))
+                | Q(topic__board__parent_board=OuterRef("pk"))
+            )
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aa_forum", "0020_keyset_pagination_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="board",
+            name="message_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Shortcut for better performance, includes child boards",
+            ),
+        ),
+        migrations.AddField(
+            model_name="board",
+            name="topic_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                help_text="Shortcut for better performance, includes child boards",
+            ),
+        ),
+        migrations.AddField(
+            model_name="topic",
+            name="message_count",
+            field=models.PositiveIntegerField(
+                default=0, editable=False, help_text="Shortcut for better performance"
+            ),
+        ),
+        migrations.RunPython(on_migrate, migrations.RunPython.noop),
+    ]
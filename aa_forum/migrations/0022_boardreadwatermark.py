@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:30
+
+# Django
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aa_forum", "0021_board_and_topic_counters"),
+        ("authentication", "0026_alter_characterownership_user_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BoardReadWatermark",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("read_until", models.DateTimeField()),
+                (
+                    "board",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="read_watermarks",
+                        to="aa_forum.board",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="aa_forum_board_read_watermarks",
+                        to="authentication.user",
+                    ),
+                ),
+            ],
+            options={
+                "default_permissions": (),
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("board", "user"), name="fpk_board_read_watermark"
+                    )
+                ],
+            },
+        ),
+    ]
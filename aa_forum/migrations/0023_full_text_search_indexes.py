@@ -0,0 +1,90 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:10
+
+# Django
+from django.db import migrations
+
+MYSQL_FULLTEXT_INDEXES = (
+    ("Message", "message_plaintext", "aa_forum_message_plaintext_ft"),
+    ("Topic", "subject", "aa_forum_topic_subject_ft"),
+)
+
+POSTGRESQL_GIN_INDEX_NAME = "aa_forum_message_search_gin"
+
+
+def _postgresql_gin_index():
+    """
+    GIN index for the full-text search, matching the expression
+    of `aa_forum.search.backends.PostgreSQLSearchBackend`
+    :return:
+    """
+
+    # Django
+    from django.contrib.postgres.indexes import GinIndex
+    from django.contrib.postgres.search import SearchVector
+
+    return GinIndex(
+        SearchVector("message_plaintext", config="simple"),
+        name=POSTGRESQL_GIN_INDEX_NAME,
+    )
+
+
+def on_migrate(apps, schema_editor):
+    """
+    Create the full-text search indexes, if the database supports them
+    :param apps:
+    :param schema_editor:
+    :return:
+    """
+
+    vendor = schema_editor.connection.vendor
+    quote_name = schema_editor.quote_name
+
+    if vendor == "mysql":
+        for model_name, field_name, index_name in MYSQL_FULLTEXT_INDEXES:
+            model = apps.get_model("aa_forum", model_name)
+            column = model._meta.get_field(field_name).column
+
+            schema_editor.execute(
+                f"CREATE FULLTEXT INDEX {quote_name(index_name)} "
+                f"ON {quote_name(model._meta.db_table)} ({quote_name(column)})"
+            )
+    elif vendor == "postgresql":
+        schema_editor.add_index(
+            apps.get_model("aa_forum", "Message"), _postgresql_gin_index()
+        )
+
+
+def on_migrate_zero(apps, schema_editor):
+    """
+    Drop the full-text search indexes
+    :param apps:
+    :param schema_editor:
+    :return:
+    """
+
+    vendor = schema_editor.connection.vendor
+    quote_name = schema_editor.quote_name
+
+    if vendor == "mysql":
+        for model_name, _, index_name in MYSQL_FULLTEXT_INDEXES:
+            model = apps.get_model("aa_forum", model_name)
+
+            schema_editor.execute(
+                f"DROP INDEX {quote_name(index_name)} "
+                f"ON {quote_name(model._meta.db_table)}"
+            )
+    elif vendor == "postgresql":
+        schema_editor.remove_index(
+            apps.get_model("aa_forum", "Message"), _postgresql_gin_index()
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aa_forum", "0022_boardreadwatermark"),
+    ]
+
+    operations = [
+        migrations.RunPython(on_migrate, on_migrate_zero),
+    ]
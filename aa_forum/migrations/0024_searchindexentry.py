@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:54
+
+# Django
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aa_forum", "0023_full_text_search_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SearchIndexEntry",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("term", models.CharField(max_length=100)),
+                (
+                    "position",
+                    models.PositiveIntegerField(
+                        help_text="Position of the word in the message text, for phrase search"
+                    ),
+                ),
+                (
+                    "message",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="search_index_entries",
+                        to="aa_forum.message",
+                    ),
+                ),
+            ],
+            options={
+                "default_permissions": (),
+                "indexes": [
+                    models.Index(
+                        fields=["term", "message", "position"],
+                        name="search_index_entry_term",
+                    )
+                ],
+            },
+        ),
+    ]
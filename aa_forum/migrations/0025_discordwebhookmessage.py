@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:01
+
+# Django
+import django.core.serializers.json
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aa_forum", "0024_searchindexentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DiscordWebhookMessage",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("webhook_url", models.CharField(max_length=254)),
+                ("content", models.TextField(blank=True)),
+                (
+                    "embeds",
+                    models.JSONField(
+                        default=list,
+                        encoder=django.core.serializers.json.DjangoJSONEncoder,
+                    ),
+                ),
+                ("time_created", models.DateTimeField(auto_now_add=True)),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                (
+                    "time_next_attempt",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+                ("is_failed", models.BooleanField(db_index=True, default=False)),
+                ("last_error", models.TextField(blank=True)),
+            ],
+            options={
+                "default_permissions": (),
+            },
+        ),
+    ]
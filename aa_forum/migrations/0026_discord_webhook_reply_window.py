@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:14
+
+# Django
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aa_forum", "0025_discordwebhookmessage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="board",
+            name="discord_webhook_reply_window",
+            field=models.PositiveSmallIntegerField(
+                default=0,
+                help_text="Collect replies for this many seconds and post them to Discord together, up to 10 replies per Discord message. Use this for busy boards to stay within Discord's rate limits. 0 posts every reply right away. (Default: 0)",
+            ),
+        ),
+        migrations.AddField(
+            model_name="discordwebhookmessage",
+            name="coalesce_key",
+            field=models.CharField(blank=True, db_index=True, max_length=50),
+        ),
+    ]
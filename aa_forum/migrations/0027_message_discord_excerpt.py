@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:18
+
+# Django
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aa_forum", "0026_discord_webhook_reply_window"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="discord_excerpt",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="message",
+            name="first_image_url",
+            field=models.TextField(blank=True),
+        ),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:46
+
+# Django
+from django.db import migrations, models
+
+BATCH_SIZE = 500
+
+
+def on_migrate(apps, schema_editor):
+    """
+    Number the existing messages of each topic
+    :param apps:
+    :type apps:
+    :param schema_editor:
+    :type schema_editor:
+    """
+
+    Message = apps.get_model("aa_forum", "Message")
+    db_alias = schema_editor.connection.alias
+    messages = []
+    topic_id = None
+    ordinal = 0
+
+    for message in (
+        Message.objects.using(db_alias)
+        .only("pk", "topic_id", "ordinal")
+        .order_by("topic_id", "time_posted", "pk")
+        .iterator(chunk_size=BATCH_SIZE)
+    ):
+        if message.topic_id != topic_id:
+            topic_id = message.topic_id
+            ordinal = 0
+
+        ordinal += 1
+        message.ordinal = ordinal
+        messages.append(message)
+
+        if len(messages) >= BATCH_SIZE:
+            Message.objects.using(db_alias).bulk_update(messages, fields=["ordinal"])
+            messages = []
+
+    Message.objects.using(db_alias).bulk_update(messages, fields=["ordinal"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aa_forum", "0027_message_discord_excerpt"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="message",
+            name="ordinal",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(on_migrate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 02:16
+
+# Django
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("aa_forum", "0028_message_ordinal"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="personalmessage",
+            name="notification_error",
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name="personalmessage",
+            name="notification_failed",
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -11,10 +11,12 @@ import unidecode
 from solo.models import SingletonModel
 
 # Django
-from django.db import models, transaction
-from django.db.models import Q
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, models, transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from django.urls import reverse
-from django.utils.html import strip_tags
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from django.utils.text import slugify
 from django.utils.translation import gettext_lazy as _
@@ -32,7 +34,7 @@ from aa_forum.constants import (
     DEFAULT_CATEGORY_AND_BOARD_SORT_ORDER,
     INTERNAL_URL_PREFIX,
 )
-from aa_forum.helper.text import string_cleanup
+from aa_forum.helper.text import parse_message, string_cleanup
 from aa_forum.managers import (
     BoardManager,
     MessageManager,
@@ -83,6 +85,56 @@ def _generate_slug(calling_model: models.Model, name: str) -> str:
     return slug_name
 
 
+def _exclude_counters_from_save(
+    instance: models.Model, counter_fields: tuple, kwargs: dict
+) -> None:
+    """
+    Make a full save of an existing object leave its counters alone
+
+    The counters are only changed in the database, so the values of an
+    instance in memory may be outdated and must not overwrite them.
+
+    :param instance:
+    :type instance:
+    :param counter_fields:
+    :type counter_fields:
+    :param kwargs: The keyword arguments of `save()`, will be modified
+    :type kwargs:
+    :return:
+    :rtype:
+    """
+
+    if instance._state.adding or kwargs.get("update_fields") is not None:
+        return
+
+    kwargs["update_fields"] = [
+        field.name
+        for field in instance._meta.concrete_fields
+        if not field.primary_key and field.name not in counter_fields
+    ]
+
+
+def _is_newest_message(message: "Message") -> Exists:
+    """
+    Condition for conditional UPDATEs of topics and boards, true when the
+    message is newer than their current last message
+
+    A message posted at the same time in another transaction may have
+    become the last message already.
+
+    :param message:
+    :type message:
+    :return:
+    :rtype:
+    """
+
+    return ~Exists(
+        Message.objects.filter(
+            pk=OuterRef("last_message"), time_posted__gt=message.time_posted
+        )
+    )
+
+
 def _users_with_permission(
     permission: Permission, include_superusers=True
 ) -> models.QuerySet:
@@ -247,6 +299,15 @@ class Board(models.Model):
             "(Default: NO)"
         ),
     )
+    discord_webhook_reply_window = models.PositiveSmallIntegerField(
+        default=0,
+        help_text=_(
+            "Collect replies for this many seconds and post them to Discord "
+            "together, up to 10 replies per Discord message. Use this for busy "
+            "boards to stay within Discord's rate limits. 0 posts every reply "
+            "right away. (Default: 0)"
+        ),
+    )
     parent_board = models.ForeignKey(
         to="self",
         blank=True,
@@ -307,9 +368,26 @@ class Board(models.Model):
         on_delete=models.SET_DEFAULT,
         help_text="Shortcut for better performance",  # Don't add this to translations
     )
+    topic_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        # Don't add this to translations
+        help_text="Shortcut for better performance, includes child boards",
+    )
+    message_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        # Don't add this to translations
+        help_text="Shortcut for better performance, includes child boards",
+    )
 
     objects: ClassVar[BoardManager] = BoardManager()
 
+    COUNTER_FIELDS = ("topic_count", "message_count")
+
+    # Like the counters, these are only changed in the database
+    MESSAGE_REFERENCE_FIELDS = ("first_message", "last_message")
+
     class Meta:  # pylint: disable=too-few-public-methods
         """
         Meta definitions
@@ -409,7 +487,8 @@ class Board(models.Model):
     @transaction.atomic()
     def save(self, *args, **kwargs):
         """
-        Generates the slug
+        Generates the slug, the counters are left alone for existing boards,
+        but move from the old to the new parent board with the board
 
         :param args:
         :type args:
@@ -419,9 +498,32 @@ class Board(models.Model):
         :rtype:
         """
 
+        old_parent_board_ids = []
+        update_fields = kwargs.get("update_fields")
+
+        # The old parent board is only needed when it can change
+        if not self._state.adding and (
+            update_fields is None or "parent_board" in update_fields
+        ):
+            old_parent_board_ids = list(
+                Board.objects.filter(pk=self.pk).values_list(
+                    "parent_board_id", flat=True
+                )
+            )
+
+        is_moved = bool(old_parent_board_ids) and (
+            old_parent_board_ids[0] != self.parent_board_id
+        )
+
         if self._state.adding is True or self.slug == INTERNAL_URL_PREFIX:
             self.slug = _generate_slug(calling_model=type(self), name=self.name)
 
+        _exclude_counters_from_save(
+            instance=self,
+            counter_fields=self.COUNTER_FIELDS + self.MESSAGE_REFERENCE_FIELDS,
+            kwargs=kwargs,
+        )
+
         super().save(*args, **kwargs)
 
         if self.slug == "":
@@ -430,6 +532,38 @@ class Board(models.Model):
             )
             self.save()
 
+        if is_moved:
+            self._move_to_parent_board(old_parent_board_id=old_parent_board_ids[0])
+
+    def _move_to_parent_board(self, old_parent_board_id: int) -> None:
+        """
+        Move the topic and message counters of this board from its old to its
+        new parent board, and update the first and last message of both
+
+        :param old_parent_board_id: `None` when it was a top-level board
+        :type old_parent_board_id:
+        :return:
+        :rtype:
+        """
+
+        counters = Board.objects.values("topic_count", "message_count").get(pk=self.pk)
+
+        if old_parent_board_id is not None:
+            Board.update_counters(
+                board_id=old_parent_board_id,
+                topics=-counters["topic_count"],
+                messages=-counters["message_count"],
+            )
+            Board.objects.get(pk=old_parent_board_id)._update_message_references()
+
+        if self.parent_board_id is not None:
+            Board.update_counters(
+                board_id=self.parent_board_id,
+                topics=counters["topic_count"],
+                messages=counters["message_count"],
+            )
+            self.parent_board._update_message_references()
+
     def get_absolute_url(self) -> str:
         """
         Calculate URL for this board and return it.
@@ -472,14 +606,13 @@ class Board(models.Model):
             Message.objects.filter(
                 Q(topic__board=self) | Q(topic__board__parent_board=self)
             )
+            .select_related("topic")
             .order_by("-time_posted")
             .first()
         )
 
         if self.last_message:
-            self.first_message = self.last_message.topic.messages.order_by(
-                "time_posted"
-            ).first()
+            self.first_message_id = self.last_message.topic.first_message_id
         else:
             self.first_message = None
 
@@ -488,6 +621,68 @@ class Board(models.Model):
         if self.parent_board:
             self.parent_board._update_message_references()
 
+    @classmethod
+    def update_counters(cls, board_id: int, topics: int = 0, messages: int = 0):
+        """
+        Add to the topic and message counters of a board and its parent board
+
+        The counters are updated in the database (`F()` expressions),
+        so concurrent updates don't overwrite each other.
+
+        :param board_id:
+        :type board_id:
+        :param topics:
+        :type topics:
+        :param messages:
+        :type messages:
+        :return:
+        :rtype:
+        """
+
+        cls.objects.filter(Q(pk=board_id) | Q(child_boards=board_id)).update(
+            topic_count=F("topic_count") + topics,
+            message_count=F("message_count") + messages,
+        )
+
+    @classmethod
+    def add_message(cls, message: "Message") -> None:
+        """
+        Count a new message in the board and its parent board, and make it
+        their last message, with a single conditional UPDATE
+
+        The first message of a board is the first message of the topic
+        with its last message.
+
+        :param message:
+        :type message:
+        :return:
+        :rtype:
+        """
+
+        is_newest = _is_newest_message(message=message)
+        board_id = message.topic.board_id
+
+        cls.objects.filter(Q(pk=board_id) | Q(child_boards=board_id)).update(
+            message_count=F("message_count") + 1,
+            first_message=Case(
+                When(
+                    is_newest,
+                    then=Subquery(
+                        Topic.objects.filter(pk=message.topic_id).values(
+                            "first_message"
+                        )[:1]
+                    ),
+                ),
+                default=F("first_message"),
+                output_field=Message._meta.pk,
+            ),
+            last_message=Case(
+                When(is_newest, then=Value(message.pk)),
+                default=F("last_message"),
+                output_field=Message._meta.pk,
+            ),
+        )
+
     def new_topic(self, subject: str, message: str, user: User) -> "Topic":
         """
         Start a new topic in this board
@@ -611,9 +806,19 @@ class Topic(models.Model):
         on_delete=models.SET_DEFAULT,
         help_text="Shortcut for better performance",  # Don't add this to translations
     )
+    message_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Shortcut for better performance",  # Don't add this to translations
+    )
 
     objects: ClassVar[TopicManager] = TopicManager()
 
+    COUNTER_FIELDS = ("message_count",)
+
+    # Like the counter, these are only changed in the database
+    MESSAGE_REFERENCE_FIELDS = ("first_message", "last_message")
+
     class Meta:  # pylint: disable=too-few-public-methods
         """
         Meta definitions
@@ -639,7 +844,8 @@ class Topic(models.Model):
     @transaction.atomic()
     def save(self, *args, **kwargs):
         """
-        Generate slug for new objects and update first and last messages.
+        Generate slug for new objects, update first and last messages,
+        and the counters of the board(s).
 
         :param args:
         :type args:
@@ -649,22 +855,42 @@ class Topic(models.Model):
         :rtype:
         """
 
-        if not self._state.adding and self.pk:
+        old_instance = None
+        is_new = self._state.adding or not self.pk
+        update_fields = kwargs.get("update_fields")
+
+        # The old instance is only needed when the board or the first or last
+        # message can change
+        if not is_new and (
+            update_fields is None
+            or {"board", "first_message", "last_message"} & set(update_fields)
+        ):
             try:
                 old_instance = Topic.objects.get(pk=self.pk)
             except Topic.DoesNotExist:
-                old_instance = None
-        else:
-            old_instance = None
+                is_new = True
 
-        board_needs_update = old_instance and (
-            old_instance.first_message != self.first_message
-            or old_instance.last_message != self.last_message
+        # The first and last message are only saved when asked for explicitly
+        board_needs_update = (
+            old_instance is not None
+            and update_fields is not None
+            and (
+                old_instance.first_message_id != self.first_message_id
+                or old_instance.last_message_id != self.last_message_id
+            )
         )
+        is_moved = old_instance and old_instance.board_id != self.board_id
 
         if self._state.adding is True or self.slug == INTERNAL_URL_PREFIX:
             self.slug = _generate_slug(calling_model=type(self), name=self.subject)
 
+        if old_instance:
+            _exclude_counters_from_save(
+                instance=self,
+                counter_fields=self.COUNTER_FIELDS + self.MESSAGE_REFERENCE_FIELDS,
+                kwargs=kwargs,
+            )
+
         super().save(*args, **kwargs)
 
         if self.slug == "":
@@ -673,7 +899,23 @@ class Topic(models.Model):
             )
             self.save()
 
-        if board_needs_update:
+        if is_new:
+            Board.update_counters(board_id=self.board_id, topics=1)
+
+        if is_moved:
+            Board.update_counters(
+                board_id=old_instance.board_id,
+                topics=-1,
+                messages=-old_instance.message_count,
+            )
+            Board.update_counters(
+                board_id=self.board_id,
+                topics=1,
+                messages=old_instance.message_count,
+            )
+            old_instance.board._update_message_references()
+
+        if board_needs_update or is_moved:
             self.board._update_message_references()
 
     @transaction.atomic()
@@ -689,10 +931,17 @@ class Topic(models.Model):
         :rtype:
         """
 
-        board_needs_update = (
-            self.first_message == self.board.first_message
-            or self.last_message == self.board.last_message
-        )
+        # Checked in the database, the board in memory doesn't know about
+        # messages that have been posted since it was loaded
+        board_needs_update = Board.objects.filter(
+            Q(first_message__topic=self.pk) | Q(last_message__topic=self.pk),
+            pk=self.board_id,
+        ).exists()
+
+        # Make sure the board counters are reduced by the actual number of
+        # messages (see `aa_forum.signals.update_board_counters_on_topic_delete()`)
+        self.refresh_from_db(fields=["message_count"])
+
         super().delete(*args, **kwargs)
 
         if board_needs_update:
@@ -765,6 +1014,82 @@ class LastMessageSeen(models.Model):
         return f"{self.topic}-{self.user}-{self.message_time}"
 
 
+class BoardReadWatermark(models.Model):
+    """
+    Stores up to when a user has read all topics of a board.
+
+    Topics whose last message is not newer than `read_until` are read, other
+    topics are read when `LastMessageSeen` says so (per-topic exceptions).
+    """
+
+    board = models.ForeignKey(
+        to=Board, on_delete=models.CASCADE, related_name="read_watermarks"
+    )
+    user = models.ForeignKey(
+        to=User,
+        on_delete=models.CASCADE,
+        related_name="aa_forum_board_read_watermarks",
+    )
+    read_until = models.DateTimeField()
+
+    class Meta:  # pylint: disable=too-few-public-methods
+        """
+        Meta definitions
+        """
+
+        default_permissions = ()
+        constraints = [
+            models.UniqueConstraint(
+                fields=["board", "user"], name="fpk_board_read_watermark"
+            )
+        ]
+
+    def __str__(self) -> str:
+        """
+        Return a string representation of this object
+
+        :return:
+        :rtype:
+        """
+
+        return f"{self.board}-{self.user}-{self.read_until}"
+
+    @classmethod
+    def set_read_until(cls, user: User, board_ids: list, read_until) -> None:
+        """
+        Set the read watermark of the given boards for a user
+
+        Existing watermarks are updated, missing ones are created, all in
+        a single upsert query.
+
+        :param user:
+        :type user:
+        :param board_ids:
+        :type board_ids:
+        :param read_until:
+        :type read_until:
+        :return:
+        :rtype:
+        """
+
+        # MySQL upserts on any unique key and doesn't accept a conflict target
+        unique_fields = (
+            ["board", "user"]
+            if connection.features.supports_update_conflicts_with_target
+            else None
+        )
+
+        cls.objects.bulk_create(
+            [
+                cls(board_id=board_id, user=user, read_until=read_until)
+                for board_id in board_ids
+            ],
+            update_conflicts=True,
+            unique_fields=unique_fields,
+            update_fields=["read_until"],
+        )
+
+
 class Message(models.Model):
     """
     Message
@@ -791,6 +1116,10 @@ class Message(models.Model):
     )
     message = CKEditor5Field(blank=False, config_name="extends")
     message_plaintext = models.TextField(blank=True)
+    discord_excerpt = models.TextField(blank=True)
+    first_image_url = models.TextField(blank=True)
+    # Position in the topic (1 = first message), in the order of `time_posted`
+    ordinal = models.PositiveIntegerField(default=0, editable=False)
 
     objects: ClassVar[MessageManager] = MessageManager()
 
@@ -802,6 +1131,11 @@ class Message(models.Model):
         default_permissions = ()
         verbose_name = _("message")
         verbose_name_plural = _("messages")
+        indexes = [
+            models.Index(
+                fields=["topic", "time_posted"], name="message_topic_time_posted"
+            ),
+        ]
 
     def __str__(self) -> str:
         return str(self.pk)
@@ -819,23 +1153,53 @@ class Message(models.Model):
         :rtype:
         """
 
-        self.message = string_cleanup(string=self.message)
-        self.message_plaintext = strip_tags(value=self.message)
+        parsed_message = parse_message(text=self.message)
+
+        self.message = parsed_message.html
+        self.message_plaintext = parsed_message.plaintext
+        self.discord_excerpt = parsed_message.get_discord_excerpt()
+        self.first_image_url = parsed_message.first_image_url or ""
+
+        is_new = self._state.adding
 
         super().save(*args, **kwargs)
 
-        update_fields = []
+        if is_new:
+            # New messages are the last ones of their topic and board(s), which
+            # are updated with one conditional UPDATE per level. Topics and boards
+            # are only fully recomputed when their first or last message is deleted.
+            Topic.objects.filter(pk=self.topic_id).update(
+                message_count=F("message_count") + 1,
+                first_message=Coalesce(
+                    F("first_message"), Value(self.pk), output_field=Message._meta.pk
+                ),
+                last_message=Case(
+                    When(_is_newest_message(message=self), then=Value(self.pk)),
+                    default=F("last_message"),
+                    output_field=Message._meta.pk,
+                ),
+            )
+            Board.add_message(message=self)
+
+            # New messages are normally the last ones in their topic, messages
+            # posted later (e.g. when it has been backdated) move up one place.
+            # The update above locks the topic, so concurrent messages are
+            # numbered one after another.
+            later_messages = Message.objects.filter(
+                topic_id=self.topic_id, time_posted__gt=self.time_posted
+            ).update(ordinal=F("ordinal") + 1)
+            self.ordinal = (
+                Topic.objects.values_list("message_count", flat=True).get(
+                    pk=self.topic_id
+                )
+                - later_messages
+            )
+            Message.objects.filter(pk=self.pk).update(ordinal=self.ordinal)
 
-        if not self.topic.first_message:
-            self.topic.first_message = self
-            update_fields.append("first_message")
+            if self.topic.first_message_id is None:
+                self.topic.first_message = self
 
-        if self.topic.last_message != self:
             self.topic.last_message = self
-            update_fields.append("last_message")
-
-        if update_fields:
-            self.topic.save(update_fields=update_fields)
 
     @transaction.atomic()
     def delete(self, *args, **kwargs):
@@ -850,14 +1214,26 @@ class Message(models.Model):
         :rtype:
         """
 
-        topic_needs_update = self in (self.topic.first_message, self.topic.last_message)
-        board_needs_update = self in (
-            self.topic.board.first_message,
-            self.topic.board.last_message,
-        )
+        # Checked in the database, the topic and board in memory don't know
+        # about messages that have been posted since they were loaded
+        is_reference = Q(first_message=self.pk) | Q(last_message=self.pk)
+        topic_needs_update = Topic.objects.filter(
+            is_reference, pk=self.topic_id
+        ).exists()
+        board_needs_update = Board.objects.filter(
+            is_reference, pk=self.topic.board_id
+        ).exists()
 
         super().delete(*args, **kwargs)
 
+        Topic.objects.filter(pk=self.topic_id).update(
+            message_count=F("message_count") - 1
+        )
+        Message.objects.filter(topic_id=self.topic_id, ordinal__gt=self.ordinal).update(
+            ordinal=F("ordinal") - 1
+        )
+        Board.update_counters(board_id=self.topic.board_id, messages=-1)
+
         if topic_needs_update:
             self.topic._update_message_references()
 
@@ -868,42 +1244,113 @@ class Message(models.Model):
         """
         Calculate URL for this message and return it.
 
+        Uses the slugs of the topic, board and category, so select them with
+        the message, or use `MessageQuerySet.permalinks`.
+
         :return:
         :rtype:
         """
 
-        messages_per_topic = int(
-            Setting.objects.get_setting(setting_key=Setting.Field.MESSAGESPERPAGE)
+        return self.build_permalink(
+            category_slug=self.topic.board.category.slug,
+            board_slug=self.topic.board.slug,
+            topic_slug=self.topic.slug,
+            message_id=self.pk,
+            ordinal=self.ordinal,
         )
-        position = (
-            self.topic.messages.order_by("time_posted")
-            .filter(time_posted__lt=self.time_posted)
-            .count()
-        ) + 1
 
-        page = math.ceil(position / messages_per_topic)
+    @staticmethod
+    def build_permalink(  # pylint: disable=too-many-arguments
+        category_slug: str,
+        board_slug: str,
+        topic_slug: str,
+        message_id: int,
+        ordinal: int,
+        messages_per_page: int = None,
+    ) -> str:
+        """
+        URL of a message on its topic page
+
+        The page is calculated from the position of the message in its topic,
+        see `MessageQuerySet.permalinks` to get the URLs of many messages.
+
+        :param category_slug:
+        :type category_slug:
+        :param board_slug:
+        :type board_slug:
+        :param topic_slug:
+        :type topic_slug:
+        :param message_id:
+        :type message_id:
+        :param ordinal:
+        :type ordinal:
+        :param messages_per_page: Defaults to the forum setting
+        :type messages_per_page:
+        :return:
+        :rtype:
+        """
+
+        if messages_per_page is None:
+            messages_per_page = int(
+                Setting.objects.get_setting(setting_key=Setting.Field.MESSAGESPERPAGE)
+            )
+
+        page = math.ceil(ordinal / messages_per_page)
 
         if page > 1:
             redirect_path = reverse(
                 viewname="aa_forum:forum_topic",
-                args=(
-                    self.topic.board.category.slug,
-                    self.topic.board.slug,
-                    self.topic.slug,
-                    page,
-                ),
+                args=(category_slug, board_slug, topic_slug, page),
             )
         else:
             redirect_path = reverse(
                 viewname="aa_forum:forum_topic",
-                args=(
-                    self.topic.board.category.slug,
-                    self.topic.board.slug,
-                    self.topic.slug,
-                ),
+                args=(category_slug, board_slug, topic_slug),
+            )
+
+        return f"{redirect_path}#message-{message_id}"
+
+
+class SearchIndexEntry(models.Model):
+    """
+    Posting of the built-in search index: a term and where it occurs in a message.
+
+    Maintained on every save of a message when the `index` search backend is
+    active, see `aa_forum.search.index`.
+    """
+
+    TERM_MAX_LENGTH = 100
+
+    term = models.CharField(max_length=TERM_MAX_LENGTH)
+    message = models.ForeignKey(
+        to=Message, on_delete=models.CASCADE, related_name="search_index_entries"
+    )
+    position = models.PositiveIntegerField(
+        help_text="Position of the word in the message text, for phrase search"
+    )
+
+    class Meta:  # pylint: disable=too-few-public-methods
+        """
+        Meta definitions
+        """
+
+        default_permissions = ()
+        indexes = [
+            models.Index(
+                fields=["term", "message", "position"],
+                name="search_index_entry_term",
             )
+        ]
+
+    def __str__(self) -> str:
+        """
+        Return a string representation of this object
+
+        :return:
+        :rtype:
+        """
 
-        return f"{redirect_path}#message-{self.pk}"
+        return f"{self.term}-{self.message_id}-{self.position}"
 
 
 class PersonalMessage(models.Model):
@@ -935,6 +1382,10 @@ class PersonalMessage(models.Model):
     deleted_by_sender = models.BooleanField(default=False)
     deleted_by_recipient = models.BooleanField(default=False)
 
+    # Set when the Discord DM about this message could not be sent
+    notification_failed = models.BooleanField(default=False)
+    notification_error = models.TextField(blank=True)
+
     objects: ClassVar[PersonalMessageManager] = PersonalMessageManager()
 
     class Meta:  # pylint: disable=too-few-public-methods
@@ -945,6 +1396,12 @@ class PersonalMessage(models.Model):
         default_permissions = ()
         verbose_name = _("personal message")
         verbose_name_plural = _("personal messages")
+        indexes = [
+            models.Index(
+                fields=["recipient", "time_sent"], name="pm_recipient_time_sent"
+            ),
+            models.Index(fields=["sender", "time_sent"], name="pm_sender_time_sent"),
+        ]
 
     def __str__(self) -> str:
         """
@@ -976,16 +1433,16 @@ class PersonalMessage(models.Model):
 
         super().save(*args, **kwargs)
 
-        # Try to send a Discord PM when we have a new message
+        # Queue a Discord PM when we have a new message
         if is_new_message is True:
             # Needs to be imported here, otherwise it's a circular import
             # AA Forum
-            from aa_forum.helper.discord_messages import (  # pylint: disable=import-outside-toplevel
-                send_new_personal_message_notification,
+            from aa_forum.helper.personal_messages import (  # pylint: disable=import-outside-toplevel
+                queue_new_personal_message_notification,
             )
 
             # Sending Discord PM for new personal message, if the user wants it
-            send_new_personal_message_notification(message=self)
+            queue_new_personal_message_notification(message=self)
 
 
 class Setting(SingletonModel):
@@ -1048,6 +1505,26 @@ class Setting(SingletonModel):
 
         return str(_("Forum settings"))
 
+    def save(self, *args, **kwargs):
+        """
+        Save the settings and remove them from the cache
+
+        The cache is cleared again after the transaction has been committed,
+        so no other process can cache the former settings in the meantime.
+
+        :param args:
+        :type args:
+        :param kwargs:
+        :type kwargs:
+        :return:
+        :rtype:
+        """
+
+        super().save(*args, **kwargs)
+
+        Setting.objects.clear_cache()
+        transaction.on_commit(Setting.objects.clear_cache)
+
 
 class UserProfile(models.Model):
     """
@@ -1103,3 +1580,44 @@ class UserProfile(models.Model):
         self.signature = string_cleanup(string=self.signature)
 
         super().save(*args, **kwargs)
+
+
+class DiscordWebhookMessage(models.Model):
+    """
+    Outbox for messages to Discord webhooks
+
+    Messages are sent by the `send_discord_webhook_message` task after the
+    transaction that created them has been committed, and deleted once they
+    have been delivered. Messages that could not be delivered are kept with
+    `is_failed` set.
+    """
+
+    webhook_url = models.CharField(max_length=254)
+    content = models.TextField(blank=True)
+    embeds = models.JSONField(default=list, encoder=DjangoJSONEncoder)
+    time_created = models.DateTimeField(auto_now_add=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    time_next_attempt = models.DateTimeField(default=timezone.now)
+    is_failed = models.BooleanField(default=False, db_index=True)
+    last_error = models.TextField(blank=True)
+
+    # Replies to the same board are added to a pending message with this key,
+    # it is cleared once the message is being sent
+    coalesce_key = models.CharField(max_length=50, blank=True, db_index=True)
+
+    class Meta:  # pylint: disable=too-few-public-methods
+        """
+        Meta definitions
+        """
+
+        default_permissions = ()
+
+    def __str__(self) -> str:
+        """
+        Return a string representation of this object
+
+        :return:
+        :rtype:
+        """
+
+        return f"{self.pk}-{self.time_created}"
@@ -0,0 +1,289 @@
+"""
+Process-wide client for discordproxy
+
+`discordproxy.client.DiscordClient` opens a new gRPC channel for every
+request. This client keeps one channel per process open instead, which is
+reused by all requests and kept alive with HTTP/2 pings.
+"""
+
+# Standard Library
+import os
+import threading
+import weakref
+
+# Alliance Auth
+from allianceauth.services.hooks import get_extension_logger
+
+# AA Forum
+from aa_forum.app_settings import (
+    AA_FORUM_DISCORDPROXY_MAX_CONCURRENT_REQUESTS,
+    DISCORDPROXY_HOST,
+    DISCORDPROXY_PORT,
+    DISCORDPROXY_TIMEOUT,
+)
+from aa_forum.providers.applogger import AppLogger
+
+logger = AppLogger(my_logger=get_extension_logger(name=__name__))
+
+# Options for the gRPC channel. The keepalive time must not be shorter than
+# the minimum ping interval of the gRPC server (5 minutes by default),
+# otherwise the server closes the connection.
+DISCORDPROXY_CHANNEL_OPTIONS = (
+    ("grpc.keepalive_time_ms", 300_000),
+    ("grpc.keepalive_timeout_ms", 20_000),
+    ("grpc.keepalive_permit_without_calls", 0),
+)
+
+
+class DiscordProxyClient:
+    """
+    Client for discordproxy, which reuses its gRPC channel
+
+    The channel is opened with the first request and opened again when the
+    connection to discordproxy has been lost, or when the process has been
+    forked (e.g. a Celery worker), since gRPC channels can't be shared
+    between processes. The same goes for the lock and the request slots,
+    which are created with the first request in each process.
+
+    The number of concurrent requests is limited, requests that have to wait
+    longer than their timeout for a free slot fail with a timeout error.
+    """
+
+    def __init__(
+        self, target: str, timeout: float = None, max_concurrent_requests: int = 10
+    ):
+        """
+        Initialize the client
+
+        :param target: Address of discordproxy, e.g. `localhost:50051`
+        :type target:
+        :param timeout: Default timeout for requests (in seconds)
+        :type timeout:
+        :param max_concurrent_requests:
+        :type max_concurrent_requests:
+        """
+
+        self.target = target
+        self.timeout = timeout
+        self.max_concurrent_requests = max_concurrent_requests
+
+        self._lock = None
+        self._slots = None
+        self._channel = None
+        self._stub = None
+
+        self.channels_opened = 0
+        self.requests = 0
+
+        _clients.add(self)
+
+    @property
+    def metrics(self) -> dict:
+        """
+        How often the channel has been reused
+
+        :return:
+        :rtype:
+        """
+
+        return {
+            "channels_opened": self.channels_opened,
+            "requests": self.requests,
+            "channel_reuses": self.requests - self.channels_opened,
+        }
+
+    def _get_locks(self) -> tuple:
+        """
+        Get the lock and the request slots of this process, create them if needed
+
+        :return: The lock and the request slots
+        :rtype:
+        """
+
+        if self._slots is None:
+            with _clients_lock:
+                if self._slots is None:
+                    self._lock = threading.Lock()
+                    self._slots = threading.BoundedSemaphore(
+                        value=self.max_concurrent_requests
+                    )
+
+        return self._lock, self._slots
+
+    def _reset_after_fork(self) -> None:
+        """
+        Forget the lock, the request slots and the channel of the parent process
+
+        The channel isn't closed, as it still belongs to the parent process.
+
+        :return:
+        :rtype:
+        """
+
+        self._lock = None
+        self._slots = None
+        self._channel = None
+        self._stub = None
+
+    def _get_stub(self):
+        """
+        Get the stub for the open channel, open it if needed
+
+        :return:
+        :rtype:
+        """
+
+        # Third Party
+        import grpc  # pylint: disable=import-outside-toplevel
+        from discordproxy.discord_api_pb2_grpc import (  # pylint: disable=import-outside-toplevel
+            DiscordApiStub,
+        )
+
+        lock, _ = self._get_locks()
+
+        with lock:
+            if self._stub is None:
+                self._channel = grpc.insecure_channel(
+                    target=self.target, options=DISCORDPROXY_CHANNEL_OPTIONS
+                )
+                self._stub = DiscordApiStub(channel=self._channel)
+                self.channels_opened += 1
+
+                logger.debug(
+                    msg=f"Opened gRPC channel to discordproxy at {self.target}."
+                )
+
+            self.requests += 1
+
+            return self._stub
+
+    def close(self) -> None:
+        """
+        Close the channel, the next request opens a new one
+
+        :return:
+        :rtype:
+        """
+
+        lock, _ = self._get_locks()
+
+        with lock:
+            if self._channel is not None:
+                self._channel.close()
+
+            self._channel = None
+            self._stub = None
+
+    def create_direct_message(
+        self, user_id: int, content: str = "", embed=None, timeout: float = None
+    ):
+        """
+        Send a direct message to a user on Discord
+
+        :param user_id:
+        :type user_id:
+        :param content:
+        :type content:
+        :param embed:
+        :type embed: discordproxy.discord_api_pb2.Embed
+        :param timeout: Timeout for this request (in seconds)
+        :type timeout:
+        :return: The created message
+        :rtype: discordproxy.discord_api_pb2.Message
+        """
+
+        # Third Party
+        # pylint: disable=import-outside-toplevel
+        from discordproxy.discord_api_pb2 import SendDirectMessageRequest
+        from discordproxy.exceptions import (
+            DiscordProxyGrpcError,
+            DiscordProxyTimeoutError,
+            to_discord_proxy_exception,
+        )
+        from grpc import RpcError, StatusCode
+
+        if not content and not embed:
+            raise ValueError("Either content or embed need to be specified.")
+
+        timeout = timeout or self.timeout
+        _, slots = self._get_locks()
+
+        # Released in the `finally` below, a `with` block can't time out
+        acquired = slots.acquire(timeout=timeout)  # pylint: disable=consider-using-with
+
+        if not acquired:
+            raise DiscordProxyTimeoutError(
+                status=StatusCode.DEADLINE_EXCEEDED,
+                details="Too many concurrent requests to discordproxy.",
+            )
+
+        try:
+            response = self._get_stub().SendDirectMessage(
+                request=SendDirectMessageRequest(
+                    user_id=user_id, content=content, embed=embed
+                ),
+                timeout=timeout,
+            )
+        except RpcError as exc:
+            error = to_discord_proxy_exception(exc)
+
+            # Connect again with the next request
+            if (
+                isinstance(error, DiscordProxyGrpcError)
+                and error.status is StatusCode.UNAVAILABLE
+            ):
+                self.close()
+
+            raise error from exc
+        finally:
+            slots.release()
+
+        return response.message
+
+
+def _reset_after_fork() -> None:
+    """
+    Forget the locks, request slots and channels of the parent process in a
+    forked process (e.g. a Celery worker), they might be held or in use there
+
+    :return:
+    :rtype:
+    """
+
+    global _clients_lock  # pylint: disable=global-statement
+
+    _clients_lock = threading.Lock()
+
+    for client in list(_clients):
+        client._reset_after_fork()  # pylint: disable=protected-access
+
+
+# All clients of this process, and the lock for creating their locks and the
+# shared client. It is created again in forked processes.
+_clients = weakref.WeakSet()
+_clients_lock = threading.Lock()
+_client = None
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_discordproxy_client() -> DiscordProxyClient:
+    """
+    Get the client for discordproxy, which is shared by the whole process
+
+    :return:
+    :rtype:
+    """
+
+    global _client  # pylint: disable=global-statement
+
+    with _clients_lock:
+        if _client is None:
+            _client = DiscordProxyClient(
+                target=f"{DISCORDPROXY_HOST}:{DISCORDPROXY_PORT}",
+                timeout=DISCORDPROXY_TIMEOUT,
+                max_concurrent_requests=AA_FORUM_DISCORDPROXY_MAX_CONCURRENT_REQUESTS,
+            )
+
+    return _client
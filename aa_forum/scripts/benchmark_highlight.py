@@ -0,0 +1,139 @@
+"""
+Compare the cost per search result of the former search term highlighting
+(one `re.sub` per term and BeautifulSoup to repair the attributes) with the
+single pass highlighter, uncached and cached.
+
+Shortcuts:
+- from aa_forum.scripts import benchmark_highlight;benchmark_highlight.run()
+"""
+
+# Standard Library
+import re
+import statistics
+import time
+
+# Third Party
+from bs4 import BeautifulSoup
+
+# Django
+from django.core.cache import cache
+
+# AA Forum
+from aa_forum.helper.highlight import (
+    _highlight,
+    _highlight_cache_key,
+    get_search_terms_pattern,
+    highlight_search_terms,
+)
+from aa_forum.scripts.benchmark_text import DOCUMENTS
+
+REPETITIONS = 20
+SEARCH_TERMS = ("rifter", "pilot", "screenshot", "fleet")
+
+_SEARCH_TERMS_SET = frozenset(SEARCH_TERMS)
+
+_DELIMITER_START = "{«}"
+_DELIMITER_END = "{»}"
+
+
+def _former_highlighter(text: str) -> str:
+    """
+    The search term highlighting as it was before
+    """
+
+    highlighted = text
+
+    for search_term in SEARCH_TERMS:
+        highlighted = re.sub(
+            pattern=f"(?i)({(re.escape(search_term))})",
+            repl=f"{_DELIMITER_START}\\1{_DELIMITER_END}",
+            string=highlighted,
+        )
+
+    highlighted = BeautifulSoup(markup=highlighted, features="html.parser")
+
+    for tag_name, attributes in (
+        ("a", ("href", "title", "name")),
+        ("img", ("src", "alt", "title")),
+    ):
+        for tag in highlighted.findAll(name=tag_name):
+            for attribute in attributes:
+                if attribute in tag.attrs:
+                    tag[attribute] = (
+                        tag[attribute]
+                        .replace(_DELIMITER_START, "")
+                        .replace(_DELIMITER_END, "")
+                    )
+
+    return (
+        str(highlighted)
+        .replace(_DELIMITER_START, '<span class="aa-forum-search-term-highlight">')
+        .replace(_DELIMITER_END, "</span>")
+    )
+
+
+def _single_pass(text: str) -> str:
+    """
+    The single pass highlighter, without the cache
+    """
+
+    return _highlight(
+        text=text, pattern=get_search_terms_pattern(search_terms=_SEARCH_TERMS_SET)
+    )
+
+
+def _cached(text: str) -> str:
+    """
+    The single pass highlighter, with the cache
+    """
+
+    return highlight_search_terms(text=text, search_terms=SEARCH_TERMS)
+
+
+def _measure(function, text: str) -> float:
+    """
+    Median time in milliseconds to highlight the text
+    """
+
+    timings = []
+
+    for _ in range(REPETITIONS):
+        start = time.perf_counter()
+        function(text)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(timings)
+
+
+def run():
+    """
+    Run the benchmark
+    """
+
+    print(f"Search terms: {', '.join(SEARCH_TERMS)}")
+    print(
+        f"{'Document':>16} | {'Size (kB)':>9} | {'Former (ms)':>11} "
+        f"| {'Single pass (ms)':>16} | {'Cached (ms)':>11}"
+    )
+
+    for name, document in DOCUMENTS:
+        text = document()
+
+        # Warm up the cache
+        _cached(text)
+
+        print(
+            f"{name:>16} | {len(text) / 1024:>9.1f} "
+            f"| {_measure(_former_highlighter, text):>11.2f} "
+            f"| {_measure(_single_pass, text):>16.2f} "
+            f"| {_measure(_cached, text):>11.2f}"
+        )
+
+        cache.delete(
+            key=_highlight_cache_key(
+                text=text,
+                pattern=get_search_terms_pattern(search_terms=_SEARCH_TERMS_SET),
+            )
+        )
+
+    print("DONE")
@@ -0,0 +1,128 @@
+"""
+Compare offset and keyset pagination of a long topic across page depth.
+
+All benchmark data is created in a transaction that is rolled back afterwards.
+
+Shortcuts:
+- from aa_forum.scripts import benchmark_pagination;benchmark_pagination.run()
+"""
+
+# Standard Library
+import statistics
+import time
+import uuid
+
+# Django
+from django.core.paginator import Paginator
+from django.db import transaction
+
+# Alliance Auth
+from allianceauth.authentication.models import User
+
+# AA Forum
+from aa_forum.helper.pagination import KeysetPaginator
+from aa_forum.models import Board, Category, Message, Topic
+
+NUMBER_OF_MESSAGES = 20000
+MESSAGES_PER_PAGE = 20
+REPETITIONS = 5
+PAGE_DEPTHS = (0.0, 0.25, 0.5, 0.75, 1.0)
+
+
+def _measure(fetch_page) -> float:
+    """
+    Median time in milliseconds to fetch a page
+    """
+
+    timings = []
+
+    for _ in range(REPETITIONS):
+        start = time.perf_counter()
+        fetch_page()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(timings)
+
+
+def run():
+    """
+    Run the benchmark
+    """
+
+    user = User.objects.first()
+
+    with transaction.atomic():
+        category = Category.objects.create(name=f"Benchmark {uuid.uuid4()}")
+        board = Board.objects.create(name="Benchmark", category=category)
+        topic = Topic.objects.create(board=board, subject="Benchmark")
+
+        print(f"Creating {NUMBER_OF_MESSAGES} messages…")
+
+        Message.objects.bulk_create(
+            [
+                Message(
+                    topic=topic,
+                    user_created=user,
+                    message=f"<p>Message {num}</p>",
+                    message_plaintext=f"Message {num}",
+                )
+                for num in range(NUMBER_OF_MESSAGES)
+            ],
+            batch_size=1000,
+        )
+
+        messages = Message.objects.filter(topic=topic)
+        count = messages.count()
+        cache_key = f"benchmark:{uuid.uuid4()}"
+        offset_paginator = Paginator(
+            object_list=messages.order_by("time_posted", "pk"),
+            per_page=MESSAGES_PER_PAGE,
+        )
+
+        def keyset_paginator():
+            return KeysetPaginator(
+                object_list=messages,
+                per_page=MESSAGES_PER_PAGE,
+                ordering=("time_posted", "pk"),
+                cache_key=cache_key,
+                count=count,
+            )
+
+        print(
+            f"{'Page':>8} | {'OFFSET (ms)':>12} | {'Keyset cold (ms)':>17} "
+            f"| {'Keyset warm (ms)':>17}"
+        )
+
+        for depth in PAGE_DEPTHS:
+            number = max(1, round(offset_paginator.num_pages * depth))
+
+            offset_ms = _measure(lambda: list(offset_paginator.page(number=number)))
+
+            # Cold: every repetition has to find the anchor on its own
+            cold_timings = []
+
+            for _ in range(REPETITIONS):
+                cold_paginator = KeysetPaginator(
+                    object_list=messages,
+                    per_page=MESSAGES_PER_PAGE,
+                    ordering=("time_posted", "pk"),
+                    cache_key=f"benchmark:{uuid.uuid4()}",
+                    count=count,
+                )
+                start = time.perf_counter()
+                list(cold_paginator.page(number=number))
+                cold_timings.append((time.perf_counter() - start) * 1000)
+
+            cold_ms = statistics.median(cold_timings)
+
+            # Warm: the anchor is cached after the first request
+            list(keyset_paginator().page(number=number))
+            warm_ms = _measure(lambda: list(keyset_paginator().page(number=number)))
+
+            print(
+                f"{number:>8} | {offset_ms:>12.2f} | {cold_ms:>17.2f} | {warm_ms:>17.2f}"
+            )
+
+        transaction.set_rollback(True)
+
+    print("DONE")
@@ -0,0 +1,108 @@
+"""
+Count the queries and measure the time of posting a reply in a child board,
+for topics of different sizes, compared with fully recomputing the first and
+last message of the topic and both boards.
+
+All benchmark data is created in a transaction that is rolled back afterwards.
+
+Shortcuts:
+- from aa_forum.scripts import benchmark_replies;benchmark_replies.run()
+"""
+
+# Standard Library
+import statistics
+import time
+import uuid
+
+# Django
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+# Alliance Auth
+from allianceauth.authentication.models import User
+
+# AA Forum
+from aa_forum.models import Board, Category, Message, Topic
+
+REPETITIONS = 20
+TOPIC_SIZES = (0, 1000, 10000, 50000)
+
+
+def _measure(function) -> tuple:
+    """
+    Median number of queries and median time in milliseconds of the function
+    """
+
+    queries, timings = [], []
+
+    for _ in range(REPETITIONS):
+        with CaptureQueriesContext(connection=connection) as captured:
+            start = time.perf_counter()
+            function()
+            timings.append((time.perf_counter() - start) * 1000)
+
+        queries.append(len(captured))
+
+    return statistics.median(queries), statistics.median(timings)
+
+
+def run():
+    """
+    Run the benchmark
+    """
+
+    user = User.objects.first()
+
+    print(
+        f"{'Messages':>8} | {'Reply (queries)':>15} | {'Reply (ms)':>10} "
+        f"| {'Recompute (queries)':>19} | {'Recompute (ms)':>14}"
+    )
+
+    with transaction.atomic():
+        category = Category.objects.create(name=f"Benchmark {uuid.uuid4()}")
+        board = Board.objects.create(name="Benchmark", category=category)
+        child_board = Board.objects.create(
+            name="Benchmark child", category=category, parent_board=board
+        )
+
+        for size in TOPIC_SIZES:
+            topic = Topic.objects.create(board=child_board, subject=f"Benchmark {size}")
+
+            Message.objects.bulk_create(
+                [
+                    Message(
+                        topic=topic,
+                        user_created=user,
+                        message=f"<p>Message {num}</p>",
+                        message_plaintext=f"Message {num}",
+                    )
+                    for num in range(size)
+                ],
+                batch_size=1000,
+            )
+
+            topic._update_message_references()
+            child_board._update_message_references()
+
+            reply_queries, reply_ms = _measure(
+                lambda topic=topic: Message(
+                    topic=topic, user_created=user, message="<p>Reply</p>"
+                ).save()
+            )
+
+            # What a new reply cost before: all first and last messages
+            # looked up again, up to the parent board
+            def recompute(topic=topic):
+                topic._update_message_references()
+                child_board._update_message_references()
+
+            recompute_queries, recompute_ms = _measure(recompute)
+
+            print(
+                f"{size:>8} | {reply_queries:>15} | {reply_ms:>10.2f} "
+                f"| {recompute_queries:>19} | {recompute_ms:>14.2f}"
+            )
+
+        transaction.set_rollback(True)
+
+    print("DONE")
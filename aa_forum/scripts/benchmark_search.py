@@ -0,0 +1,125 @@
+"""
+Compare the icontains search with the built-in search index.
+
+All benchmark data is created in a transaction that is rolled back afterwards.
+
+Shortcuts:
+- from aa_forum.scripts import benchmark_search;benchmark_search.run()
+"""
+
+# Standard Library
+import random
+import statistics
+import time
+import uuid
+from functools import reduce
+from operator import or_
+
+# Django
+from django.db import transaction
+from django.db.models import Q
+
+# Alliance Auth
+from allianceauth.authentication.models import User
+
+# AA Forum
+from aa_forum.models import Board, Category, Message, Topic
+from aa_forum.search.backends import IndexSearchBackend
+from aa_forum.search.index import index_messages
+
+NUMBER_OF_MESSAGES = 20000
+WORDS_PER_MESSAGE = 80
+VOCABULARY_SIZE = 5000
+REPETITIONS = 5
+QUERIES = (
+    ("Single word", "word42"),
+    ("AND", "word42 word1337"),
+    ("OR", "word42 OR word1337"),
+    ("Phrase", '"word42 word43"'),
+)
+
+
+def _measure(fetch) -> float:
+    """
+    Median time in milliseconds to fetch the results
+    """
+
+    timings = []
+
+    for _ in range(REPETITIONS):
+        start = time.perf_counter()
+        fetch()
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(timings)
+
+
+def _icontains(messages, query: str):
+    """
+    The search as it was before, any of the words as substring
+    """
+
+    terms = [term for term in query.replace('"', "").split() if term != "OR"]
+
+    return messages.filter(
+        reduce(or_, [Q(message_plaintext__icontains=term) for term in terms])
+    ).order_by("-time_modified")
+
+
+def run():
+    """
+    Run the benchmark
+    """
+
+    user = User.objects.first()
+    vocabulary = [f"word{num}" for num in range(VOCABULARY_SIZE)]
+
+    with transaction.atomic():
+        category = Category.objects.create(name=f"Benchmark {uuid.uuid4()}")
+        board = Board.objects.create(name="Benchmark", category=category)
+        topic = Topic.objects.create(board=board, subject="Benchmark")
+
+        print(f"Creating and indexing {NUMBER_OF_MESSAGES} messages…")
+
+        Message.objects.bulk_create(
+            [
+                Message(
+                    topic=topic,
+                    user_created=user,
+                    message=f"<p>{text}</p>",
+                    message_plaintext=text,
+                )
+                for text in (
+                    " ".join(random.choices(vocabulary, k=WORDS_PER_MESSAGE))
+                    for _ in range(NUMBER_OF_MESSAGES)
+                )
+            ],
+            batch_size=1000,
+        )
+
+        messages = Message.objects.filter(topic=topic)
+        message_list = list(messages.order_by("pk").only("pk", "message_plaintext"))
+
+        for start in range(0, len(message_list), 1000):
+            index_messages(messages=message_list[start : start + 1000])
+
+        backend = IndexSearchBackend()
+
+        print(f"{'Query':>12} | {'icontains (ms)':>15} | {'Index (ms)':>11}")
+
+        for name, query in QUERIES:
+            # Fetch a page of results, like the search view does
+            icontains_ms = _measure(
+                lambda query=query: list(_icontains(messages, query)[:20])
+            )
+            index_ms = _measure(
+                lambda query=query: list(
+                    backend.search(queryset=messages, query=query)[:20]
+                )
+            )
+
+            print(f"{name:>12} | {icontains_ms:>15.2f} | {index_ms:>11.2f}")
+
+        transaction.set_rollback(True)
+
+    print("DONE")
@@ -0,0 +1,194 @@
+"""
+Compare the single-pass message parser with the former text pipeline of
+`Message.save` (three regex passes, `strip_tags` and BeautifulSoup for the
+Discord excerpt and the first image).
+
+Shortcuts:
+- from aa_forum.scripts import benchmark_text;benchmark_text.run()
+"""
+
+# Standard Library
+import re
+import statistics
+import time
+
+# Third Party
+from bs4 import BeautifulSoup
+
+# Django
+from django.utils.html import strip_tags
+
+# AA Forum
+from aa_forum.helper.text import parse_message, verify_image_url
+
+REPETITIONS = 20
+
+_RE_HEAD = re.compile(pattern=r"<\s*head[^>]*>.*?<\s*/\s*head\s*>", flags=re.S | re.I)
+_RE_SCRIPT = re.compile(
+    pattern=r"<\s*script[^>]*>.*?<\s*/\s*script\s*>", flags=re.S | re.I
+)
+_RE_CSS = re.compile(pattern=r"<\s*style[^>]*>.*?<\s*/\s*style\s*>", flags=re.S | re.I)
+
+
+def _short_post() -> str:
+    """
+    A short reply
+    """
+
+    return (
+        "<p>Form up in <strong>Jita 4-4</strong>, undock at 20:00. "
+        'Doctrine is on the <a href="https://example.com/doctrines">wiki</a>.</p>'
+        "<p>o7</p>"
+    )
+
+
+def _long_post() -> str:
+    """
+    A long post with lists, quotes and links
+    """
+
+    paragraph = (
+        "<p>The <strong>Rifter</strong> is a <i>Minmatar</i> frigate&nbsp;with "
+        'a <a href="https://example.com/rifter">long history</a> &amp; a lot '
+        "of fans.</p><ul><li>Autocannons</li><li>Webifier</li><li>Afterburner"
+        "</li></ul><blockquote><p>Speed is armor.</p></blockquote>"
+    )
+
+    return paragraph * 50
+
+
+def _killmail_table() -> str:
+    """
+    A pasted killmail table, as CKEditor 5 stores tables
+    """
+
+    rows = "".join(
+        f"<tr><td>{num}</td><td>Pilot {num}</td><td>Rifter</td>"
+        f"<td>{num * 137:,}</td><td>{num % 7}.{num % 10}%</td>"
+        f'<td><a href="https://zkillboard.com/character/{num}/">zkb</a></td></tr>'
+        for num in range(500)
+    )
+
+    return (
+        "<p>Battle report:</p>"
+        '<figure class="table"><table><thead><tr><th>#</th><th>Pilot</th>'
+        "<th>Ship</th><th>Damage</th><th>Share</th><th>Link</th></tr></thead>"
+        f"<tbody>{rows}</tbody></table></figure>"
+    )
+
+
+def _image_gallery() -> str:
+    """
+    A post with many images
+    """
+
+    return "".join(
+        f'<figure class="image"><img src="/media/uploads/screenshot_{num}.png">'
+        f"<figcaption>Screenshot {num}</figcaption></figure>"
+        for num in range(30)
+    )
+
+
+def _pasted_page() -> str:
+    """
+    A web page pasted with its scripts and styles
+    """
+
+    return (
+        "<head><title>Fleet</title><style>p { color: red; }</style></head>"
+        + '<script type="text/javascript">var fleet = "<p>fleet</p>";</script>'
+        + _long_post()
+        + "<style>.hidden { display: none; }</style>"
+    )
+
+
+DOCUMENTS = (
+    ("Short post", _short_post),
+    ("Long post", _long_post),
+    ("Killmail table", _killmail_table),
+    ("Image gallery", _image_gallery),
+    ("Pasted page", _pasted_page),
+)
+
+
+def _former_pipeline(text: str) -> tuple:
+    """
+    The text processing of `Message.save` as it was before
+    """
+
+    text = _RE_HEAD.sub(repl="", string=text)
+    text = _RE_SCRIPT.sub(repl="", string=text)
+    text = _RE_CSS.sub(repl="", string=text)
+    plaintext = strip_tags(value=text)
+
+    soup = BeautifulSoup(markup=text, features="html.parser")
+    excerpt = strip_tags(value=soup.get_text()).replace("\xa0", " ")[:1000]
+    image_url = next(
+        (
+            image["src"]
+            for image in soup.findAll(name="img")
+            if verify_image_url(image_url=image["src"])
+        ),
+        None,
+    )
+
+    return text, plaintext, excerpt, image_url
+
+
+def _single_pass(text: str) -> tuple:
+    """
+    The text processing of `Message.save` with the message parser
+    """
+
+    parsed_message = parse_message(text=text)
+
+    return (
+        parsed_message.html,
+        parsed_message.plaintext,
+        parsed_message.get_discord_excerpt(),
+        parsed_message.first_image_url,
+        parsed_message.word_count,
+    )
+
+
+def _measure(function, text: str) -> float:
+    """
+    Median time in milliseconds to process the text
+    """
+
+    timings = []
+
+    for _ in range(REPETITIONS):
+        start = time.perf_counter()
+        function(text)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return statistics.median(timings)
+
+
+def run():
+    """
+    Run the benchmark
+    """
+
+    print(
+        f"{'Document':>16} | {'Size (kB)':>9} | {'Former (ms)':>11} "
+        f"| {'Single pass (ms)':>16} | {'Same output':>11}"
+    )
+
+    for name, document in DOCUMENTS:
+        text = document()
+        former = _former_pipeline(text)
+        single_pass = _single_pass(text)
+        # The former excerpt is compared without the "…" of shortened texts
+        same_output = (
+            former[:2] == single_pass[:2] and former[2] == single_pass[2][:1000]
+        )
+
+        print(
+            f"{name:>16} | {len(text) / 1024:>9.1f} "
+            f"| {_measure(_former_pipeline, text):>11.2f} "
+            f"| {_measure(_single_pass, text):>16.2f} | {str(same_output):>11}"
+        )
+
+    print("DONE")
@@ -0,0 +1,3 @@
+"""
+Forum search
+"""
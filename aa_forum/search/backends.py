@@ -0,0 +1,438 @@
+"""
+Search backends for the forum search
+
+The search backend is selected with the `AA_FORUM_SEARCH_BACKEND` setting.
+By default (`auto`), the full-text search of the database is used on MySQL/MariaDB
+and PostgreSQL, and the Python fallback on everything else (e.g. SQLite in tests).
+The built-in search index (`index`) works with any database and has to be
+selected explicitly.
+
+All backends match whole words in the message text and return the matching
+messages annotated with a `search_rank`, most relevant first. The full-text
+backends match any of the words, and a match in the topic subject gives a
+message a higher rank.
+"""
+
+# Standard Library
+import math
+from abc import ABC, abstractmethod
+from collections import Counter
+from functools import reduce
+from operator import and_, or_
+
+# Django
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.models import (
+    Case,
+    Count,
+    Exists,
+    F,
+    FloatField,
+    Func,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+
+# AA Forum
+from aa_forum.app_settings import AA_FORUM_SEARCH_BACKEND
+from aa_forum.models import SearchIndexEntry
+from aa_forum.search.query import parse_query, tokenize
+from aa_forum.search.stopwords import get_stopwords, is_stopword
+
+# How much more a match in the topic subject counts than a match in the message
+SUBJECT_WEIGHT = 2.0
+
+
+class SearchBackend(ABC):
+    """
+    Base class for search backends
+    """
+
+    name = None
+
+    # Set by `search()` when not all matching messages could be returned
+    results_capped = False
+
+    @abstractmethod
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        """
+        Filter the messages in `queryset` that match the search query,
+        ordered by relevance
+
+        :param queryset: Messages to search in
+        :type queryset:
+        :param query: The search phrase as entered by the user
+        :type query:
+        :return: Matching messages, annotated with `search_rank`
+        :rtype:
+        """
+
+    @staticmethod
+    def search_terms(query: str) -> list[str]:
+        """
+        Words of the search query, without stopwords
+
+        :param query:
+        :type query:
+        :return:
+        :rtype:
+        """
+
+        return [word for word in query.split() if not is_stopword(word=word)]
+
+    @staticmethod
+    def _order_by_rank(queryset: QuerySet) -> QuerySet:
+        """
+        Order the search results, most relevant first
+
+        :param queryset:
+        :type queryset:
+        :return:
+        :rtype:
+        """
+
+        return queryset.order_by("-search_rank", "-time_modified", "-pk")
+
+
+class _MatchAgainst(Func):
+    """
+    MySQL/MariaDB full-text relevance of a column, `MATCH … AGAINST …`
+    """
+
+    output_field = FloatField()
+
+    def as_sql(
+        self, compiler, connection, **extra_context
+    ):  # pylint: disable=redefined-outer-name
+        """
+        Compile the expression
+
+        :param compiler:
+        :type compiler:
+        :param connection:
+        :type connection:
+        :param extra_context:
+        :type extra_context:
+        :return:
+        :rtype:
+        """
+
+        column, query = self.get_source_expressions()
+        column_sql, column_params = compiler.compile(column)
+        query_sql, query_params = compiler.compile(query)
+
+        return (
+            f"MATCH ({column_sql}) AGAINST ({query_sql} IN BOOLEAN MODE)",
+            (*column_params, *query_params),
+        )
+
+
+class MySQLSearchBackend(SearchBackend):
+    """
+    Full-text search with the FULLTEXT indexes of MySQL/MariaDB
+    """
+
+    name = "mysql"
+
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        """
+        Filter and rank the messages via `MATCH … AGAINST …`
+
+        :param queryset:
+        :type queryset:
+        :param query:
+        :type query:
+        :return:
+        :rtype:
+        """
+
+        # Without operators, boolean mode matches any of the words. We use our
+        # own tokenizer, so the search terms can't contain any operators.
+        match_query = Value(
+            " ".join(
+                word
+                for term in self.search_terms(query=query)
+                for word in tokenize(term)
+            )
+        )
+
+        return self._order_by_rank(
+            queryset.alias(
+                message_relevance=_MatchAgainst(F("message_plaintext"), match_query),
+                subject_relevance=_MatchAgainst(F("topic__subject"), match_query),
+            )
+            .filter(message_relevance__gt=0)
+            .annotate(
+                search_rank=F("message_relevance")
+                + F("subject_relevance") * SUBJECT_WEIGHT
+            )
+        )
+
+
+class PostgreSQLSearchBackend(SearchBackend):
+    """
+    Full-text search with a GIN index on the message text in PostgreSQL
+    """
+
+    name = "postgresql"
+
+    # The GIN index is created for exactly this configuration
+    config = "simple"
+
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        """
+        Filter and rank the messages via `to_tsvector(…) @@ to_tsquery(…)`
+
+        :param queryset:
+        :type queryset:
+        :param query:
+        :type query:
+        :return:
+        :rtype:
+        """
+
+        # Django
+        from django.contrib.postgres.search import (  # pylint: disable=import-outside-toplevel
+            SearchQuery,
+            SearchRank,
+            SearchVector,
+        )
+
+        message_vector = SearchVector("message_plaintext", config=self.config)
+        subject_vector = SearchVector("topic__subject", config=self.config)
+        search_query = reduce(
+            or_,
+            [
+                SearchQuery(value=term, config=self.config)
+                for term in self.search_terms(query=query)
+            ],
+        )
+
+        return self._order_by_rank(
+            queryset.alias(message_vector=message_vector)
+            .filter(message_vector=search_query)
+            .annotate(
+                search_rank=SearchRank(vector=message_vector, query=search_query)
+                + SearchRank(vector=subject_vector, query=search_query) * SUBJECT_WEIGHT
+            )
+        )
+
+
+class PythonSearchBackend(SearchBackend):
+    """
+    Fallback for databases without full-text search (e.g. SQLite)
+
+    Scans the text of all messages in the queryset for every search, so it is
+    good enough for tests and small forums, but not meant for production use.
+    """
+
+    name = "python"
+
+    # Only this many of the best matching messages are returned
+    max_results = 1000
+
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        """
+        Rank the messages in the queryset via TF-IDF
+
+        :param queryset:
+        :type queryset:
+        :param query:
+        :type query:
+        :return:
+        :rtype:
+        """
+
+        words = {
+            word for term in self.search_terms(query=query) for word in tokenize(term)
+        }
+        matches = {}
+        message_count = 0
+
+        for message_id, plaintext, subject in (
+            queryset.order_by()
+            .values_list("pk", "message_plaintext", "topic__subject")
+            .iterator()
+        ):
+            message_count += 1
+            frequencies = {
+                word: frequency
+                for word, frequency in Counter(tokenize(plaintext)).items()
+                if word in words
+            }
+
+            if frequencies:
+                matches[message_id] = (frequencies, words & set(tokenize(subject)))
+
+        idfs = {
+            word: math.log(1 + message_count / frequency)
+            for word, frequency in Counter(
+                word for frequencies, _ in matches.values() for word in frequencies
+            ).items()
+        }
+        scores = {
+            message_id: sum(
+                (1 + math.log(frequency)) * idfs[word]
+                for word, frequency in frequencies.items()
+            )
+            + len(subject_words) * SUBJECT_WEIGHT
+            for message_id, (frequencies, subject_words) in matches.items()
+        }
+
+        message_ids = sorted(scores, key=scores.get, reverse=True)
+        self.results_capped = len(message_ids) > self.max_results
+        message_ids = message_ids[: self.max_results]
+
+        if not message_ids:
+            return queryset.none()
+
+        return self._order_by_rank(
+            queryset.filter(pk__in=message_ids).annotate(
+                search_rank=Case(
+                    *[
+                        When(pk=message_id, then=Value(scores[message_id]))
+                        for message_id in message_ids
+                    ],
+                    default=Value(0.0),
+                    output_field=FloatField(),
+                )
+            )
+        )
+
+
+class IndexSearchBackend(SearchBackend):
+    """
+    Search with the built-in search index, works with any database
+
+    Supports AND (default), OR and "phrase" queries. Each word or phrase is
+    looked up in the posting table by its term, so the search doesn't have
+    to read any message text. See `aa_forum.search.index`.
+    """
+
+    name = "index"
+
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        """
+        Filter the messages via the posting table, rank them by the number
+        of matching words
+
+        :param queryset:
+        :type queryset:
+        :param query:
+        :type query:
+        :return:
+        :rtype:
+        """
+
+        clauses = parse_query(query=query, stopwords=get_stopwords())
+
+        if not clauses:
+            return queryset.none()
+
+        condition = reduce(
+            or_,
+            [
+                reduce(
+                    and_, [Q(pk__in=self._phrase_messages(phrase)) for phrase in clause]
+                )
+                for clause in clauses
+            ],
+        )
+        terms = {term for clause in clauses for phrase in clause for _, term in phrase}
+        term_frequency = (
+            SearchIndexEntry.objects.filter(message=OuterRef("pk"), term__in=terms)
+            .order_by()
+            .values("message")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+
+        return self._order_by_rank(
+            queryset.filter(condition).annotate(
+                search_rank=Coalesce(Subquery(term_frequency), 0)
+            )
+        )
+
+    @staticmethod
+    def _phrase_messages(phrase: tuple[tuple[int, str], ...]) -> QuerySet:
+        """
+        IDs of the messages containing a phrase
+
+        The first word is looked up by its term, every further word has to
+        follow it at the right offset in the same message.
+
+        :param phrase:
+        :type phrase:
+        :return:
+        :rtype:
+        """
+
+        (_, first_term), *following = phrase
+        entries = SearchIndexEntry.objects.filter(term=first_term)
+
+        for offset, term in following:
+            entries = entries.filter(
+                Exists(
+                    SearchIndexEntry.objects.filter(
+                        term=term,
+                        message=OuterRef("message"),
+                        position=OuterRef("position") + offset,
+                    )
+                )
+            )
+
+        return entries.values("message")
+
+
+SEARCH_BACKENDS = {
+    backend.name: backend
+    for backend in (
+        MySQLSearchBackend,
+        PostgreSQLSearchBackend,
+        PythonSearchBackend,
+        IndexSearchBackend,
+    )
+}
+
+
+def get_search_backend_name() -> str:
+    """
+    Get the name of the configured search backend, with `auto` resolved
+
+    :return:
+    :rtype:
+    """
+
+    name = AA_FORUM_SEARCH_BACKEND
+
+    if name == "auto":
+        name = connection.vendor if connection.vendor in SEARCH_BACKENDS else "python"
+
+    return name
+
+
+def get_search_backend() -> SearchBackend:
+    """
+    Get the configured search backend
+
+    :return:
+    :rtype:
+    """
+
+    name = get_search_backend_name()
+
+    try:
+        backend = SEARCH_BACKENDS[name]
+    except KeyError as exc:
+        raise ImproperlyConfigured(
+            f'Unknown AA_FORUM_SEARCH_BACKEND "{name}", use one of: '
+            f'auto, {", ".join(SEARCH_BACKENDS)}'
+        ) from exc
+
+    return backend()
@@ -0,0 +1,80 @@
+"""
+Built-in search index
+
+Keeps a posting table (`SearchIndexEntry`) of the words in each message, so
+the `index` search backend can answer AND, OR and phrase queries through
+indexed lookups on any database.
+
+The index is only maintained while the `index` search backend is active.
+When switching to it, build the index for the existing messages with the
+`aa_forum_build_search_index` management command.
+"""
+
+# Standard Library
+from collections.abc import Iterable
+
+# Django
+from django.db import transaction
+
+# AA Forum
+from aa_forum.app_settings import AA_FORUM_SEARCH_BACKEND
+from aa_forum.models import SearchIndexEntry
+from aa_forum.search.query import tokenize
+from aa_forum.search.stopwords import get_stopwords
+
+
+def search_index_enabled() -> bool:
+    """
+    Check if the built-in search index is in use
+
+    :return:
+    :rtype:
+    """
+
+    return AA_FORUM_SEARCH_BACKEND == "index"
+
+
+def index_terms(text: str) -> list[tuple[int, str]]:
+    """
+    Words of a text for the search index, with their positions
+
+    Stopwords are left out, but still count for the positions of the
+    following words, so phrases with stopwords in them still match.
+
+    :param text:
+    :type text:
+    :return: [(position, term), …]
+    :rtype:
+    """
+
+    stopwords = get_stopwords()
+
+    return [
+        (position, word[: SearchIndexEntry.TERM_MAX_LENGTH])
+        for position, word in enumerate(tokenize(text))
+        if word not in stopwords
+    ]
+
+
+def index_messages(messages: Iterable) -> None:
+    """
+    (Re-)build the search index entries of the given messages
+
+    :param messages:
+    :type messages:
+    :return:
+    :rtype:
+    """
+
+    messages = list(messages)
+
+    with transaction.atomic():
+        SearchIndexEntry.objects.filter(message__in=messages).delete()
+        SearchIndexEntry.objects.bulk_create(
+            [
+                SearchIndexEntry(message=message, term=term, position=position)
+                for message in messages
+                for position, term in index_terms(text=message.message_plaintext)
+            ],
+            batch_size=1000,
+        )
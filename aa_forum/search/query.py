@@ -0,0 +1,75 @@
+"""
+Tokenizing and parsing of search queries
+"""
+
+# Standard Library
+import re
+
+_WORD_PATTERN = re.compile(pattern=r"\w+")
+
+# A quoted phrase or a single word
+_QUERY_PART_PATTERN = re.compile(pattern=r'"([^"]*)"?|(\S+)')
+
+# Keyword between two query parts to match either of them
+QUERY_OR_KEYWORD = "OR"
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Split a text into lowercase words
+
+    :param text:
+    :type text:
+    :return:
+    :rtype:
+    """
+
+    return _WORD_PATTERN.findall(text.lower())
+
+
+def parse_query(
+    query: str, stopwords: frozenset = frozenset()
+) -> list[list[tuple[tuple[int, str], ...]]]:
+    """
+    Parse a search query into OR-ed clauses of AND-ed phrases
+
+    Words are AND-ed, `OR` between two words or phrases matches either
+    of them, and "quoted words" have to appear as a phrase. Each phrase
+    is a tuple of (offset, word), with stopwords left out, but counted
+    for the offsets of the following words.
+
+    `foo "bar baz" OR qux` is parsed into
+    `[[((0, "foo"),), ((0, "bar"), (1, "baz"))], [((0, "qux"),)]]`
+
+    :param query:
+    :type query:
+    :param stopwords:
+    :type stopwords:
+    :return:
+    :rtype:
+    """
+
+    clauses = [[]]
+
+    for match in _QUERY_PART_PATTERN.finditer(query):
+        quoted, word = match.groups()
+
+        if word == QUERY_OR_KEYWORD:
+            if clauses[-1]:
+                clauses.append([])
+
+            continue
+
+        phrase = [
+            (offset, token)
+            for offset, token in enumerate(tokenize(quoted if word is None else word))
+            if token not in stopwords
+        ]
+
+        if phrase:
+            first_offset = phrase[0][0]
+            clauses[-1].append(
+                tuple((offset - first_offset, token) for offset, token in phrase)
+            )
+
+    return [clause for clause in clauses if clause]
@@ -0,0 +1,106 @@
+"""
+Stopwords for the forum search
+
+The stopword lists are only loaded on the first search, not on import, and
+kept in memory for the lifetime of the process.
+"""
+
+# Standard Library
+import json
+import os
+from functools import lru_cache
+
+# AA Forum
+from aa_forum.app_settings import AA_FORUM_SEARCH_STOPWORD_LANGUAGES
+from aa_forum.constants import APP_BASE_DIR
+
+# Files downloaded from: https://github.com/stopwords-iso
+STOPWORDS_DIR = os.path.join(APP_BASE_DIR, "search", "stopwords")
+
+# These characters are removed from the search phrase in any language
+STOPWORD_CHARACTERS = frozenset({'"', "<", ">", "(", ")", "{", "}"})
+
+
+def _stopword_languages() -> list[str]:
+    """
+    Languages with a stopword list
+
+    :return:
+    :rtype:
+    """
+
+    return sorted(
+        file_name[len("stopwords-") : -len(".json")]
+        for file_name in os.listdir(STOPWORDS_DIR)
+        if file_name.startswith("stopwords-") and file_name.endswith(".json")
+    )
+
+
+@lru_cache(maxsize=None)
+def _load_stopwords(language: str) -> frozenset[str]:
+    """
+    Load the stopword list of a language
+
+    :param language:
+    :type language:
+    :return:
+    :rtype:
+    """
+
+    with open(
+        os.path.join(STOPWORDS_DIR, f"stopwords-{language}.json"), encoding="utf-8"
+    ) as stopwords_file:
+        return frozenset(word.lower() for word in json.load(stopwords_file))
+
+
+@lru_cache(maxsize=None)
+def _get_stopwords(languages: tuple[str, ...] | None) -> frozenset[str]:
+    """
+    Stopwords of the given languages, all languages when `None`
+
+    :param languages:
+    :type languages:
+    :return:
+    :rtype:
+    """
+
+    available_languages = _stopword_languages()
+
+    if languages is not None:
+        # Language codes like `zh-hans` use the list of their base language
+        languages = {language.lower().split("-")[0] for language in languages}
+        available_languages = [
+            language for language in available_languages if language in languages
+        ]
+
+    return STOPWORD_CHARACTERS.union(
+        *(_load_stopwords(language=language) for language in available_languages)
+    )
+
+
+def get_stopwords() -> frozenset[str]:
+    """
+    Stopwords for the forum search, in lower case
+
+    Restricted to the languages in `AA_FORUM_SEARCH_STOPWORD_LANGUAGES`, if set.
+
+    :return:
+    :rtype:
+    """
+
+    languages = AA_FORUM_SEARCH_STOPWORD_LANGUAGES
+
+    return _get_stopwords(languages=None if languages is None else tuple(languages))
+
+
+def is_stopword(word: str) -> bool:
+    """
+    Check if a word is a stopword
+
+    :param word:
+    :type word:
+    :return:
+    :rtype:
+    """
+
+    return word.lower() in get_stopwords()
@@ -3,11 +3,30 @@ Our signals
 """
 
 # Django
-from django.db.models.signals import post_save
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
+# Alliance Auth
+from allianceauth.authentication.models import User
+
 # AA Forum
-from aa_forum.models import Board
+from aa_forum.helper.board_access import (
+    bump_board_access_generation,
+    invalidate_user_board_access,
+)
+from aa_forum.helper.board_topics import bump_board_topics_version
+from aa_forum.helper.personal_messages import (
+    invalidate_personal_messages_unread_count,
+)
+from aa_forum.helper.unread_topics import (
+    bump_unread_topics_generation,
+    invalidate_unread_topics_count,
+)
+from aa_forum.models import Board, Message, PersonalMessage, Topic
+from aa_forum.search.index import index_messages, search_index_enabled
 
 
 @receiver(post_save, sender=Board)
@@ -38,3 +57,349 @@ def sync_parent_board_access_to_child_board(
 
         for child_board in child_boards:
             child_board.groups.set(instance.groups.all())
+
+
+@receiver(post_delete, sender=Topic)
+def update_board_counters_on_topic_delete(
+    sender,  # pylint: disable=unused-argument
+    instance,
+    **kwargs,  # pylint: disable=unused-argument
+):
+    """
+    Update the board counters when a topic is deleted
+
+    This also covers topics deleted in bulk or along with their board,
+    where `Topic.delete()` is not called.
+
+    :param sender:
+    :type sender:
+    :param instance:
+    :type instance:
+    :param kwargs:
+    :type kwargs:
+    :return:
+    :rtype:
+    """
+
+    Board.update_counters(
+        board_id=instance.board_id, topics=-1, messages=-instance.message_count
+    )
+
+
+def _bump_unread_topics_generation_now_and_on_commit() -> None:
+    """
+    Bump the generation, and again after the transaction has been committed,
+    in case the old number of unread topics has been cached again in the
+    meantime
+
+    :return:
+    :rtype:
+    """
+
+    bump_unread_topics_generation()
+
+    transaction.on_commit(bump_unread_topics_generation)
+
+
+@receiver(post_delete, sender=Topic)
+def bump_unread_topics_generation_on_topic_delete(
+    sender,  # pylint: disable=unused-argument
+    instance,  # pylint: disable=unused-argument
+    **kwargs,  # pylint: disable=unused-argument
+):
+    """
+    Deleted topics can change the number of unread topics
+
+    :param sender:
+    :type sender:
+    :param instance:
+    :type instance:
+    :param kwargs:
+    :type kwargs:
+    :return:
+    :rtype:
+    """
+
+    _bump_unread_topics_generation_now_and_on_commit()
+
+
+@receiver(post_save, sender=Message)
+def bump_unread_topics_generation_on_new_message(
+    sender,  # pylint: disable=unused-argument
+    instance,  # pylint: disable=unused-argument
+    created,
+    **kwargs,  # pylint: disable=unused-argument
+):
+    """
+    New messages change the number of unread topics of everyone who can see them
+
+    :param sender:
+    :type sender:
+    :param instance:
+    :type instance:
+    :param created:
+    :type created:
+    :param kwargs:
+    :type kwargs:
+    :return:
+    :rtype:
+    """
+
+    if created:
+        _bump_unread_topics_generation_now_and_on_commit()
+
+
+@receiver(post_save, sender=Message)
+def update_search_index_on_message_save(
+    sender,  # pylint: disable=unused-argument
+    instance,
+    update_fields=None,
+    **kwargs,  # pylint: disable=unused-argument
+):
+    """
+    Keep the built-in search index up to date, deleted messages are
+    removed from it by cascade
+
+    :param sender:
+    :type sender:
+    :param instance:
+    :type instance:
+    :param update_fields:
+    :type update_fields:
+    :param kwargs:
+    :type kwargs:
+    :return:
+    :rtype:
+    """
+
+    if not search_index_enabled():
+        return
+
+    if update_fields is None or "message_plaintext" in update_fields:
+        index_messages(messages=[instance])
+
+
+@receiver(post_delete, sender=Message)
+def bump_unread_topics_generation_on_message_delete(
+    sender,  # pylint: disable=unused-argument
+    instance,  # pylint: disable=unused-argument
+    origin=None,
+    **kwargs,  # pylint: disable=unused-argument
+):
+    """
+    Deleted messages can change the number of unread topics as well
+
+    Messages deleted along with their topic are covered by
+    `bump_unread_topics_generation_on_topic_delete()`.
+
+    :param sender:
+    :type sender:
+    :param instance:
+    :type instance:
+    :param origin:
+    :type origin:
+    :param kwargs:
+    :type kwargs:
+    :return:
+    :rtype:
+    """
+
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+
+    if origin_model is Message:
+        _bump_unread_topics_generation_now_and_on_commit()
+
+
+@receiver(post_save, sender=PersonalMessage)
+@receiver(post_delete, sender=PersonalMessage)
+def invalidate_personal_messages_unread_count_on_change(
+    sender,  # pylint: disable=unused-argument
+    instance,
+    **kwargs,  # pylint: disable=unused-argument
+):
+    """
+    Invalidate the recipient's number of unread personal messages when a
+    personal message is sent, read or deleted
+
+    It's invalidated again after the transaction has been committed, in case
+    the old number has been cached again in the meantime.
+
+    :param sender:
+    :type sender:
+    :param instance:
+    :type instance:
+    :param kwargs:
+    :type kwargs:
+    :return:
+    :rtype:
+    """
+
+    invalidate_personal_messages_unread_count(user_id=instance.recipient_id)
+    transaction.on_commit(
+        lambda: invalidate_personal_messages_unread_count(user_id=instance.recipient_id)
+    )
+
+
+@receiver(post_save, sender=Board)
+@receiver(post_delete, sender=Board)
+@receiver(post_delete, sender=Group)
+@receiver(m2m_changed, sender=Board.groups.through)
+def bump_board_access_generation_on_change(
+    sender,  # pylint: disable=unused-argument
+    action=None,
+    update_fields=None,
+    **kwargs,  # pylint: disable=unused-argument
+):
+    """
+    Changed boards, board groups or deleted groups change who can see which board
+
+    The generation is bumped again after the transaction has been committed,
+    in case the old boards have been cached again in the meantime.
+
+    :param sender:
+    :type sender:
+    :param action:
+    :type action:
+    :param update_fields:
+    :type update_fields:
+    :param kwargs:
+    :type kwargs:
+    :return:
+    :rtype:
+    """
+
+    if action is not None and not action.startswith("post_"):
+        return
+
+    # Counters and message references don't change who can see the board
+    if update_fields is not None and set(update_fields) <= {
+        *Board.COUNTER_FIELDS,
+        *Board.MESSAGE_REFERENCE_FIELDS,
+    }:
+        return
+
+    bump_board_access_generation()
+
+    transaction.on_commit(bump_board_access_generation)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def invalidate_board_access_on_group_membership_change(
+    sender,  # pylint: disable=unused-argument
+    instance,
+    action,
+    reverse,
+    pk_set,
+    **kwargs,  # pylint: disable=unused-argument
+):
+    """
+    Users who joined or left groups may see other boards now
+
+    :param sender:
+    :type sender:
+    :param instance:
+    :type instance:
+    :param action:
+    :type action:
+    :param reverse:
+    :type reverse:
+    :param pk_set:
+    :type pk_set:
+    :param kwargs:
+    :type kwargs:
+    :return:
+    :rtype:
+    """
+
+    if not action.startswith("post_"):
+        return
+
+    # Changed from the group's side, e.g. `group.user_set.clear()`,
+    # which can affect any number of users
+    if reverse:
+        bump_board_access_generation()
+        transaction.on_commit(bump_board_access_generation)
+
+        return
+
+    invalidate_user_board_access(user_id=instance.pk)
+    invalidate_unread_topics_count(user=instance)
+    transaction.on_commit(lambda: invalidate_user_board_access(user_id=instance.pk))
+    transaction.on_commit(lambda: invalidate_unread_topics_count(user=instance))
+
+
+def _bump_board_topics_version_now_and_on_commit(board_id: int) -> None:
+    """
+    Bump the version of the topic list of a board, and again after the
+    transaction has been committed, in case the old order has been cached
+    again in the meantime
+
+    :param board_id:
+    :type board_id:
+    :return:
+    :rtype:
+    """
+
+    bump_board_topics_version(board_id=board_id)
+
+    transaction.on_commit(lambda: bump_board_topics_version(board_id=board_id))
+
+
+@receiver(post_save, sender=Topic)
+def bump_board_topics_version_on_topic_change(
+    sender,  # pylint: disable=unused-argument
+    instance,
+    update_fields=None,
+    **kwargs,  # pylint: disable=unused-argument
+):
+    """
+    Topics that became (non-)sticky or were moved change the order of the
+    topics in their board
+
+    :param sender:
+    :type sender:
+    :param instance:
+    :type instance:
+    :param update_fields:
+    :type update_fields:
+    :param kwargs:
+    :type kwargs:
+    :return:
+    :rtype:
+    """
+
+    if update_fields is not None and not {"is_sticky", "board"} & set(update_fields):
+        return
+
+    _bump_board_topics_version_now_and_on_commit(board_id=instance.board_id)
+
+
+@receiver(post_delete, sender=Message)
+def bump_board_topics_version_on_message_delete(
+    sender,  # pylint: disable=unused-argument
+    instance,
+    origin=None,
+    **kwargs,  # pylint: disable=unused-argument
+):
+    """
+    A deleted message can change the order of the topics in its board,
+    without changing the board's last message
+
+    Messages deleted along with their topic change the board's topic counter.
+
+    :param sender:
+    :type sender:
+    :param instance:
+    :type instance:
+    :param origin:
+    :type origin:
+    :param kwargs:
+    :type kwargs:
+    :return:
+    :rtype:
+    """
+
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+
+    if origin_model is Message:
+        _bump_board_topics_version_now_and_on_commit(board_id=instance.topic.board_id)
@@ -0,0 +1,331 @@
+"""
+Celery tasks
+"""
+
+# Standard Library
+from datetime import datetime, timedelta
+
+# Third Party
+import requests
+from celery import shared_task
+
+# Django
+from django.utils import timezone
+
+# Alliance Auth
+from allianceauth.services.hooks import get_extension_logger
+
+# AA Forum
+from aa_forum.app_settings import AA_FORUM_DISCORD_DM_TIMEOUT, discordproxy_installed
+from aa_forum.helper.discord_messages import (
+    execute_discord_webhook_message,
+    get_discord_webhook_rate_limit_wait,
+    send_new_personal_message_notification,
+    update_discord_webhook_rate_limit,
+)
+from aa_forum.models import DiscordWebhookMessage, PersonalMessage
+from aa_forum.providers.applogger import AppLogger
+
+logger = AppLogger(my_logger=get_extension_logger(name=__name__))
+
+# How often we try to deliver a webhook message before giving up
+DISCORD_WEBHOOK_MAX_ATTEMPTS = 8
+
+# Wait time before the first retry (in seconds), doubled with every further retry
+DISCORD_WEBHOOK_RETRY_BACKOFF = 10
+
+# Upper limit for the wait time between two retries (in seconds)
+DISCORD_WEBHOOK_RETRY_BACKOFF_MAX = 3600
+
+# Messages that are overdue by this long are queued again (in seconds)
+DISCORD_WEBHOOK_PENDING_GRACE_PERIOD = 300
+
+# How long a worker may take to send a message it has claimed (in seconds)
+DISCORD_WEBHOOK_CLAIM_TIMEOUT = 60
+
+# How often we try to send a Discord DM about a new personal message
+PERSONAL_MESSAGE_NOTIFICATION_MAX_ATTEMPTS = 5
+
+# Wait time before the first retry of a DM (in seconds), doubled with every further retry
+PERSONAL_MESSAGE_NOTIFICATION_RETRY_BACKOFF = 30
+
+
+def _claim_discord_webhook_message(message_id: int, claim: str | None) -> bool:
+    """
+    Claim a webhook message for sending, so no other worker sends it as well
+
+    The claim is the time of the next attempt the task has been queued for.
+    It is moved forward with a conditional UPDATE, so only one worker can
+    claim a message and tasks that have been queued for it before can't.
+
+    :param message_id:
+    :type message_id:
+    :param claim: Time of the next attempt, `None` when it is due already
+    :type claim:
+    :return: If the message has been claimed
+    :rtype:
+    """
+
+    now = timezone.now()
+    webhook_messages = DiscordWebhookMessage.objects.filter(
+        pk=message_id, is_failed=False
+    )
+
+    if claim is None:
+        webhook_messages = webhook_messages.filter(time_next_attempt__lte=now)
+    else:
+        webhook_messages = webhook_messages.filter(
+            time_next_attempt=datetime.fromisoformat(claim)
+        )
+
+    return bool(
+        webhook_messages.update(
+            time_next_attempt=now + timedelta(seconds=DISCORD_WEBHOOK_CLAIM_TIMEOUT)
+        )
+    )
+
+
+def _schedule_discord_webhook_message(
+    webhook_message: DiscordWebhookMessage, countdown: float
+) -> None:
+    """
+    Send a webhook message again after `countdown` seconds
+
+    :param webhook_message:
+    :type webhook_message:
+    :param countdown:
+    :type countdown:
+    :return:
+    :rtype:
+    """
+
+    webhook_message.time_next_attempt = timezone.now() + timedelta(seconds=countdown)
+    webhook_message.save(update_fields=["attempts", "last_error", "time_next_attempt"])
+
+    send_discord_webhook_message.apply_async(
+        kwargs={
+            "message_id": webhook_message.pk,
+            "claim": webhook_message.time_next_attempt.isoformat(),
+        },
+        countdown=countdown,
+    )
+
+
+@shared_task
+def send_discord_webhook_message(message_id: int, claim: str | None = None) -> None:
+    """
+    Deliver a message from the webhook outbox to Discord
+
+    Rate limits of the webhook are honoured, rate limited requests, server and
+    network errors are retried, the latter with an exponential backoff.
+    Other errors (e.g. a deleted webhook or invalid embeds) are not retried.
+
+    :param message_id:
+    :type message_id:
+    :param claim: Time of the next attempt this task has been queued for
+    :type claim:
+    :return:
+    :rtype:
+    """
+
+    if not _claim_discord_webhook_message(message_id=message_id, claim=claim):
+        logger.debug(
+            msg=f"Webhook message {message_id} has been handled or claimed already."
+        )
+
+        return
+
+    # Close the message for further replies before it is sent
+    DiscordWebhookMessage.objects.filter(pk=message_id).exclude(coalesce_key="").update(
+        coalesce_key=""
+    )
+
+    webhook_message = DiscordWebhookMessage.objects.get(pk=message_id)
+    webhook_url = webhook_message.webhook_url
+    wait = get_discord_webhook_rate_limit_wait(webhook_url=webhook_url)
+
+    if wait > 0:
+        logger.debug(msg=f"Webhook is rate limited, retrying in {wait:.1f}s.")
+
+        _schedule_discord_webhook_message(
+            webhook_message=webhook_message, countdown=wait
+        )
+
+        return
+
+    webhook_message.attempts += 1
+    countdown = None
+
+    try:
+        response = execute_discord_webhook_message(webhook_message=webhook_message)
+    except requests.exceptions.RequestException as exc:
+        webhook_message.last_error = str(exc)
+        retry = True
+    except ValueError as exc:
+        # Rejected by dhooks_lite (e.g. content too long), it won't get better
+        webhook_message.last_error = str(exc)
+        retry = False
+    else:
+        wait = update_discord_webhook_rate_limit(
+            webhook_url=webhook_url, response=response
+        )
+
+        if response.status_ok:
+            webhook_message.delete()
+
+            return
+
+        webhook_message.last_error = f"HTTP {response.status_code}: {response.content}"
+
+        if response.status_code == 429:
+            logger.info(msg=f"Webhook has been rate limited for {wait:.1f}s.")
+
+            countdown = wait
+
+        retry = response.status_code == 429 or response.status_code >= 500
+
+    if retry and webhook_message.attempts < DISCORD_WEBHOOK_MAX_ATTEMPTS:
+        if countdown is None:
+            countdown = min(
+                DISCORD_WEBHOOK_RETRY_BACKOFF * 2 ** (webhook_message.attempts - 1),
+                DISCORD_WEBHOOK_RETRY_BACKOFF_MAX,
+            )
+
+        logger.warning(
+            msg=(
+                f"Failed to send webhook message {message_id}, retrying in "
+                f"{countdown}s. Error: {webhook_message.last_error}"
+            )
+        )
+
+        _schedule_discord_webhook_message(
+            webhook_message=webhook_message, countdown=countdown
+        )
+
+        return
+
+    webhook_message.is_failed = True
+    webhook_message.save(update_fields=["attempts", "last_error", "is_failed"])
+
+    logger.error(
+        msg=(
+            f"Giving up on webhook message {message_id} after "
+            f"{webhook_message.attempts} attempt(s). "
+            f"Error: {webhook_message.last_error}"
+        )
+    )
+
+
+@shared_task
+def send_pending_discord_webhook_messages() -> None:
+    """
+    Queue webhook messages again that should have been sent by now,
+    e.g. after the broker or the workers have been restarted
+
+    Each message is claimed before it is queued again, so it is only queued
+    once, even with several of these tasks running at the same time, and
+    tasks still queued for it from before are dropped.
+
+    :return:
+    :rtype:
+    """
+
+    now = timezone.now()
+    overdue = now - timedelta(seconds=DISCORD_WEBHOOK_PENDING_GRACE_PERIOD)
+
+    for message_id, time_next_attempt in DiscordWebhookMessage.objects.filter(
+        is_failed=False, time_next_attempt__lt=overdue
+    ).values_list("pk", "time_next_attempt"):
+        claimed = DiscordWebhookMessage.objects.filter(
+            pk=message_id, time_next_attempt=time_next_attempt
+        ).update(time_next_attempt=now)
+
+        if claimed:
+            send_discord_webhook_message.delay(
+                message_id=message_id, claim=now.isoformat()
+            )
+
+
+def _personal_message_notification_errors() -> tuple:
+    """
+    Errors of a Discord DM that are retried, or logged on the last attempt
+
+    discordproxy raises a gRPC error when it can't be reached.
+
+    :return:
+    :rtype:
+    """
+
+    errors = (requests.exceptions.RequestException,)
+
+    if discordproxy_installed():
+        # Third Party
+        from discordproxy.exceptions import (  # pylint: disable=import-outside-toplevel
+            DiscordProxyGrpcError,
+        )
+
+        errors += (DiscordProxyGrpcError,)
+
+    return errors
+
+
+@shared_task
+def send_personal_message_notifications(
+    message_ids: list[int], attempt: int = 1
+) -> None:
+    """
+    Send the Discord DMs about new personal messages
+
+    DMs that fail because discordproxy cannot be reached are retried together
+    with an exponential backoff. The last attempt falls back to
+    allianceauth-discordbot, like sending a DM always did.
+
+    :param message_ids:
+    :type message_ids:
+    :param attempt:
+    :type attempt:
+    :return:
+    :rtype:
+    """
+
+    is_last_attempt = attempt >= PERSONAL_MESSAGE_NOTIFICATION_MAX_ATTEMPTS
+    failed_message_ids = []
+
+    for message in PersonalMessage.objects.filter(pk__in=message_ids).select_related(
+        "sender", "recipient"
+    ):
+        try:
+            send_new_personal_message_notification(
+                message=message,
+                timeout=AA_FORUM_DISCORD_DM_TIMEOUT,
+                fallback=is_last_attempt,
+            )
+        except _personal_message_notification_errors() as exc:
+            if is_last_attempt:
+                PersonalMessage.objects.filter(pk=message.pk).update(
+                    notification_failed=True, notification_error=str(exc)
+                )
+
+                logger.error(
+                    msg=(
+                        f"Giving up on the Discord DM for personal message "
+                        f"{message.pk} after {attempt} attempt(s). Error: {exc}"
+                    )
+                )
+            else:
+                logger.warning(
+                    msg=(
+                        f"Failed to send the Discord DM for personal message "
+                        f"{message.pk}. Error: {exc}"
+                    )
+                )
+
+                failed_message_ids.append(message.pk)
+
+    if failed_message_ids:
+        countdown = PERSONAL_MESSAGE_NOTIFICATION_RETRY_BACKOFF * 2 ** (attempt - 1)
+
+        send_personal_message_notifications.apply_async(
+            kwargs={"message_ids": failed_message_ids, "attempt": attempt + 1},
+            countdown=countdown,
+        )
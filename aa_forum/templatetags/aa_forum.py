@@ -3,12 +3,8 @@ AA Forum template tags
 """
 
 # Standard Library
-import re
 from datetime import datetime
 
-# Third Party
-from bs4 import BeautifulSoup
-
 # Django
 from django import template
 from django.template.defaulttags import register
@@ -23,9 +19,10 @@ from allianceauth.services.hooks import get_extension_logger
 
 # AA Forum
 from aa_forum.app_settings import aa_timezones_installed
-from aa_forum.constants import SEARCH_STOPWORDS
-from aa_forum.models import PersonalMessage
+from aa_forum.helper.highlight import get_search_snippet, highlight_search_terms
+from aa_forum.helper.personal_messages import get_personal_messages_unread_count
 from aa_forum.providers.applogger import AppLogger
+from aa_forum.search.stopwords import is_stopword
 
 logger = AppLogger(my_logger=get_extension_logger(__name__))
 
@@ -107,6 +104,19 @@ def aa_forum_time(db_datetime: datetime) -> str:
     return formatted_forum_date
 
 
+def _search_phrase_terms(search_phrase: str) -> list[str]:
+    """
+    Words of the search phrase, without stopwords
+
+    :param search_phrase:
+    :type search_phrase:
+    :return:
+    :rtype:
+    """
+
+    return [word for word in search_phrase.split() if not is_stopword(word=word)]
+
+
 @register.filter
 def aa_forum_highlight_search_term(text: str, search_phrase: str) -> str:
     """
@@ -120,88 +130,31 @@ def aa_forum_highlight_search_term(text: str, search_phrase: str) -> str:
     :rtype:
     """
 
-    delimiter_search_term_start = "{«}"
-    delimiter_search_term_end = "{»}"
-
-    querywords = search_phrase.split()
-    search_phrase_terms = [
-        word for word in querywords if word.lower() not in SEARCH_STOPWORDS
-    ]
-    highlighted = text
-
-    for search_term in search_phrase_terms:
-        highlighted = re.sub(
-            pattern=f"(?i)({(re.escape(search_term))})",
-            repl=f"{delimiter_search_term_start}\\1{delimiter_search_term_end}",
-            string=highlighted,
+    return mark_safe(
+        highlight_search_terms(
+            text=text, search_terms=_search_phrase_terms(search_phrase=search_phrase)
         )
+    )
 
-    highlighted = BeautifulSoup(markup=highlighted, features="html.parser")
-
-    for hyperlink in highlighted.findAll(name="a"):
-        try:
-            hyperlink["href"] = (
-                hyperlink["href"]
-                .replace(delimiter_search_term_start, "")
-                .replace(delimiter_search_term_end, "")
-            )
-        except KeyError:
-            # this should never happen, but in case it does, add a dummy href
-            hyperlink["href"] = "#"
-
-        try:
-            hyperlink["title"] = (
-                hyperlink["title"]
-                .replace(delimiter_search_term_start, "")
-                .replace(delimiter_search_term_end, "")
-            )
-        except KeyError:
-            pass
-
-        try:
-            hyperlink["name"] = (
-                hyperlink["name"]
-                .replace(delimiter_search_term_start, "")
-                .replace(delimiter_search_term_end, "")
-            )
-        except KeyError:
-            pass
-
-    for image in highlighted.findAll("img"):
-        try:
-            image["src"] = (
-                image["src"]
-                .replace(delimiter_search_term_start, "")
-                .replace(delimiter_search_term_end, "")
-            )
-        except KeyError:
-            # this should never happen, but in case it does, add a dummy src
-            image["src"] = "#"
 
-        try:
-            image["alt"] = (
-                image["alt"]
-                .replace(delimiter_search_term_start, "")
-                .replace(delimiter_search_term_end, "")
-            )
-        except KeyError:
-            pass
+@register.filter
+def aa_forum_search_snippet(text: str, search_phrase: str) -> str:
+    """
+    Get a short excerpt of a text around the search terms, with the search
+    terms highlighted
 
-        try:
-            image["title"] = (
-                image["title"]
-                .replace(delimiter_search_term_start, "")
-                .replace(delimiter_search_term_end, "")
-            )
-        except KeyError:
-            pass
+    :param text: Plain text of the message
+    :type text:
+    :param search_phrase:
+    :type search_phrase:
+    :return:
+    :rtype:
+    """
 
     return mark_safe(
-        str(highlighted)
-        .replace(
-            delimiter_search_term_start, '<span class="aa-forum-search-term-highlight">'
+        get_search_snippet(
+            text=text, search_terms=_search_phrase_terms(search_phrase=search_phrase)
         )
-        .replace(delimiter_search_term_end, "</span>")
     )
 
 
@@ -244,9 +197,7 @@ def personal_message_unread_count(user: User) -> str:
     """
 
     return_value = ""
-    message_count = PersonalMessage.objects.get_personal_message_unread_count_for_user(
-        user=user
-    )
+    message_count = get_personal_messages_unread_count(user=user)
 
     if message_count > 0:
         return_value = mark_safe(
@@ -6,14 +6,32 @@ Initialize the tests
 import socket
 
 # Django
+from django.core.cache import cache
 from django.test import TestCase
 
+# AA Forum
+from aa_forum.managers import SettingManager
+
 
 class SocketAccessError(Exception):
     """Error raised when a test script accesses the network"""
 
 
-class BaseTestCase(TestCase):
+class ClearCacheMixin:
+    """Start every test with an empty cache.
+
+    The database is rolled back after each test, but the cache is not. Without
+    this, cached values from earlier tests (or test runs) would leak into a test.
+    """
+
+    def run(self, result=None):
+        cache.clear()
+        SettingManager.clear_cache()
+
+        return super().run(result)
+
+
+class BaseTestCase(ClearCacheMixin, TestCase):
     """Variation of Django's TestCase class that prevents any network use.
 
     Example:
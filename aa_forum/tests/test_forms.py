@@ -7,6 +7,7 @@ from django import forms
 
 # AA Forum
 from aa_forum.forms import (
+    EditBoardForm,
     NewTopicForm,
     SpecialModelChoiceIterator,
     SpecialModelMultipleChoiceField,
@@ -214,3 +215,31 @@ class TestNewTopicForm(BaseTestCase):
         self.assertIn("World", cleaned)
         # Ensure HTML tags are preserved by string_cleanup (scripts/styles removed elsewhere)
         self.assertIn("<b>World</b>", cleaned)
+
+
+class TestEditBoardForm(BaseTestCase):
+    """
+    Test EditBoardForm behaviour
+    """
+
+    def test_reply_window_defaults_to_zero_when_empty(self):
+        """
+        Ensure an empty reply window means replies are posted right away
+        """
+
+        form = EditBoardForm(data={"name": "Pings", "discord_webhook_reply_window": ""})
+
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["discord_webhook_reply_window"], 0)
+
+    def test_reply_window_is_kept(self):
+        """
+        Ensure a reply window is kept as entered
+        """
+
+        form = EditBoardForm(
+            data={"name": "Pings", "discord_webhook_reply_window": "30"}
+        )
+
+        self.assertTrue(form.is_valid())
+        self.assertEqual(form.cleaned_data["discord_webhook_reply_window"], 30)
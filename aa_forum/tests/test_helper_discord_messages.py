@@ -3,24 +3,43 @@ Tests for aa_forum.helper.discord_messages
 """
 
 # Standard Library
+import json
+from datetime import timedelta
 from types import SimpleNamespace
 from unittest.mock import patch
 
+# Third Party
+import requests
+from dhooks_lite import WebhookResponse
+from discordproxy.exceptions import DiscordProxyTimeoutError
+from grpc import StatusCode
+
+# Django
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
 # AA Forum
 from aa_forum import __version__
-from aa_forum.app_settings import (
-    DISCORDPROXY_HOST,
-    DISCORDPROXY_PORT,
-    DISCORDPROXY_TIMEOUT,
+from aa_forum.app_settings import DISCORDPROXY_TIMEOUT
+from aa_forum.constants import (
+    APP_NAME_VERBOSE_USERAGENT,
+    DISCORD_WEBHOOK_MAX_EMBEDS,
+    GITHUB_URL,
 )
-from aa_forum.constants import APP_NAME_VERBOSE_USERAGENT, GITHUB_URL
 from aa_forum.helper.discord_messages import (
     _aadiscordbot_send_private_message,
     _dhooks_lite_user_agent,
     _discordproxy_send_private_message,
+    execute_discord_webhook_message,
+    get_discord_webhook_rate_limit_wait,
+    send_message_to_discord_webhook,
     send_new_personal_message_notification,
+    update_discord_webhook_rate_limit,
 )
+from aa_forum.models import Board, Category, DiscordWebhookMessage, Message, Topic
+from aa_forum.tasks import send_discord_webhook_message
 from aa_forum.tests import BaseTestCase
+from aa_forum.tests.utils import create_fake_user, random_id
 
 
 class TestDhooksLiteUserAgent(BaseTestCase):
@@ -154,7 +173,9 @@ class TestDiscordproxySendPrivateMessage(BaseTestCase):
         :rtype:
         """
 
-        with patch("discordproxy.client.DiscordClient") as MockClient:
+        with patch(
+            "aa_forum.helper.discord_messages.get_discordproxy_client"
+        ) as mock_get_client:
             with patch("discordproxy.discord_api_pb2.Embed") as MockEmbed:
                 _discordproxy_send_private_message(
                     user_id=10,
@@ -164,13 +185,11 @@ class TestDiscordproxySendPrivateMessage(BaseTestCase):
                     embed_message=True,
                 )
 
-                MockClient.assert_called_once_with(
-                    target=f"{DISCORDPROXY_HOST}:{DISCORDPROXY_PORT}",
+                mock_get_client.return_value.create_direct_message.assert_called_once_with(
+                    user_id=10,
+                    embed=MockEmbed.return_value,
                     timeout=DISCORDPROXY_TIMEOUT,
                 )
-                MockClient.return_value.create_direct_message.assert_called_once_with(
-                    user_id=10, embed=MockEmbed.return_value
-                )
 
     def test_sends_content_via_discordproxy_when_embed_false(self):
         """
@@ -180,7 +199,9 @@ class TestDiscordproxySendPrivateMessage(BaseTestCase):
         :rtype:
         """
 
-        with patch("discordproxy.client.DiscordClient") as MockClient:
+        with patch(
+            "aa_forum.helper.discord_messages.get_discordproxy_client"
+        ) as mock_get_client:
             _discordproxy_send_private_message(
                 user_id=11,
                 level="info",
@@ -189,8 +210,8 @@ class TestDiscordproxySendPrivateMessage(BaseTestCase):
                 embed_message=False,
             )
 
-            MockClient.return_value.create_direct_message.assert_called_once_with(
-                user_id=11, content="**Hello**\n\nText"
+            mock_get_client.return_value.create_direct_message.assert_called_once_with(
+                user_id=11, content="**Hello**\n\nText", timeout=DISCORDPROXY_TIMEOUT
             )
 
     def test_falls_back_to_aadiscordbot_when_discordproxy_raises(self):
@@ -201,10 +222,12 @@ class TestDiscordproxySendPrivateMessage(BaseTestCase):
         :rtype:
         """
 
-        with patch("discordproxy.client.DiscordClient") as MockClient:
+        with patch(
+            "aa_forum.helper.discord_messages.get_discordproxy_client"
+        ) as mock_get_client:
             with patch("discordproxy.exceptions.DiscordProxyException", new=Exception):
-                MockClient.return_value.create_direct_message.side_effect = Exception(
-                    "boom"
+                mock_get_client.return_value.create_direct_message.side_effect = (
+                    Exception("boom")
                 )
 
                 with patch(
@@ -226,6 +249,42 @@ class TestDiscordproxySendPrivateMessage(BaseTestCase):
                         embed_message=False,
                     )
 
+    def test_raises_grpc_error_when_fallback_disabled(self):
+        """
+        Ensure gRPC errors are raised instead of falling back, so the caller can retry
+
+        :return:
+        :rtype:
+        """
+
+        with patch(
+            "aa_forum.helper.discord_messages.get_discordproxy_client"
+        ) as mock_get_client:
+            mock_get_client.return_value.create_direct_message.side_effect = (
+                DiscordProxyTimeoutError(
+                    status=StatusCode.DEADLINE_EXCEEDED, details="timeout"
+                )
+            )
+
+            with patch(
+                "aa_forum.helper.discord_messages._aadiscordbot_send_private_message"
+            ) as mock_aadiscord:
+                with self.assertRaises(DiscordProxyTimeoutError):
+                    _discordproxy_send_private_message(
+                        user_id=13,
+                        level="info",
+                        title="T",
+                        message="M",
+                        embed_message=False,
+                        timeout=5,
+                        fallback=False,
+                    )
+
+                mock_get_client.return_value.create_direct_message.assert_called_once_with(
+                    user_id=13, content="**T**\n\nM", timeout=5
+                )
+                self.assertFalse(mock_aadiscord.called)
+
 
 class TestSendNewPersonalMessageNotification(BaseTestCase):
     """
@@ -361,3 +420,500 @@ class TestSendNewPersonalMessageNotification(BaseTestCase):
 
             self.assertFalse(mock_aadiscord.called)
             self.assertFalse(mock_proxy.called)
+
+
+class TestSendMessageToDiscordWebhook(BaseTestCase):
+    """
+    Tests for queueing and executing messages for Discord webhooks
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Set up a board with a webhook and a topic
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+
+        cls.user = create_fake_user(
+            character_id=random_id(), character_name="Bruce Wayne"
+        )
+        cls.category = Category.objects.create(name="Science")
+        cls.board = Board.objects.create(
+            name="Physics",
+            category=cls.category,
+            discord_webhook="https://discord.com/api/webhooks/1/abc",
+        )
+
+    def setUp(self) -> None:
+        """
+        Set up a topic with a message
+
+        :return:
+        :rtype:
+        """
+
+        self.topic = Topic.objects.create(subject="Mysteries", board=self.board)
+        self.message = Message.objects.create(
+            topic=self.topic, user_created=self.user, message="<p>Dark matter</p>"
+        )
+        self.topic.refresh_from_db()
+
+    @patch("aa_forum.tasks.send_discord_webhook_message.delay")
+    def test_should_queue_message_and_send_after_commit(self, mock_delay):
+        """
+        Test should put the message into the outbox and only send it
+        after the transaction has been committed
+
+        :param mock_delay:
+        :type mock_delay:
+        :return:
+        :rtype:
+        """
+
+        # when
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            webhook_message = send_message_to_discord_webhook(
+                board=self.board,
+                topic=self.topic,
+                message=self.message,
+                headline="**New topic**",
+            )
+
+            sent_before_commit = mock_delay.called
+
+        # then
+        self.assertFalse(sent_before_commit)
+        self.assertEqual(first=len(callbacks), second=1)
+        mock_delay.assert_called_once_with(message_id=webhook_message.pk)
+        self.assertEqual(first=webhook_message.content, second="**New topic**")
+        self.assertEqual(
+            first=webhook_message.webhook_url, second=self.board.discord_webhook
+        )
+        self.assertEqual(first=webhook_message.embeds[0]["title"], second="Mysteries")
+
+    @patch("aa_forum.tasks.send_discord_webhook_message.delay")
+    @patch("dhooks_lite.client.requests.post")
+    def test_should_execute_queued_message(self, mock_post, mock_delay):
+        """
+        Test should send the queued message with its embed to the webhook
+
+        :param mock_post:
+        :type mock_post:
+        :param mock_delay:
+        :type mock_delay:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_post.return_value.ok = True
+        mock_post.return_value.status_code = 200
+        mock_post.return_value.headers = {}
+        mock_post.return_value.json.return_value = {}
+        webhook_message = send_message_to_discord_webhook(
+            board=self.board,
+            topic=self.topic,
+            message=self.message,
+            headline="**New topic**",
+        )
+        webhook_message.refresh_from_db()
+
+        # when
+        response = execute_discord_webhook_message(webhook_message=webhook_message)
+
+        # then
+        self.assertTrue(response.status_ok)
+        payload = json.loads(mock_post.call_args.kwargs["data"])
+        self.assertEqual(first=payload["content"], second="**New topic**")
+        self.assertEqual(first=payload["embeds"][0]["title"], second="Mysteries")
+        self.assertAlmostEqual(
+            first=parse_datetime(payload["embeds"][0]["timestamp"]),
+            second=self.message.time_posted,
+            delta=timedelta(milliseconds=1),
+        )
+
+    @patch("aa_forum.tasks.send_discord_webhook_message.delay")
+    def test_should_send_first_image_with_absolute_url(self, mock_delay):
+        """
+        Test should make the stored relative URL of the first image absolute
+        for the embed
+
+        :param mock_delay:
+        :type mock_delay:
+        :return:
+        :rtype:
+        """
+
+        # given
+        message = Message.objects.create(
+            topic=self.topic,
+            user_created=self.user,
+            message='<p>Dark matter</p><img src="/media/galaxy.png">',
+        )
+
+        # when
+        webhook_message = send_message_to_discord_webhook(
+            board=self.board,
+            topic=self.topic,
+            message=message,
+            headline="**New reply**",
+        )
+
+        # then
+        self.assertEqual(first=message.first_image_url, second="/media/galaxy.png")
+        self.assertEqual(
+            first=webhook_message.embeds[0]["image"]["url"],
+            second="https://example.com/media/galaxy.png",
+        )
+
+    @patch("aa_forum.tasks.send_discord_webhook_message.delay")
+    def test_should_parse_messages_without_stored_excerpt(self, mock_delay):
+        """
+        Test should compute the excerpt and the first image of messages that
+        were saved before they were stored with the message
+
+        :param mock_delay:
+        :type mock_delay:
+        :return:
+        :rtype:
+        """
+
+        # given
+        message = Message.objects.create(
+            topic=self.topic,
+            user_created=self.user,
+            message='<p>Dark matter</p><img src="/media/galaxy.png">',
+        )
+        Message.objects.filter(pk=message.pk).update(
+            discord_excerpt="", first_image_url=""
+        )
+        message.refresh_from_db()
+
+        # when
+        webhook_message = send_message_to_discord_webhook(
+            board=self.board,
+            topic=self.topic,
+            message=message,
+            headline="**New reply**",
+        )
+
+        # then
+        self.assertEqual(
+            first=webhook_message.embeds[0]["description"], second="Dark matter"
+        )
+        self.assertEqual(
+            first=webhook_message.embeds[0]["image"]["url"],
+            second="https://example.com/media/galaxy.png",
+        )
+
+
+@patch("aa_forum.tasks.send_discord_webhook_message.apply_async")
+class TestCoalescedDiscordWebhookMessages(BaseTestCase):
+    """
+    Tests for replies that are posted together to Discord webhooks
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Set up a board with a webhook and a reply window, and a topic
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+
+        cls.user = create_fake_user(
+            character_id=random_id(), character_name="Bruce Wayne"
+        )
+        cls.category = Category.objects.create(name="Fleet Ops")
+        cls.board = Board.objects.create(
+            name="Pings",
+            category=cls.category,
+            discord_webhook="https://discord.com/api/webhooks/1/abc",
+            use_webhook_for_replies=True,
+            discord_webhook_reply_window=60,
+        )
+        cls.topic = Topic.objects.create(subject="Stratop", board=cls.board)
+        Message.objects.create(
+            topic=cls.topic, user_created=cls.user, message="<p>Form up</p>"
+        )
+        cls.topic.refresh_from_db()
+
+    def _reply(self, text: str = "<p>x up</p>", board: Board = None):
+        """
+        Post a reply and send it to the webhook
+
+        :param text:
+        :type text:
+        :param board:
+        :type board:
+        :return:
+        :rtype:
+        """
+
+        message = Message.objects.create(
+            topic=self.topic, user_created=self.user, message=text
+        )
+
+        return send_message_to_discord_webhook(
+            board=board or self.board,
+            topic=self.topic,
+            message=message,
+            headline="**New reply**",
+            coalesce=True,
+        )
+
+    def test_should_send_replies_within_window_together(self, mock_apply):
+        """
+        Test should put all replies within the window into one webhook message
+        and send it once the window is over
+
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # when
+        with self.captureOnCommitCallbacks(execute=True):
+            webhook_messages = [self._reply() for _ in range(3)]
+
+        # then
+        webhook_message = DiscordWebhookMessage.objects.get()
+        self.assertEqual(
+            first={message.pk for message in webhook_messages},
+            second={webhook_message.pk},
+        )
+        self.assertEqual(first=len(webhook_message.embeds), second=3)
+        self.assertIn("New replies", webhook_message.content)
+        self.assertGreater(webhook_message.time_next_attempt, timezone.now())
+        mock_apply.assert_called_once_with(
+            kwargs={
+                "message_id": webhook_message.pk,
+                "claim": webhook_message.time_next_attempt.isoformat(),
+            },
+            countdown=60,
+        )
+
+    def test_should_keep_headline_for_single_reply(self, mock_apply):
+        """
+        Test should use the headline of the reply when it is on its own
+
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # when
+        webhook_message = self._reply()
+
+        # then
+        self.assertEqual(first=webhook_message.content, second="**New reply**")
+
+    def test_should_start_new_message_after_ten_embeds(self, mock_apply):
+        """
+        Test should not put more embeds into a message than Discord allows
+
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # when
+        for _ in range(DISCORD_WEBHOOK_MAX_EMBEDS + 1):
+            self._reply()
+
+        # then
+        self.assertEqual(
+            first=sorted(
+                len(embeds)
+                for embeds in DiscordWebhookMessage.objects.values_list(
+                    "embeds", flat=True
+                )
+            ),
+            second=[1, DISCORD_WEBHOOK_MAX_EMBEDS],
+        )
+
+    def test_should_start_new_message_when_too_long(self, mock_apply):
+        """
+        Test should stay within Discord's character limit for all embeds
+
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # when
+        for _ in range(8):
+            self._reply(text=f"<p>{'o7 ' * 400}</p>")
+
+        # then
+        self.assertGreater(DiscordWebhookMessage.objects.count(), 1)
+
+    def test_should_start_new_message_once_sending(self, mock_apply):
+        """
+        Test should not add replies to a message that is already being sent
+
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        first = self._reply()
+
+        with patch("aa_forum.tasks.execute_discord_webhook_message") as mock_execute:
+            mock_execute.side_effect = requests.exceptions.ConnectionError("down")
+            send_discord_webhook_message(
+                message_id=first.pk, claim=first.time_next_attempt.isoformat()
+            )
+
+        # when
+        second = self._reply()
+
+        # then
+        self.assertNotEqual(first=first.pk, second=second.pk)
+        self.assertEqual(first=len(second.embeds), second=1)
+
+    def test_should_send_right_away_without_window(self, mock_apply):
+        """
+        Test should send every reply on its own when the board has no window
+
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        board = Board.objects.create(
+            name="Chatter",
+            category=self.category,
+            discord_webhook="https://discord.com/api/webhooks/2/def",
+            use_webhook_for_replies=True,
+        )
+
+        # when
+        with patch("aa_forum.tasks.send_discord_webhook_message.delay"):
+            self._reply(board=board)
+            self._reply(board=board)
+
+        # then
+        self.assertEqual(first=DiscordWebhookMessage.objects.count(), second=2)
+        self.assertFalse(
+            DiscordWebhookMessage.objects.exclude(coalesce_key="").exists()
+        )
+
+
+class TestDiscordWebhookRateLimit(BaseTestCase):
+    """
+    Tests for the rate limits of Discord webhooks
+    """
+
+    webhook_url = "https://discord.com/api/webhooks/1/abc"
+
+    def test_should_not_wait_without_rate_limit(self):
+        """
+        Test should not wait when the webhook has not been rate limited
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        wait = get_discord_webhook_rate_limit_wait(webhook_url=self.webhook_url)
+
+        # then
+        self.assertEqual(first=wait, second=0)
+
+    def test_should_remember_retry_after_from_429(self):
+        """
+        Test should wait for `retry_after` after a 429 response
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        response = WebhookResponse(
+            headers={"Retry-After": "3"},
+            status_code=429,
+            content={"retry_after": 2.5},
+        )
+
+        # when
+        wait = update_discord_webhook_rate_limit(
+            webhook_url=self.webhook_url, response=response
+        )
+
+        # then
+        self.assertEqual(first=wait, second=2.5)
+        self.assertAlmostEqual(
+            first=get_discord_webhook_rate_limit_wait(webhook_url=self.webhook_url),
+            second=2.5,
+            delta=0.5,
+        )
+        self.assertEqual(
+            first=get_discord_webhook_rate_limit_wait(
+                webhook_url="https://discord.com/api/webhooks/2/def"
+            ),
+            second=0,
+        )
+
+    def test_should_remember_exhausted_rate_limit(self):
+        """
+        Test should wait for the reset when no requests are remaining
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        response = WebhookResponse(
+            headers={"x-ratelimit-remaining": "0", "x-ratelimit-reset-after": "1.5"},
+            status_code=200,
+        )
+
+        # when
+        wait = update_discord_webhook_rate_limit(
+            webhook_url=self.webhook_url, response=response
+        )
+
+        # then
+        self.assertEqual(first=wait, second=1.5)
+
+    def test_should_not_wait_with_remaining_requests(self):
+        """
+        Test should not wait when there are requests remaining
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        response = WebhookResponse(
+            headers={"x-ratelimit-remaining": "4", "x-ratelimit-reset-after": "1.5"},
+            status_code=200,
+        )
+
+        # when
+        wait = update_discord_webhook_rate_limit(
+            webhook_url=self.webhook_url, response=response
+        )
+
+        # then
+        self.assertEqual(first=wait, second=0)
+        self.assertEqual(
+            first=get_discord_webhook_rate_limit_wait(webhook_url=self.webhook_url),
+            second=0,
+        )
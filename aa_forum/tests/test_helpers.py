@@ -6,8 +6,13 @@ Test for the helpers
 from unittest.mock import patch
 
 # Django
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.db.models import F
 from django.test import RequestFactory
 from django.urls import reverse
+from django.utils.html import strip_tags
 
 # Alliance Auth
 from allianceauth.groupmanagement.models import Group
@@ -17,11 +22,45 @@ from allianceauth.tests.auth_utils import AuthUtils
 from aa_forum.forms import NewCategoryForm
 from aa_forum.helper.eve_images import get_character_portrait_from_evecharacter
 from aa_forum.helper.forms import message_form_errors
-from aa_forum.helper.text import get_first_image_url_from_text, string_cleanup
+from aa_forum.helper.highlight import (
+    SEARCH_HIGHLIGHT_END,
+    SEARCH_HIGHLIGHT_START,
+    get_search_snippet,
+    highlight_search_terms,
+)
+from aa_forum.helper.pagination import (
+    CountedPaginator,
+    KeysetPaginator,
+    count_with_limit,
+)
+from aa_forum.helper.personal_messages import get_personal_messages_unread_count
+from aa_forum.helper.text import (
+    get_discord_excerpt_and_first_image_url,
+    get_first_image_url_from_text,
+    parse_message,
+    string_cleanup,
+)
+from aa_forum.helper.unread_topics import (
+    get_unread_topics_count,
+    invalidate_unread_topics_count,
+)
 from aa_forum.helper.user import get_main_character_from_user
-from aa_forum.models import get_sentinel_user
+from aa_forum.models import (
+    Board,
+    Category,
+    LastMessageSeen,
+    Message,
+    PersonalMessage,
+    Topic,
+    get_sentinel_user,
+)
 from aa_forum.tests import BaseTestCase
-from aa_forum.tests.utils import create_eve_character, create_fake_user, random_id
+from aa_forum.tests.utils import (
+    create_eve_character,
+    create_fake_messages,
+    create_fake_user,
+    random_id,
+)
 
 
 @patch("aa_forum.helper.forms.messages")
@@ -192,6 +231,1360 @@ class TestHelperText(BaseTestCase):
 
         self.assertEqual(first=image_url, second="https://test.de/foobar.jpg")
 
+    def test_should_return_absolute_first_image_url_for_get_image_url(self):
+        """
+        Test should return images on this site with an absolute URL
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        image_url = get_first_image_url_from_text(text='<img src="/media/fleet.png">')
+
+        # then
+        self.assertEqual(first=image_url, second="https://example.com/media/fleet.png")
+
+    def test_should_return_discord_excerpt_and_first_image_url(self):
+        """
+        Test should return the plain text excerpt and the first valid image URL
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        text = (
+            '<p>Fleet&nbsp;at <b>20:00</b> &lt;script&gt;</p><img src="nope">'
+            '<img src="/media/fleet.png"><img src="https://test.de/other.jpg">'
+        )
+
+        # when
+        excerpt, image_url = get_discord_excerpt_and_first_image_url(text=text)
+
+        # then
+        self.assertEqual(first=excerpt, second="Fleet at 20:00 ")
+        self.assertEqual(first=image_url, second="/media/fleet.png")
+
+    def test_should_shorten_discord_excerpt(self):
+        """
+        Test should shorten the excerpt to the given length
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        excerpt, image_url = get_discord_excerpt_and_first_image_url(
+            text=f"<p>{'a' * 20}</p>", excerpt_length=10
+        )
+
+        # then
+        self.assertEqual(first=excerpt, second=f"{'a' * 10}…")
+        self.assertIsNone(obj=image_url)
+
+    def test_should_parse_message_in_one_pass(self):
+        """
+        Test should sanitize the HTML, extract the plain text and collect
+        URLs and stats with a single parser
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        text = (
+            "<head><title>Killmail</title></head>"
+            '<p class="lead">Loss&nbsp;of <b>Rifter</b> &amp; more</p>'
+            '<script type="text/javascript">alert("<p>")</script><br/>'
+            "<style>p{display: none}</style><!-- note --><!DOCTYPE html><?php?>"
+            '<img src="/media/rifter.png"><a href="https://zkillboard.com/">zkb</a>'
+        )
+
+        # when
+        parsed_message = parse_message(text=text)
+
+        # then
+        self.assertEqual(
+            first=parsed_message.html,
+            second=(
+                '<p class="lead">Loss&nbsp;of <b>Rifter</b> &amp; more</p><br/>'
+                '<img src="/media/rifter.png">'
+                '<a href="https://zkillboard.com/">zkb</a>'
+            ),
+        )
+        self.assertEqual(
+            first=parsed_message.plaintext,
+            second=strip_tags(parsed_message.html),
+        )
+        self.assertEqual(first=parsed_message.text, second="Loss of Rifter & morezkb")
+        self.assertEqual(first=parsed_message.image_urls, second=["/media/rifter.png"])
+        self.assertEqual(
+            first=parsed_message.link_urls, second=["https://zkillboard.com/"]
+        )
+        self.assertEqual(first=parsed_message.word_count, second=5)
+        self.assertEqual(first=parsed_message.length, second=24)
+        self.assertEqual(
+            first=parsed_message.first_image_url, second="/media/rifter.png"
+        )
+
+    def test_should_drop_cdata_sections(self):
+        """
+        Test should drop CDATA sections and keep the HTML around them intact
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        text = "<p>a</p><![CDATA[x]]><p>b</p>"
+
+        # when
+        parsed_message = parse_message(text=text)
+
+        # then
+        self.assertEqual(first=parsed_message.html, second="<p>a</p><p>b</p>")
+        self.assertEqual(first=parsed_message.plaintext, second=strip_tags(value=text))
+        self.assertEqual(first=parsed_message.text, second="ab")
+
+    def test_should_keep_html_without_removed_elements(self):
+        """
+        Test should return HTML without removed elements unchanged
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        text = (
+            '<figure class="table"><table><tbody><tr><td>Damage&#160;done</td>'
+            "<td>1.337</td></tr></tbody></table></figure><p>a &lt; b</p>"
+        )
+
+        # when
+        cleaned_string = string_cleanup(string=text)
+
+        # then
+        self.assertEqual(first=cleaned_string, second=text)
+
+    def test_should_drop_comments_that_browsers_end_elsewhere(self):
+        """
+        Test should drop comments with the markup in them, since browsers
+        end `<!-->` and `--!>` comments earlier than Python does
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        texts = (
+            "<!--><script>alert(1)</script>-->",
+            "<!-- --!><script>alert(1)</script> -->",
+        )
+
+        for text in texts:
+            with self.subTest(text=text):
+                # when
+                cleaned_string = string_cleanup(string=text)
+
+                # then
+                self.assertEqual(first=cleaned_string, second="")
+
+    def test_should_escape_markup_left_in_text(self):
+        """
+        Test should escape the markup that Python leaves in the text, like
+        an unterminated comment, so browsers don't parse it
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        text = "<p>a < b</p><!-- <script>alert(1)</script>"
+
+        # when
+        cleaned_string = string_cleanup(string=text)
+
+        # then
+        self.assertEqual(
+            first=cleaned_string,
+            second="<p>a &lt; b</p>&lt;!-- &lt;script>alert(1)",
+        )
+        self.assertNotIn(member="<script", container=cleaned_string)
+
+
+class TestHelperHighlight(BaseTestCase):
+    """
+    Testing the search term highlighting
+    """
+
+    def test_should_highlight_all_terms_in_one_pass(self):
+        """
+        Test should highlight all terms, longer terms first
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        text = "<p>Rifter and Rifters, but not Thrasher</p>"
+
+        # when
+        highlighted = highlight_search_terms(
+            text=text, search_terms=["rifter", "Rifters", "thrash"]
+        )
+
+        # then
+        self.assertEqual(
+            first=highlighted,
+            second=(
+                f"<p>{SEARCH_HIGHLIGHT_START}Rifter{SEARCH_HIGHLIGHT_END} and "
+                f"{SEARCH_HIGHLIGHT_START}Rifters{SEARCH_HIGHLIGHT_END}, but not "
+                f"{SEARCH_HIGHLIGHT_START}Thrash{SEARCH_HIGHLIGHT_END}er</p>"
+            ),
+        )
+
+    def test_should_only_highlight_text(self):
+        """
+        Test should not highlight in tags, comments, character references
+        and scripts
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        text = (
+            '<a href="/amp" title="amp > amp"><!-- amp -->&amp; amp</a>'
+            "<script>var amp = 1;</script>"
+        )
+
+        # when
+        highlighted = highlight_search_terms(text=text, search_terms=["amp"])
+
+        # then
+        self.assertEqual(
+            first=highlighted,
+            second=(
+                '<a href="/amp" title="amp > amp"><!-- amp -->&amp; '
+                f"{SEARCH_HIGHLIGHT_START}amp{SEARCH_HIGHLIGHT_END}</a>"
+                "<script>var amp = 1;</script>"
+            ),
+        )
+
+    def test_should_return_text_without_search_terms(self):
+        """
+        Test should return the text unchanged without search terms
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        highlighted = highlight_search_terms(text="<p>Rifter</p>", search_terms=[])
+
+        # then
+        self.assertEqual(first=highlighted, second="<p>Rifter</p>")
+
+    @patch("aa_forum.helper.highlight._highlight")
+    def test_should_cache_per_text_and_term_set(self, mock_highlight):
+        """
+        Test should highlight a text only once per set of search terms
+
+        :param mock_highlight:
+        :type mock_highlight:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_highlight.return_value = "highlighted"
+        text = f"<p>Rifter {random_id()}</p>" * 200
+
+        # when
+        highlight_search_terms(text=text, search_terms=["Rifter", "Frigate"])
+        highlight_search_terms(text=text, search_terms=["frigate", "rifter"])
+        highlight_search_terms(text=text, search_terms=["Rifter"])
+
+        # then
+        self.assertEqual(first=mock_highlight.call_count, second=2)
+
+    @patch("aa_forum.helper.highlight.cache")
+    def test_should_not_cache_short_texts(self, mock_cache):
+        """
+        Test should highlight short texts without the cache
+
+        :param mock_cache:
+        :type mock_cache:
+        :return:
+        :rtype:
+        """
+
+        # when
+        highlighted = highlight_search_terms(
+            text="<p>Rifter</p>", search_terms=["rifter"]
+        )
+
+        # then
+        self.assertEqual(
+            first=highlighted,
+            second=f"<p>{SEARCH_HIGHLIGHT_START}Rifter{SEARCH_HIGHLIGHT_END}</p>",
+        )
+        mock_cache.get.assert_not_called()
+        mock_cache.set.assert_not_called()
+
+
+class TestHelperSearchSnippet(BaseTestCase):
+    """
+    Testing the search result snippets
+    """
+
+    def test_should_return_short_text_highlighted(self):
+        """
+        Test should return a short text as a whole, escaped and highlighted
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        snippet = get_search_snippet(
+            text="Rifter &amp; <Thrasher>", search_terms=["thrasher"], length=100
+        )
+
+        # then
+        self.assertEqual(
+            first=snippet,
+            second=(
+                f"Rifter &amp; &lt;{SEARCH_HIGHLIGHT_START}Thrasher"
+                f"{SEARCH_HIGHLIGHT_END}&gt;"
+            ),
+        )
+
+    def test_should_return_window_around_the_search_terms(self):
+        """
+        Test should return the window with the most search terms, without
+        cutting words
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        text = f"{'Frigate ' * 20}Rifter and Thrasher {'Cruiser ' * 20}"
+
+        # when
+        snippet = get_search_snippet(
+            text=text, search_terms=["rifter", "thrasher"], length=40
+        )
+
+        # then
+        self.assertEqual(
+            first=snippet,
+            second=(
+                f"…Frigate Frigate {SEARCH_HIGHLIGHT_START}Rifter"
+                f"{SEARCH_HIGHLIGHT_END} and {SEARCH_HIGHLIGHT_START}Thrasher"
+                f"{SEARCH_HIGHLIGHT_END} Cruiser…"
+            ),
+        )
+
+    def test_should_return_fragments_for_distant_search_terms(self):
+        """
+        Test should return one fragment per search term, when they are too
+        far apart for one window
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        text = f"Rifter {'Frigate ' * 50}Thrasher {'Cruiser ' * 50}Slasher"
+
+        # when
+        snippet = get_search_snippet(
+            text=text, search_terms=["rifter", "thrasher", "slasher"], length=90
+        )
+
+        # then
+        self.assertEqual(
+            first=snippet.count(SEARCH_HIGHLIGHT_START), second=3, msg=snippet
+        )
+        self.assertEqual(first=snippet.count(" … "), second=2, msg=snippet)
+        self.assertLessEqual(
+            a=len(strip_tags(snippet)), b=90 + len(" … ") * 2, msg=snippet
+        )
+
+    def test_should_clip_search_terms_longer_than_the_snippet(self):
+        """
+        Test should start the snippet with the first match, when the search
+        term is longer than the snippet
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        term = "a" * 40
+
+        # when
+        snippet = get_search_snippet(
+            text=f"{'x ' * 100}{term}{' y' * 100}", search_terms=[term], length=30
+        )
+
+        # then
+        self.assertEqual(first=snippet, second=f"…{'a' * 30}…")
+
+    def test_should_use_one_window_when_terms_are_longer_than_fragments(self):
+        """
+        Test should return the full window, when the search terms only fit
+        into it and not into the shorter fragments
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        terms = ["a" * 40, "b" * 40]
+        text = f"{'x ' * 100}{terms[0]}{' y' * 100} {terms[1]}"
+
+        # when
+        snippet = get_search_snippet(text=text, search_terms=terms, length=60)
+
+        # then
+        self.assertEqual(
+            first=snippet,
+            second=f"…x x x x x x x x {SEARCH_HIGHLIGHT_START}{terms[0]}"
+            f"{SEARCH_HIGHLIGHT_END} y y…",
+        )
+
+    def test_should_return_beginning_without_matches(self):
+        """
+        Test should return the beginning of the text, when the search terms
+        are not in it
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        snippet = get_search_snippet(
+            text="Fly safe " * 10, search_terms=["rifter"], length=20
+        )
+
+        # then
+        self.assertEqual(first=snippet, second="Fly safe Fly safe…")
+
+
+class TestHelperPagination(BaseTestCase):
+    """
+    Testing the keyset paginator
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Set up a user, a category and a board
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+        cls.user = create_fake_user(
+            character_id=random_id(), character_name="Bruce Wayne"
+        )
+        cls.category = Category.objects.create(name="Science")
+        cls.board = Board.objects.create(name="Physics", category=cls.category)
+
+    def setUp(self) -> None:
+        """
+        Set up a topic with 17 messages
+
+        :return:
+        :rtype:
+        """
+
+        self.topic = Topic.objects.create(subject="Mysteries", board=self.board)
+        create_fake_messages(topic=self.topic, amount=17)
+        self.messages = Message.objects.filter(topic=self.topic)
+
+    def _keyset_paginator(self, **kwargs) -> KeysetPaginator:
+        """
+        Keyset paginator over the topic's messages
+
+        :param kwargs:
+        :type kwargs:
+        :return:
+        :rtype:
+        """
+
+        params = {
+            "object_list": self.messages,
+            "per_page": 5,
+            "ordering": ("time_posted", "pk"),
+            "cache_key": f"test:{self.topic.pk}",
+        }
+        params.update(kwargs)
+
+        return KeysetPaginator(**params)
+
+    def test_should_return_the_same_pages_as_the_offset_paginator(self):
+        """
+        Test should return the same pages as Django's offset based paginator
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        offset_paginator = Paginator(
+            object_list=self.messages.order_by("time_posted", "pk"), per_page=5
+        )
+        keyset_paginator = self._keyset_paginator()
+
+        # when / then
+        self.assertEqual(first=keyset_paginator.num_pages, second=4)
+
+        for number in keyset_paginator.page_range:
+            with self.subTest(page=number):
+                self.assertListEqual(
+                    list1=list(keyset_paginator.page(number=number)),
+                    list2=list(offset_paginator.page(number=number)),
+                )
+
+    def test_should_find_deep_page_without_cached_anchors(self):
+        """
+        Test should find a deep page when no anchor has been cached yet
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        expected = list(self.messages.order_by("time_posted", "pk")[10:15])
+
+        # when
+        page = self._keyset_paginator().page(number=3)
+
+        # then
+        self.assertListEqual(list1=list(page), list2=expected)
+        self.assertTrue(expr=page.has_next())
+        self.assertEqual(first=page.start_index(), second=11)
+
+    def test_should_use_cached_anchor(self):
+        """
+        Test should seek directly to a page when its anchor is cached
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self._keyset_paginator().page(number=2)
+        paginator = self._keyset_paginator(count=17)
+
+        # when
+        with self.assertNumQueries(num=1):
+            page = paginator.page(number=3)
+
+        # then
+        self.assertListEqual(
+            list1=list(page),
+            list2=list(self.messages.order_by("time_posted", "pk")[10:15]),
+        )
+
+    def test_should_not_use_anchors_from_another_state(self):
+        """
+        Test should not use anchors that were cached for a different item count
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self._keyset_paginator().page(number=3)
+        self.messages.order_by("time_posted").first().delete()
+
+        # when
+        page = self._keyset_paginator().page(number=3)
+
+        # then
+        self.assertListEqual(
+            list1=list(page),
+            list2=list(self.messages.order_by("time_posted", "pk")[10:15]),
+        )
+
+    def test_should_paginate_mixed_ordering_with_nullable_keys(self):
+        """
+        Test should paginate descending, mixed keys with NULL values
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        for subject in ("Alpha", "Beta", "Gamma", "Delta"):
+            topic = Topic.objects.create(subject=subject, board=self.board)
+            create_fake_messages(topic=topic, amount=1)
+
+        Topic.objects.create(subject="No messages", board=self.board)
+        Topic.objects.filter(subject="Beta").update(is_sticky=True)
+        topics = Topic.objects.filter(board=self.board)
+        expected = list(
+            topics.order_by(
+                "-is_sticky",
+                F("last_message__time_posted").desc(nulls_last=True),
+                "-pk",
+            )
+        )
+
+        # when
+        paginator = KeysetPaginator(
+            object_list=topics,
+            per_page=2,
+            ordering=("-is_sticky", "-last_message__time_posted", "-pk"),
+            cache_key=f"test:board:{self.board.pk}",
+        )
+        result = [topic for page in paginator for topic in page]
+
+        # then
+        self.assertListEqual(list1=result, list2=expected)
+
+    def test_should_count_up_to_the_limit(self):
+        """
+        Test should stop counting at the limit, and tell if there are more
+
+        :return:
+        :rtype:
+        """
+
+        # when / then
+        self.assertEqual(
+            first=count_with_limit(queryset=self.messages), second=(17, False)
+        )
+        self.assertEqual(
+            first=count_with_limit(queryset=self.messages, limit=17),
+            second=(17, False),
+        )
+        self.assertEqual(
+            first=count_with_limit(queryset=self.messages, limit=10),
+            second=(10, True),
+        )
+
+    def test_should_use_known_count(self):
+        """
+        Test should not count again, when the number of items is known
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        paginator = CountedPaginator(
+            object_list=self.messages.order_by("pk"), per_page=5, count=10
+        )
+
+        # when
+        with self.assertNumQueries(num=1):
+            page = paginator.page(number=2)
+            messages = list(page)
+
+        # then
+        self.assertEqual(first=paginator.num_pages, second=2)
+        self.assertEqual(first=len(messages), second=5)
+        self.assertFalse(page.has_next())
+
+
+class TestHelperUnreadTopics(BaseTestCase):
+    """
+    Testing the cached number of unread topics
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Set up users, a category and a board
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+        cls.user = create_fake_user(
+            character_id=random_id(),
+            character_name="Bruce Wayne",
+            permissions=["aa_forum.basic_access"],
+        )
+        cls.other_user = create_fake_user(
+            character_id=random_id(), character_name="Peter Parker"
+        )
+        cls.category = Category.objects.create(name="Science")
+        cls.board = Board.objects.create(name="Physics", category=cls.category)
+
+    def setUp(self) -> None:
+        """
+        Set up two topics
+
+        :return:
+        :rtype:
+        """
+
+        self.topic_1 = Topic.objects.create(subject="Mysteries", board=self.board)
+        create_fake_messages(topic=self.topic_1, amount=2)
+        self.topic_2 = Topic.objects.create(subject="Theories", board=self.board)
+        create_fake_messages(topic=self.topic_2, amount=2)
+
+    def test_should_return_cached_count(self):
+        """
+        Test should only count once and then return the cached number
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        first_count = get_unread_topics_count(user=self.user)
+
+        # when
+        with self.assertNumQueries(num=0):
+            second_count = get_unread_topics_count(user=self.user)
+
+        # then
+        self.assertEqual(first=first_count, second=2)
+        self.assertEqual(first=second_count, second=2)
+
+    def test_should_recount_after_new_message(self):
+        """
+        Test should recount after a new message has been posted
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        LastMessageSeen.objects.create(
+            topic=self.topic_1,
+            user=self.user,
+            message_time=self.topic_1.last_message.time_posted,
+        )
+        invalidate_unread_topics_count(user=self.user)
+        count_before = get_unread_topics_count(user=self.user)
+
+        # when
+        create_fake_messages(topic=self.topic_1, amount=1)
+
+        # then
+        self.assertEqual(first=count_before, second=1)
+        self.assertEqual(first=get_unread_topics_count(user=self.user), second=2)
+
+    def test_should_recount_after_message_is_deleted(self):
+        """
+        Test should recount after a message has been deleted
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        LastMessageSeen.objects.create(
+            topic=self.topic_1,
+            user=self.user,
+            message_time=self.topic_1.first_message.time_posted,
+        )
+        invalidate_unread_topics_count(user=self.user)
+        count_before = get_unread_topics_count(user=self.user)
+
+        # when
+        self.topic_1.last_message.delete()
+
+        # then
+        self.assertEqual(first=count_before, second=2)
+        self.assertEqual(first=get_unread_topics_count(user=self.user), second=1)
+
+    def test_should_recount_after_user_has_read_a_topic(self):
+        """
+        Test should recount after the user has read a topic
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user)
+        count_before = get_unread_topics_count(user=self.user)
+
+        # when
+        self.client.get(path=self.topic_1.get_absolute_url())
+
+        # then
+        self.assertEqual(first=count_before, second=2)
+        self.assertEqual(first=get_unread_topics_count(user=self.user), second=1)
+
+    def test_should_only_invalidate_the_given_user(self):
+        """
+        Test should only invalidate the cached number of the given user
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        get_unread_topics_count(user=self.user)
+        get_unread_topics_count(user=self.other_user)
+
+        # when
+        invalidate_unread_topics_count(user=self.user)
+
+        # then
+        with self.assertNumQueries(num=0):
+            get_unread_topics_count(user=self.other_user)
+
+        with self.assertNumQueries(num=1):
+            get_unread_topics_count(user=self.user)
+
+    def test_should_read_cached_count_with_one_cache_round_trip(self):
+        """
+        Test should read the cached number with one cache round trip, no
+        matter how many boards there are
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        for num in range(5):
+            Board.objects.create(name=f"Board {num}", category=self.category)
+
+        get_unread_topics_count(user=self.user)
+
+        # when
+        with patch("aa_forum.helper.unread_topics.cache", wraps=cache) as mock_cache:
+            with self.assertNumQueries(num=0):
+                count = get_unread_topics_count(user=self.user)
+
+        # then
+        self.assertEqual(first=count, second=2)
+        self.assertEqual(first=len(mock_cache.method_calls), second=1)
+        self.assertEqual(
+            first=len(mock_cache.get_many.call_args.kwargs["keys"]), second=3
+        )
+
+    def test_should_recount_after_user_joined_a_group(self):
+        """
+        Test should recount after the user joined a group, that has access
+        to another board
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        group = Group.objects.create(name="Secret Society")
+        other_board = Board.objects.create(name="Secrets", category=self.category)
+        other_board.groups.add(group)
+        other_topic = Topic.objects.create(subject="Hidden", board=other_board)
+        create_fake_messages(topic=other_topic, amount=1)
+        count_before = get_unread_topics_count(user=self.user)
+
+        # when
+        self.user.groups.add(group)
+
+        # then
+        self.assertEqual(first=count_before, second=2)
+        self.assertEqual(first=get_unread_topics_count(user=self.user), second=3)
+
+    def test_should_recount_after_new_message_was_committed(self):
+        """
+        Test should recount after the transaction with a new message has been
+        committed, even when a number was cached again in the meantime
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        LastMessageSeen.objects.create(
+            topic=self.topic_1,
+            user=self.user,
+            message_time=self.topic_1.last_message.time_posted,
+        )
+        invalidate_unread_topics_count(user=self.user)
+
+        # when
+        with self.captureOnCommitCallbacks(execute=True):
+            create_fake_messages(topic=self.topic_1, amount=1)
+            count_before_commit = get_unread_topics_count(user=self.user)
+            self.topic_1.refresh_from_db()
+            LastMessageSeen.objects.filter(topic=self.topic_1).update(
+                message_time=self.topic_1.last_message.time_posted
+            )
+
+        # then
+        self.assertEqual(first=count_before_commit, second=2)
+        self.assertEqual(first=get_unread_topics_count(user=self.user), second=1)
+
+    def test_should_recount_for_forum_managers_after_new_message(self):
+        """
+        Test should recount for forum managers, who have access to all boards
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        manager = create_fake_user(
+            character_id=random_id(),
+            character_name="Clark Kent",
+            permissions=["aa_forum.basic_access", "aa_forum.manage_forum"],
+        )
+        count_before = get_unread_topics_count(user=manager)
+
+        # when
+        topic = Topic.objects.create(subject="News", board=self.board)
+        create_fake_messages(topic=topic, amount=1)
+
+        # then
+        self.assertEqual(first=count_before, second=2)
+        self.assertEqual(first=get_unread_topics_count(user=manager), second=3)
+
+    @patch(
+        "aa_forum.helper.unread_topics.AA_FORUM_UNREAD_TOPICS_COUNT_CACHE_TIMEOUT", 5
+    )
+    @patch("aa_forum.helper.unread_topics.cache")
+    def test_should_cache_with_configured_timeout(self, mock_cache):
+        """
+        Test should cache the number with the configured timeout
+
+        :param mock_cache:
+        :type mock_cache:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_cache.get_many.return_value = {}
+
+        # when
+        get_unread_topics_count(user=self.user)
+
+        # then
+        self.assertEqual(first=mock_cache.set.call_args.kwargs["timeout"], second=5)
+
+
+class TestHelperPersonalMessages(BaseTestCase):
+    """
+    Testing the cached number of unread personal messages
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Set up users
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+        cls.user = create_fake_user(
+            character_id=random_id(),
+            character_name="Bruce Wayne",
+            permissions=["aa_forum.basic_access"],
+        )
+        cls.other_user = create_fake_user(
+            character_id=random_id(), character_name="Peter Parker"
+        )
+
+    def setUp(self) -> None:
+        """
+        Set up an unread personal message
+
+        :return:
+        :rtype:
+        """
+
+        self.personal_message = PersonalMessage.objects.create(
+            sender=self.other_user,
+            recipient=self.user,
+            subject="Test",
+            message="<p>Test</p>",
+        )
+
+    def test_should_return_cached_count(self):
+        """
+        Test should only count once and then return the cached number
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        first_count = get_personal_messages_unread_count(user=self.user)
+
+        # when
+        with self.assertNumQueries(num=0):
+            second_count = get_personal_messages_unread_count(user=self.user)
+
+        # then
+        self.assertEqual(first=first_count, second=1)
+        self.assertEqual(first=second_count, second=1)
+
+    def test_should_accept_user_id(self):
+        """
+        Test should accept the ID of a user as well
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        unread_count = get_personal_messages_unread_count(user=self.user.pk)
+
+        # then
+        self.assertEqual(first=unread_count, second=1)
+
+    def test_should_recount_after_new_message(self):
+        """
+        Test should recount after a new personal message has been sent
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        get_personal_messages_unread_count(user=self.user)
+
+        # when
+        PersonalMessage.objects.create(
+            sender=self.other_user,
+            recipient=self.user,
+            subject="Another test",
+            message="<p>Another test</p>",
+        )
+
+        # then
+        self.assertEqual(
+            first=get_personal_messages_unread_count(user=self.user), second=2
+        )
+
+    def test_should_recount_after_message_has_been_read(self):
+        """
+        Test should recount after a personal message has been read
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        get_personal_messages_unread_count(user=self.user)
+
+        # when
+        self.personal_message.is_read = True
+        self.personal_message.save()
+
+        # then
+        self.assertEqual(
+            first=get_personal_messages_unread_count(user=self.user), second=0
+        )
+
+    def test_should_recount_after_message_has_been_deleted(self):
+        """
+        Test should recount after a personal message has been deleted
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        get_personal_messages_unread_count(user=self.user)
+
+        # when
+        self.personal_message.delete()
+
+        # then
+        self.assertEqual(
+            first=get_personal_messages_unread_count(user=self.user), second=0
+        )
+
+    def test_should_only_invalidate_the_recipient(self):
+        """
+        Test should keep the cached number of other users
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        get_personal_messages_unread_count(user=self.other_user)
+
+        # when
+        self.personal_message.delete()
+
+        # then
+        with self.assertNumQueries(num=0):
+            get_personal_messages_unread_count(user=self.other_user)
+
+    def test_should_answer_not_modified_for_unchanged_count(self):
+        """
+        Test should answer with 304 Not Modified when the ETag still matches
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user)
+        url = reverse(viewname="aa_forum:personal_messages_ajax_unread_messages_count")
+        response = self.client.get(path=url)
+
+        # when
+        cached_response = self.client.get(
+            path=url, HTTP_IF_NONE_MATCH=response.headers["ETag"]
+        )
+
+        # then
+        self.assertEqual(first=response.status_code, second=200)
+        self.assertEqual(first=cached_response.status_code, second=304)
+
+    def test_should_answer_with_new_count_after_change(self):
+        """
+        Test should answer with the new number once it has changed
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user)
+        url = reverse(viewname="aa_forum:personal_messages_ajax_unread_messages_count")
+        response = self.client.get(path=url)
+        self.personal_message.is_read = True
+        self.personal_message.save()
+
+        # when
+        new_response = self.client.get(
+            path=url, HTTP_IF_NONE_MATCH=response.headers["ETag"]
+        )
+
+        # then
+        self.assertEqual(first=new_response.status_code, second=200)
+        self.assertNotEqual(
+            first=new_response.headers["ETag"], second=response.headers["ETag"]
+        )
+
+
+@patch("aa_forum.helper.personal_messages.send_personal_message_notifications.delay")
+class TestHelperPersonalMessageNotifications(BaseTestCase):
+    """
+    Testing the queued Discord DMs about new personal messages
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Set up users
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+        cls.user = create_fake_user(
+            character_id=random_id(), character_name="Bruce Wayne"
+        )
+        cls.other_user = create_fake_user(
+            character_id=random_id(), character_name="Peter Parker"
+        )
+
+    def test_should_queue_dm_on_commit(self, mock_delay):
+        """
+        Test should only queue the DM once the transaction has been committed
+
+        :param mock_delay:
+        :type mock_delay:
+        :return:
+        :rtype:
+        """
+
+        # when
+        with self.captureOnCommitCallbacks(execute=True):
+            personal_message = PersonalMessage.objects.create(
+                sender=self.other_user,
+                recipient=self.user,
+                subject="Test",
+                message="<p>Test</p>",
+            )
+
+            self.assertFalse(mock_delay.called)
+
+        # then
+        mock_delay.assert_called_once_with(message_ids=[personal_message.pk])
+
+    def test_should_queue_one_task_per_transaction(self, mock_delay):
+        """
+        Test should send all DMs of a transaction with a single task
+
+        :param mock_delay:
+        :type mock_delay:
+        :return:
+        :rtype:
+        """
+
+        # when
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                personal_messages = [
+                    PersonalMessage.objects.create(
+                        sender=self.other_user,
+                        recipient=recipient,
+                        subject="Announcement",
+                        message="<p>Fleet at 20:00</p>",
+                    )
+                    for recipient in (self.user, self.other_user, self.user)
+                ]
+
+        # then
+        mock_delay.assert_called_once_with(
+            message_ids=[personal_message.pk for personal_message in personal_messages]
+        )
+
+    def test_should_not_send_dms_of_rolled_back_savepoint(self, mock_delay):
+        """
+        Test should only send the DMs of messages that have been committed,
+        when some of them have been rolled back
+
+        :param mock_delay:
+        :type mock_delay:
+        :return:
+        :rtype:
+        """
+
+        # when
+        with self.captureOnCommitCallbacks(execute=True):
+            personal_message = PersonalMessage.objects.create(
+                sender=self.other_user,
+                recipient=self.user,
+                subject="Kept",
+                message="<p>Kept</p>",
+            )
+
+            try:
+                with transaction.atomic():
+                    PersonalMessage.objects.create(
+                        sender=self.other_user,
+                        recipient=self.user,
+                        subject="Rolled back",
+                        message="<p>Rolled back</p>",
+                    )
+
+                    raise RuntimeError("Rollback")
+            except RuntimeError:
+                pass
+
+        # then
+        self.assertEqual(first=mock_delay.call_count, second=1)
+        self.assertQuerySetEqual(
+            qs=PersonalMessage.objects.filter(
+                pk__in=mock_delay.call_args.kwargs["message_ids"]
+            ),
+            values=[personal_message],
+        )
+
+    def test_should_drop_batch_of_rolled_back_transaction(self, mock_delay):
+        """
+        Test should not send the DMs of a rolled back transaction with the
+        next batch
+
+        :param mock_delay:
+        :type mock_delay:
+        :return:
+        :rtype:
+        """
+
+        # given
+        try:
+            with transaction.atomic():
+                PersonalMessage.objects.create(
+                    sender=self.other_user,
+                    recipient=self.user,
+                    subject="Rolled back",
+                    message="<p>Rolled back</p>",
+                )
+
+                raise RuntimeError("Rollback")
+        except RuntimeError:
+            pass
+
+        # when
+        with self.captureOnCommitCallbacks(execute=True):
+            personal_message = PersonalMessage.objects.create(
+                sender=self.other_user,
+                recipient=self.user,
+                subject="Next",
+                message="<p>Next</p>",
+            )
+
+        # then
+        mock_delay.assert_called_once_with(message_ids=[personal_message.pk])
+
+    def test_should_start_new_batch_after_commit(self, mock_delay):
+        """
+        Test should not add DMs to the batch of a committed transaction
+
+        :param mock_delay:
+        :type mock_delay:
+        :return:
+        :rtype:
+        """
+
+        # when
+        for subject in ("First", "Second"):
+            with self.captureOnCommitCallbacks(execute=True):
+                PersonalMessage.objects.create(
+                    sender=self.other_user,
+                    recipient=self.user,
+                    subject=subject,
+                    message="<p>Test</p>",
+                )
+
+        # then
+        self.assertEqual(first=mock_delay.call_count, second=2)
+        self.assertEqual(
+            first=[
+                len(call.kwargs["message_ids"]) for call in mock_delay.call_args_list
+            ],
+            second=[1, 1],
+        )
+
+    def test_should_not_queue_dm_for_changed_message(self, mock_delay):
+        """
+        Test should not send a DM again when a message is changed
+
+        :param mock_delay:
+        :type mock_delay:
+        :return:
+        :rtype:
+        """
+
+        # given
+        with self.captureOnCommitCallbacks(execute=True):
+            personal_message = PersonalMessage.objects.create(
+                sender=self.other_user,
+                recipient=self.user,
+                subject="Test",
+                message="<p>Test</p>",
+            )
+
+        mock_delay.reset_mock()
+
+        # when
+        with self.captureOnCommitCallbacks(execute=True):
+            personal_message.is_read = True
+            personal_message.save()
+
+        # then
+        self.assertFalse(mock_delay.called)
+
 
 class TestHelperEveImages(BaseTestCase):
     """
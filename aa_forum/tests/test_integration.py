@@ -27,6 +27,7 @@ from aa_forum.models import (
     Topic,
     UserProfile,
 )
+from aa_forum.tests import ClearCacheMixin
 from aa_forum.tests.utils import (
     create_fake_message,
     create_fake_messages,
@@ -37,7 +38,7 @@ from aa_forum.tests.utils import (
 fake = Faker()
 
 
-class TestForumUI(WebTest):
+class TestForumUI(ClearCacheMixin, WebTest):
     """
     Tests for the Forum UI
     """
@@ -1203,19 +1204,11 @@ class TestForumUI(WebTest):
         )
         self.assertContains(
             response=response,
-            text=reverse(
-                viewname="aa_forum:forum_message",
-                args=[
-                    message.topic.board.category.slug,
-                    message.topic.board.slug,
-                    message.topic.slug,
-                    message.pk,
-                ],
-            ),
+            text=message.get_absolute_url(),
         )
 
 
-class TestAdminCategoriesAndBoardsUI(WebTest):
+class TestAdminCategoriesAndBoardsUI(ClearCacheMixin, WebTest):
     """
     Tests for the Admin UI
     """
@@ -1401,7 +1394,7 @@ class TestAdminCategoriesAndBoardsUI(WebTest):
         self.assertEqual(first=board.name, second="Dummy")
 
 
-class TestProfileUI(WebTest):
+class TestProfileUI(ClearCacheMixin, WebTest):
     """
     Tests for the Profile UI
     """
@@ -1765,7 +1758,7 @@ class TestProfileUI(WebTest):
         self.assertFalse(expr=user_profile_updated.discord_dm_on_new_personal_message)
 
 
-class TestAdminForumSettingsUI(WebTest):
+class TestAdminForumSettingsUI(ClearCacheMixin, WebTest):
     """
     Tests for the Settings UI
     """
@@ -1940,7 +1933,9 @@ class TestAdminForumSettingsUI(WebTest):
         self.assertEqual(first=str(forum_settings), second="Forum settings")
 
 
-class TestPersonalMessageUI(WebTest):  # pylint: disable=too-many-public-methods
+class TestPersonalMessageUI(
+    ClearCacheMixin, WebTest
+):  # pylint: disable=too-many-public-methods
     """
     Tests for the Personal Message UI
     """
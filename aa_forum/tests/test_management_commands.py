@@ -0,0 +1,326 @@
+"""
+Tests for the management commands
+"""
+
+# Standard Library
+import datetime as dt
+from io import StringIO
+from unittest.mock import patch
+
+# Django
+from django.core.management import CommandError, call_command
+
+# AA Forum
+from aa_forum.models import Board, Message, SearchIndexEntry, Topic
+from aa_forum.tests import BaseTestCase
+from aa_forum.tests.utils import (
+    create_board,
+    create_category,
+    create_fake_messages,
+    create_fake_user,
+    create_topic,
+    random_id,
+)
+
+
+class TestRebuildCounters(BaseTestCase):
+    """
+    Tests for the aa_forum_rebuild_counters command
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Setup
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+
+        cls.user = create_fake_user(
+            character_id=random_id(), character_name="Bruce Wayne"
+        )
+
+    def setUp(self) -> None:
+        """
+        Setup
+
+        :return:
+        :rtype:
+        """
+
+        category = create_category(name="Science")
+
+        self.board = create_board(category=category, name="Physics")
+        self.child_board = create_board(category=category, parent_board=self.board)
+        self.topic_1 = create_topic(subject="Mysteries", board=self.board)
+        create_fake_messages(topic=self.topic_1, amount=3)
+        self.topic_2 = create_topic(subject="Theories", board=self.child_board)
+        create_fake_messages(topic=self.topic_2, amount=2)
+
+    def test_should_rebuild_counters(self):
+        """
+        Test should rebuild the counters from the actual data
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        Topic.objects.update(message_count=0)
+        Board.objects.update(topic_count=42, message_count=0)
+        Message.objects.update(ordinal=0)
+        out = StringIO()
+
+        # when
+        call_command("aa_forum_rebuild_counters", stdout=out)
+
+        # then
+        self.topic_1.refresh_from_db()
+        self.topic_2.refresh_from_db()
+        self.board.refresh_from_db()
+        self.child_board.refresh_from_db()
+        self.assertEqual(first=self.topic_1.message_count, second=3)
+        self.assertEqual(first=self.topic_2.message_count, second=2)
+        self.assertEqual(first=self.board.topic_count, second=2)
+        self.assertEqual(first=self.board.message_count, second=5)
+        self.assertEqual(first=self.child_board.topic_count, second=1)
+        self.assertEqual(first=self.child_board.message_count, second=2)
+        self.assertListEqual(
+            list1=list(
+                self.topic_1.messages.order_by("time_posted").values_list(
+                    "ordinal", flat=True
+                )
+            ),
+            list2=[1, 2, 3],
+        )
+        self.assertIn(member="All counters are correct.", container=out.getvalue())
+
+    def test_should_verify_maintained_counters(self):
+        """
+        Test should find the counters maintained by the models to be correct
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.topic_1.messages.first().delete()
+        self.topic_2.delete()
+        out = StringIO()
+
+        # when
+        call_command("aa_forum_rebuild_counters", "--check", stdout=out)
+
+        # then
+        self.assertIn(member="All counters are correct.", container=out.getvalue())
+
+    def test_should_verify_ordinals_of_backdated_messages(self):
+        """
+        Test should find the ordinals of messages posted before the existing
+        messages of their topic to be correct, and keep them on rebuild
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        first_message = self.topic_1.messages.earliest("time_posted")
+        my_now = first_message.time_posted - dt.timedelta(hours=1)
+
+        with patch("django.utils.timezone.now", lambda: my_now):
+            backdated_message = Message.objects.create(
+                topic=self.topic_1, message="<p>Dark matter</p>", user_created=self.user
+            )
+
+        out = StringIO()
+
+        # when
+        call_command("aa_forum_rebuild_counters", "--check", stdout=out)
+        call_command("aa_forum_rebuild_counters", stdout=out)
+
+        # then
+        backdated_message.refresh_from_db()
+        self.assertEqual(first=backdated_message.ordinal, second=1)
+        self.assertListEqual(
+            list1=list(
+                self.topic_1.messages.order_by("time_posted").values_list(
+                    "ordinal", flat=True
+                )
+            ),
+            list2=[1, 2, 3, 4],
+        )
+        self.assertIn(member="All counters are correct.", container=out.getvalue())
+
+    def test_should_report_wrong_counters_on_check_without_changing_them(self):
+        """
+        Test should report wrong counters and leave them alone with --check
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        Topic.objects.filter(pk=self.topic_2.pk).update(message_count=7)
+
+        # when
+        with self.assertRaisesMessage(
+            expected_exception=CommandError,
+            expected_message=(
+                "Counters are out of sync for 0 board(s), 1 topic(s) and "
+                "0 message(s)."
+            ),
+        ):
+            call_command("aa_forum_rebuild_counters", "--check", stdout=StringIO())
+
+        # then
+        self.topic_2.refresh_from_db()
+        self.assertEqual(first=self.topic_2.message_count, second=7)
+
+
+class TestBuildSearchIndex(BaseTestCase):
+    """
+    Tests for the aa_forum_build_search_index command
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Setup
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+
+        cls.user = create_fake_user(
+            character_id=random_id(), character_name="Bruce Wayne"
+        )
+
+    def setUp(self) -> None:
+        """
+        Setup
+
+        :return:
+        :rtype:
+        """
+
+        category = create_category(name="Science")
+        board = create_board(category=category, name="Physics")
+        topic = create_topic(subject="Mysteries", board=board)
+
+        # Fake sentences may consist of stopwords only, which aren't indexed
+        self.messages = [
+            Message.objects.create(
+                topic=topic, user_created=self.user, message=f"<p>{text}</p>"
+            )
+            for text in (
+                "Dark matter",
+                "Black holes",
+                "Neutron stars",
+                "Gravitational waves",
+                "Cosmic rays",
+            )
+        ]
+
+    @patch("aa_forum.search.index.AA_FORUM_SEARCH_BACKEND", "index")
+    def test_should_build_index_in_batches(self):
+        """
+        Test should index all messages in batches
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        SearchIndexEntry.objects.all().delete()
+        out = StringIO()
+
+        # when
+        call_command("aa_forum_build_search_index", "--batch-size=2", stdout=out)
+
+        # then
+        self.assertSetEqual(
+            set1=set(SearchIndexEntry.objects.values_list("message", flat=True)),
+            set2={message.pk for message in self.messages},
+        )
+        self.assertIn(member="Indexed 4 of 5 messages.", container=out.getvalue())
+        self.assertNotIn(member="AA_FORUM_SEARCH_BACKEND", container=out.getvalue())
+
+    def test_should_warn_when_index_is_not_in_use(self):
+        """
+        Test should warn that the index will not be maintained
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        out = StringIO()
+
+        # when
+        call_command("aa_forum_build_search_index", stdout=out)
+
+        # then
+        self.assertIn(member="AA_FORUM_SEARCH_BACKEND", container=out.getvalue())
+
+
+class TestUpdateDiscordExcerpts(BaseTestCase):
+    """
+    Tests for the aa_forum_update_discord_excerpts command
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Setup
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+
+        cls.user = create_fake_user(
+            character_id=random_id(), character_name="Bruce Wayne"
+        )
+
+    def test_should_update_excerpts_in_batches(self):
+        """
+        Test should compute the excerpt and the first image URL of all messages
+        in batches
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        category = create_category(name="Science")
+        board = create_board(category=category, name="Physics")
+        topic = create_topic(subject="Mysteries", board=board)
+        create_fake_messages(topic=topic, amount=4)
+        message = Message.objects.create(
+            topic=topic,
+            user_created=self.user,
+            message='<p>Dark matter</p><img src="/media/galaxy.png">',
+        )
+        Message.objects.update(discord_excerpt="", first_image_url="")
+        out = StringIO()
+
+        # when
+        call_command("aa_forum_update_discord_excerpts", "--batch-size=2", stdout=out)
+
+        # then
+        message.refresh_from_db()
+        self.assertEqual(first=message.discord_excerpt, second="Dark matter")
+        self.assertEqual(first=message.first_image_url, second="/media/galaxy.png")
+        self.assertFalse(
+            Message.objects.filter(discord_excerpt="").exists(),
+        )
+        self.assertIn(member="Updated 4 of 5 messages.", container=out.getvalue())
+        self.assertIn(
+            member="The Discord excerpts have been updated.", container=out.getvalue()
+        )
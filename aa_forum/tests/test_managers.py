@@ -2,13 +2,29 @@
 Test managers
 """
 
+# Django
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
 # Alliance Auth
 from allianceauth.groupmanagement.models import Group
 
 # AA Forum
-from aa_forum.models import Board, Category, Topic
+from aa_forum.models import (
+    Board,
+    BoardReadWatermark,
+    Category,
+    LastMessageSeen,
+    Message,
+    Topic,
+)
 from aa_forum.tests import BaseTestCase
-from aa_forum.tests.utils import create_fake_message, create_fake_user, random_id
+from aa_forum.tests.utils import (
+    create_fake_message,
+    create_fake_messages,
+    create_fake_user,
+    random_id,
+)
 
 
 class TestBoard(BaseTestCase):
@@ -95,6 +111,158 @@ class TestBoard(BaseTestCase):
         # then
         self.assertNotIn(member=board, container=result)
 
+    def test_should_cache_the_visible_boards(self):
+        """
+        Test should cache the visible boards
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        board = Board.objects.create(name="Physics", category=self.category)
+        board.groups.add(self.group)
+        self.user.groups.add(self.group)
+        list(Board.objects.user_has_access(user=self.user))
+
+        # when
+        with self.assertNumQueries(1):
+            result = list(Board.objects.user_has_access(user=self.user))
+
+        # then
+        self.assertIn(member=board, container=result)
+
+    def test_should_share_the_visible_boards_between_users_with_the_same_groups(
+        self,
+    ):
+        """
+        Test should share the visible boards between users with the same groups
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        board = Board.objects.create(name="Physics", category=self.category)
+        board.groups.add(self.group)
+        self.user.groups.add(self.group)
+        other_user = create_fake_user(
+            character_id=random_id(), character_name="Clark Kent"
+        )
+        other_user.groups.add(self.group)
+        list(Board.objects.user_has_access(user=self.user))
+        other_user.has_perm(perm="aa_forum.manage_forum")
+
+        # when
+        # One query for the groups of the user and one for the boards
+        with self.assertNumQueries(2):
+            result = list(Board.objects.user_has_access(user=other_user))
+
+        # then
+        self.assertIn(member=board, container=result)
+
+    def test_should_not_return_board_after_user_left_the_group(self):
+        """
+        Test should not return board after the user left the group
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        board = Board.objects.create(name="Physics", category=self.category)
+        board.groups.add(self.group)
+        self.user.groups.add(self.group)
+        list(Board.objects.user_has_access(user=self.user))
+
+        # when
+        self.user.groups.remove(self.group)
+        result = Board.objects.user_has_access(user=self.user)
+
+        # then
+        self.assertNotIn(member=board, container=result)
+
+    def test_should_not_return_board_after_user_was_removed_from_the_group(self):
+        """
+        Test should not return board after the user was removed from the group
+        from the group's side
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        board = Board.objects.create(name="Physics", category=self.category)
+        board.groups.add(self.group)
+        self.user.groups.add(self.group)
+        list(Board.objects.user_has_access(user=self.user))
+
+        # when
+        self.group.user_set.remove(self.user)
+        result = Board.objects.user_has_access(user=self.user)
+
+        # then
+        self.assertNotIn(member=board, container=result)
+
+    def test_should_not_return_board_after_its_groups_changed(self):
+        """
+        Test should not return board after its groups changed
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        board = Board.objects.create(name="Physics", category=self.category)
+        self.user.groups.add(self.group)
+        list(Board.objects.user_has_access(user=self.user))
+        other_group = Group.objects.create(name="Villain")
+
+        # when
+        board.groups.add(other_group)
+        result = Board.objects.user_has_access(user=self.user)
+
+        # then
+        self.assertNotIn(member=board, container=result)
+
+    def test_should_return_new_board(self):
+        """
+        Test should return a board created after the visible boards were cached
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        list(Board.objects.user_has_access(user=self.user))
+
+        # when
+        board = Board.objects.create(name="Physics", category=self.category)
+        result = Board.objects.user_has_access(user=self.user)
+
+        # then
+        self.assertIn(member=board, container=result)
+
+    def test_should_filter_without_distinct(self):
+        """
+        Test should filter by the visible boards without DISTINCT
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        board = Board.objects.create(name="Physics", category=self.category)
+        board.groups.add(self.group)
+        self.user.groups.add(self.group)
+
+        # when
+        result = Board.objects.user_has_access(user=self.user)
+
+        # then
+        self.assertNotIn(member="DISTINCT", container=str(result.query))
+        self.assertNotIn(member="aa_forum_board_groups", container=str(result.query))
+
 
 class TestTopic(BaseTestCase):
     """
@@ -290,3 +458,369 @@ class TestTopic(BaseTestCase):
 
         # then
         self.assertIsNone(obj=result)
+
+    def test_should_return_topic_with_one_query_without_distinct(self):
+        """
+        Test should return a topic with a single query and without DISTINCT,
+        once the visible boards of the user are cached
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        topic = Topic.objects.create(subject="Mysteries", board=self.board)
+        self.board.groups.add(self.group)
+        self.user.groups.add(self.group)
+        create_fake_message(topic=topic, user=self.user)
+        list(Board.objects.user_has_access(user=self.user))
+
+        # when
+        with CaptureQueriesContext(connection=connection) as queries:
+            result = Topic.objects.get_from_slugs(
+                category_slug=self.category.slug,
+                board_slug=self.board.slug,
+                topic_slug=topic.slug,
+                user=self.user,
+            )
+
+        # then
+        self.assertEqual(first=result, second=topic)
+        self.assertEqual(first=len(queries), second=1)
+        self.assertNotIn(member="DISTINCT", container=queries[0]["sql"])
+
+
+class TestTopicUnreadState(BaseTestCase):
+    """
+    Tests for the unread state of topics
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Set up categories
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+        cls.category = Category.objects.create(name="Science")
+
+    def setUp(self) -> None:
+        """
+        Set up user, boards and topics
+
+        :return:
+        :rtype:
+        """
+
+        self.user = create_fake_user(
+            character_id=random_id(), character_name="Bruce Wayne"
+        )
+        self.board_1 = Board.objects.create(name="Physics", category=self.category)
+        self.board_2 = Board.objects.create(name="Math", category=self.category)
+        self.topic_1 = Topic.objects.create(subject="Mysteries", board=self.board_1)
+        self.messages_1 = create_fake_messages(topic=self.topic_1, amount=3)
+        self.topic_2 = Topic.objects.create(subject="Theories", board=self.board_1)
+        self.messages_2 = create_fake_messages(topic=self.topic_2, amount=2)
+        self.topic_3 = Topic.objects.create(subject="Primes", board=self.board_2)
+        self.messages_3 = create_fake_messages(topic=self.topic_3, amount=2)
+
+    def test_should_return_all_topics_as_unread_for_new_user(self):
+        """
+        Test should return all topics as unread for a user who hasn't read anything
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        with self.assertNumQueries(num=1):
+            result = Topic.objects.unread_count_per_board(user=self.user)
+
+        # then
+        self.assertDictEqual(d1=result, d2={self.board_1.pk: 2, self.board_2.pk: 1})
+
+    def test_should_use_last_message_seen_per_topic(self):
+        """
+        Test should treat topics as read when their last message has been seen
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        LastMessageSeen.objects.create(
+            topic=self.topic_1,
+            user=self.user,
+            message_time=self.messages_1[-1].time_posted,
+        )
+        LastMessageSeen.objects.create(
+            topic=self.topic_3,
+            user=self.user,
+            message_time=self.messages_3[0].time_posted,
+        )
+
+        # when
+        result = Topic.objects.unread(user=self.user)
+
+        # then
+        self.assertQuerySetEqual(
+            qs=result, values=[self.topic_2, self.topic_3], ordered=False
+        )
+
+    def test_should_use_board_read_watermark(self):
+        """
+        Test should treat topics as read when their last message is not newer
+        than the read watermark of the board
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        BoardReadWatermark.objects.create(
+            board=self.board_1,
+            user=self.user,
+            read_until=self.messages_2[-1].time_posted,
+        )
+
+        # when
+        result = Topic.objects.unread_count_per_board(user=self.user)
+
+        # then
+        self.assertDictEqual(d1=result, d2={self.board_2.pk: 1})
+
+    def test_should_return_topic_as_unread_after_new_message_behind_watermark(
+        self,
+    ):
+        """
+        Test should return a topic as unread when a new message was posted
+        after the read watermark, until the topic has been read
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        BoardReadWatermark.objects.create(
+            board=self.board_1,
+            user=self.user,
+            read_until=self.messages_2[-1].time_posted,
+        )
+        new_message = create_fake_messages(topic=self.topic_1, amount=1)[0]
+
+        # when
+        result_before_read = list(Topic.objects.unread(user=self.user))
+        LastMessageSeen.objects.create(
+            topic=self.topic_1, user=self.user, message_time=new_message.time_posted
+        )
+        result_after_read = list(Topic.objects.unread(user=self.user))
+
+        # then
+        self.assertListEqual(
+            list1=sorted(result_before_read, key=lambda topic: topic.pk),
+            list2=[self.topic_1, self.topic_3],
+        )
+        self.assertListEqual(list1=result_after_read, list2=[self.topic_3])
+
+    def test_should_keep_topic_read_after_last_message_is_deleted(self):
+        """
+        Test should keep a topic read when its last message is deleted
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        LastMessageSeen.objects.create(
+            topic=self.topic_1,
+            user=self.user,
+            message_time=self.messages_1[-1].time_posted,
+        )
+
+        # when
+        self.messages_1[-1].delete()
+
+        # then
+        self.assertNotIn(
+            member=self.topic_1, container=Topic.objects.unread(user=self.user)
+        )
+
+    def test_should_annotate_unread_state(self):
+        """
+        Test should annotate the unread state
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        BoardReadWatermark.objects.create(
+            board=self.board_1,
+            user=self.user,
+            read_until=self.messages_1[-1].time_posted,
+        )
+
+        # when
+        result = {
+            topic.pk: bool(topic.has_unread_messages)
+            for topic in Topic.objects.annotate_unread_state(user=self.user)
+        }
+
+        # then
+        self.assertDictEqual(
+            d1=result,
+            d2={self.topic_1.pk: False, self.topic_2.pk: True, self.topic_3.pk: True},
+        )
+
+    def test_should_not_use_read_markers_of_other_users(self):
+        """
+        Test should not use the read markers of other users
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        other_user = create_fake_user(
+            character_id=random_id(), character_name="Peter Parker"
+        )
+        BoardReadWatermark.objects.create(
+            board=self.board_1,
+            user=other_user,
+            read_until=self.messages_2[-1].time_posted,
+        )
+        LastMessageSeen.objects.create(
+            topic=self.topic_3,
+            user=other_user,
+            message_time=self.messages_3[-1].time_posted,
+        )
+
+        # when
+        result = Topic.objects.unread_count_per_board(user=self.user)
+
+        # then
+        self.assertDictEqual(d1=result, d2={self.board_1.pk: 2, self.board_2.pk: 1})
+
+
+class TestMessage(BaseTestCase):
+    """
+    Tests for message manager
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Set up category and board
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+        cls.category = Category.objects.create(name="Science")
+        cls.board = Board.objects.create(name="Physics", category=cls.category)
+
+    def setUp(self) -> None:
+        """
+        Set up user and topic
+
+        :return:
+        :rtype:
+        """
+
+        self.user = create_fake_user(
+            character_id=random_id(), character_name="Bruce Wayne"
+        )
+        self.topic = Topic.objects.create(subject="Mysteries", board=self.board)
+
+    def test_should_return_messages_for_topic_in_posting_order(self):
+        """
+        Test should return the messages of a topic in the order they were posted
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        other_topic = Topic.objects.create(subject="Secrets", board=self.board)
+        messages = create_fake_messages(topic=self.topic, amount=3)
+        create_fake_messages(topic=other_topic, amount=2)
+
+        # when
+        result = Message.objects.get_messages_for_topic(topic=self.topic)
+
+        # then
+        self.assertListEqual(list1=list(result), list2=messages)
+
+    def test_should_only_fetch_the_sliced_messages(self):
+        """
+        Test should only fetch the messages of the requested slice
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        messages = create_fake_messages(topic=self.topic, amount=6)
+
+        # when
+        with self.assertNumQueries(num=1):
+            result = list(Message.objects.get_messages_for_topic(topic=self.topic)[2:4])
+
+        # then
+        self.assertListEqual(list1=result, list2=messages[2:4])
+
+    def test_should_fetch_the_topic_along_with_the_messages(self):
+        """
+        Test should fetch the topic, board and category along with the messages,
+        so linking to them needs no further queries
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        create_fake_messages(topic=self.topic, amount=3)
+
+        # when
+        with self.assertNumQueries(num=1):
+            result = [
+                message.topic.board.category.slug
+                for message in Message.objects.get_messages_for_topic(topic=self.topic)
+            ]
+
+        # then
+        self.assertListEqual(list1=result, list2=[self.category.slug] * 3)
+
+    def test_should_return_message_from_slugs_with_one_query_without_distinct(
+        self,
+    ):
+        """
+        Test should return a message with a single query and without DISTINCT,
+        once the visible boards of the user are cached
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        message = create_fake_message(topic=self.topic, user=self.user)
+        list(Board.objects.user_has_access(user=self.user))
+
+        # when
+        with CaptureQueriesContext(connection=connection) as queries:
+            result = Message.objects.get_from_slugs(
+                category_slug=self.category.slug,
+                board_slug=self.board.slug,
+                topic_slug=self.topic.slug,
+                message_id=message.pk,
+                user=self.user,
+            )
+
+        # then
+        self.assertEqual(first=result, second=message)
+        self.assertEqual(first=len(queries), second=1)
+        self.assertNotIn(member="DISTINCT", container=queries[0]["sql"])
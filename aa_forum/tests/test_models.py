@@ -8,7 +8,9 @@ from unittest.mock import patch
 
 # Django
 from django.contrib.contenttypes.models import ContentType
+from django.db import connection
 from django.db.utils import IntegrityError
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils.timezone import now
 
@@ -17,8 +19,10 @@ from allianceauth.authentication.models import Permission, User
 from allianceauth.groupmanagement.models import Group
 
 # AA Forum
+from aa_forum.managers import _setting_values_local_cache
 from aa_forum.models import (
     Board,
+    Message,
     Setting,
     Topic,
     _users_with_permission,
@@ -713,6 +717,37 @@ class TestMessage(BaseTestCase):
         # then
         self.assertEqual(first=str(message), second=str(message.pk))
 
+    def test_should_store_discord_excerpt_and_first_image_url(self):
+        """
+        Test should compute the Discord excerpt and the first image URL when saving
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        message = create_message(
+            topic=self.topic,
+            user_created=self.user,
+            message='<p>Dark <i>matter</i></p><img src="https://test.de/foo.jpg">',
+        )
+
+        # then
+        message.refresh_from_db()
+        self.assertEqual(first=message.discord_excerpt, second="Dark matter")
+        self.assertEqual(
+            first=message.first_image_url, second="https://test.de/foo.jpg"
+        )
+
+        # when
+        message.message = "<p>No images</p>"
+        message.save()
+
+        # then
+        message.refresh_from_db()
+        self.assertEqual(first=message.discord_excerpt, second="No images")
+        self.assertEqual(first=message.first_image_url, second="")
+
     def test_should_update_first_and_last_messages_when_saving_1(self):
         """
         Test should update the first and last message when saving
@@ -954,6 +989,144 @@ class TestMessage(BaseTestCase):
         self.assertIsNone(obj=self.board.last_message)
         self.assertIsNone(obj=self.board.first_message)
 
+    def test_should_update_message_references_for_new_reply(self):
+        """
+        Test should make a new reply the last message of its topic, its board
+        and the parent board
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        create_message(topic=self.topic, user_created=self.user)
+        child_message = create_message(topic=self.child_topic, user_created=self.user)
+
+        # when
+        reply = create_message(topic=self.child_topic, user_created=self.user)
+
+        # then
+        for obj in (self.child_topic, self.child_board, self.board):
+            obj.refresh_from_db()
+            self.assertEqual(first=obj.first_message, second=child_message)
+            self.assertEqual(first=obj.last_message, second=reply)
+
+    def test_should_not_replace_newer_last_message(self):
+        """
+        Test should not replace a last message that is newer than a new reply,
+        e.g. one posted at the same time in another transaction
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        newer_message = create_message(topic=self.child_topic, user_created=self.user)
+        Message.objects.filter(pk=newer_message.pk).update(
+            time_posted=now() + dt.timedelta(minutes=5)
+        )
+
+        # when
+        create_message(topic=self.child_topic, user_created=self.user)
+
+        # then
+        for obj in (self.child_topic, self.child_board, self.board):
+            obj.refresh_from_db()
+            self.assertEqual(first=obj.first_message, second=newer_message)
+            self.assertEqual(first=obj.last_message, second=newer_message)
+            self.assertEqual(first=obj.message_count, second=2)
+
+    def test_should_keep_message_references_when_editing_message(self):
+        """
+        Test should keep the first and last message when an older message is edited
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        message = create_message(topic=self.topic, user_created=self.user)
+        reply = create_message(topic=self.topic, user_created=self.user)
+
+        # when
+        message.message = "<p>Edited</p>"
+        message.save()
+
+        # then
+        for obj in (self.topic, self.board):
+            obj.refresh_from_db()
+            self.assertEqual(first=obj.first_message, second=message)
+            self.assertEqual(first=obj.last_message, second=reply)
+
+    def test_should_not_overwrite_message_references_with_outdated_board(self):
+        """
+        Test should not overwrite the first and last message when a board that
+        was loaded before a message was posted is saved
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        board = Board.objects.get(pk=self.board.pk)
+        message = create_message(topic=self.topic, user_created=self.user)
+
+        # when
+        board.name = "Astronomy"
+        board.save()
+
+        # then
+        board.refresh_from_db()
+        self.assertEqual(first=board.first_message, second=message)
+        self.assertEqual(first=board.last_message, second=message)
+
+    def test_should_post_reply_with_one_update_per_level(self):
+        """
+        Test should post a reply with one UPDATE of the topic and one of both
+        boards, no matter how many messages the topic has
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        create_message(topic=self.child_topic, user_created=self.user)
+
+        with CaptureQueriesContext(connection=connection) as first_reply:
+            create_message(topic=self.child_topic, user_created=self.user)
+
+        for _ in range(5):
+            create_message(topic=self.child_topic, user_created=self.user)
+
+        # when
+        with CaptureQueriesContext(connection=connection) as later_reply:
+            create_message(topic=self.child_topic, user_created=self.user)
+
+        # then
+        statements = [query["sql"] for query in later_reply.captured_queries]
+        self.assertEqual(first=len(later_reply), second=len(first_reply))
+        self.assertEqual(
+            first=sum(
+                statement.startswith('UPDATE "aa_forum_topic"')
+                for statement in statements
+            ),
+            second=1,
+        )
+        self.assertEqual(
+            first=sum(
+                statement.startswith('UPDATE "aa_forum_board"')
+                for statement in statements
+            ),
+            second=1,
+        )
+        # The topic isn't fetched again to find out what has changed
+        self.assertFalse(
+            any(
+                statement.startswith('SELECT "aa_forum_topic"."id"')
+                for statement in statements
+            )
+        )
+
     def test_should_return_url_first_page(self):
         """
         Test should return URL to the first page
@@ -1008,6 +1181,108 @@ class TestMessage(BaseTestCase):
             + f"#message-{message.pk}",
         )
 
+    def test_should_number_messages_in_topic(self):
+        """
+        Test should number the messages of a topic on save, and renumber the
+        following ones on delete
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        messages = create_fake_messages(topic=self.topic, amount=4)
+        other_topic = create_topic(board=self.board)
+        other_message = create_message(topic=other_topic, user_created=self.user)
+
+        # when
+        messages[1].delete()
+
+        # then
+        self.assertListEqual(
+            list1=list(
+                self.topic.messages.order_by("time_posted").values_list("pk", "ordinal")
+            ),
+            list2=[(messages[0].pk, 1), (messages[2].pk, 2), (messages[3].pk, 3)],
+        )
+        self.assertEqual(first=other_message.ordinal, second=1)
+
+    def test_should_number_backdated_message_by_time_posted(self):
+        """
+        Test should number a message posted before the existing messages of its
+        topic by its time, and move the later ones up
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        messages = create_fake_messages(topic=self.topic, amount=2)
+        my_now = messages[0].time_posted - dt.timedelta(hours=1)
+
+        # when
+        with patch("django.utils.timezone.now", lambda: my_now):
+            backdated_message = create_message(topic=self.topic, user_created=self.user)
+
+        # then
+        self.assertListEqual(
+            list1=list(
+                self.topic.messages.order_by("time_posted").values_list("pk", "ordinal")
+            ),
+            list2=[
+                (backdated_message.pk, 1),
+                (messages[0].pk, 2),
+                (messages[1].pk, 3),
+            ],
+        )
+        self.assertEqual(first=backdated_message.ordinal, second=1)
+
+    def test_should_return_url_without_queries(self):
+        """
+        Test should calculate the URL without counting the earlier messages
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        create_fake_messages(topic=self.topic, amount=9)
+        message = (
+            Message.objects.select_related("topic__board__category")
+            .filter(topic=self.topic)
+            .order_by("time_posted")
+            .last()
+        )
+
+        # when
+        with self.assertNumQueries(num=0):
+            url = message.get_absolute_url()
+
+        # then
+        self.assertIn(member="/2/#message-", container=url)
+
+    def test_should_return_permalinks_with_one_query(self):
+        """
+        Test should return the URLs of many messages with a single query
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        create_fake_messages(topic=self.topic, amount=12)
+        messages = Message.objects.filter(topic=self.topic)
+
+        # when
+        with self.assertNumQueries(num=1):
+            permalinks = messages.permalinks()
+
+        # then
+        self.assertDictEqual(
+            d1=permalinks,
+            d2={message.pk: message.get_absolute_url() for message in messages},
+        )
+
 
 class TestTopic(BaseTestCase):
     """
@@ -1247,6 +1522,200 @@ class TestTopic(BaseTestCase):
 
         self.assertEqual(first=topic.slug, second=expected_slug)
 
+    def test_should_count_messages_and_topics_up_to_the_parent_board(self):
+        """
+        Test should count messages and topics in the topic, its board and
+        the parent board
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        topic = create_topic(subject="Mysteries", board=self.child_board)
+
+        # when
+        create_fake_messages(topic=topic, amount=3)
+
+        # then
+        topic.refresh_from_db()
+        self.board.refresh_from_db()
+        self.child_board.refresh_from_db()
+        self.assertEqual(first=topic.message_count, second=3)
+        self.assertEqual(first=self.child_board.topic_count, second=1)
+        self.assertEqual(first=self.child_board.message_count, second=3)
+        self.assertEqual(first=self.board.topic_count, second=1)
+        self.assertEqual(first=self.board.message_count, second=3)
+
+    def test_should_update_counters_when_message_is_deleted(self):
+        """
+        Test should update the counters when a message is deleted
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        topic = create_topic(subject="Mysteries", board=self.child_board)
+        messages = create_fake_messages(topic=topic, amount=3)
+
+        # when
+        messages[1].delete()
+
+        # then
+        topic.refresh_from_db()
+        self.board.refresh_from_db()
+        self.child_board.refresh_from_db()
+        self.assertEqual(first=topic.message_count, second=2)
+        self.assertEqual(first=self.child_board.message_count, second=2)
+        self.assertEqual(first=self.board.message_count, second=2)
+
+    def test_should_update_board_counters_when_topic_is_deleted(self):
+        """
+        Test should update the board counters when a topic is deleted,
+        also when deleted in bulk
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        topic_1 = create_topic(subject="Mysteries", board=self.child_board)
+        create_fake_messages(topic=topic_1, amount=3)
+        topic_2 = create_topic(subject="Discoveries", board=self.child_board)
+        create_fake_messages(topic=topic_2, amount=2)
+        topic_3 = create_topic(subject="Theories", board=self.board)
+        create_fake_messages(topic=topic_3, amount=1)
+
+        # when
+        topic_1.delete()
+        Topic.objects.filter(pk=topic_2.pk).delete()
+
+        # then
+        self.board.refresh_from_db()
+        self.child_board.refresh_from_db()
+        self.assertEqual(first=self.child_board.topic_count, second=0)
+        self.assertEqual(first=self.child_board.message_count, second=0)
+        self.assertEqual(first=self.board.topic_count, second=1)
+        self.assertEqual(first=self.board.message_count, second=1)
+
+    def test_should_update_board_counters_when_topic_is_moved(self):
+        """
+        Test should update the board counters when a topic is moved to another board
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        other_board = create_board(category=self.board.category, name="Math")
+        topic = create_topic(subject="Mysteries", board=self.child_board)
+        create_fake_messages(topic=topic, amount=3)
+
+        # when
+        topic.board = other_board
+        topic.save()
+
+        # then
+        self.board.refresh_from_db()
+        self.child_board.refresh_from_db()
+        other_board.refresh_from_db()
+        self.assertEqual(first=self.board.topic_count, second=0)
+        self.assertEqual(first=self.board.message_count, second=0)
+        self.assertEqual(first=self.child_board.topic_count, second=0)
+        self.assertEqual(first=other_board.topic_count, second=1)
+        self.assertEqual(first=other_board.message_count, second=3)
+        self.assertEqual(first=other_board.last_message, second=topic.last_message)
+        self.assertIsNone(obj=self.board.last_message)
+
+    def test_should_move_board_counters_when_child_board_is_moved(self):
+        """
+        Test should move the counters and the last message of a child board
+        from its old to its new parent board
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        other_board = create_board(category=self.board.category, name="Math")
+        topic = create_topic(subject="Mysteries", board=self.child_board)
+        create_fake_messages(topic=topic, amount=3)
+        child_board = Board.objects.get(pk=self.child_board.pk)
+
+        # when
+        child_board.parent_board = other_board
+        child_board.save()
+
+        # then
+        self.board.refresh_from_db()
+        child_board.refresh_from_db()
+        other_board.refresh_from_db()
+        self.assertEqual(first=self.board.topic_count, second=0)
+        self.assertEqual(first=self.board.message_count, second=0)
+        self.assertIsNone(obj=self.board.last_message)
+        self.assertEqual(first=child_board.topic_count, second=1)
+        self.assertEqual(first=child_board.message_count, second=3)
+        self.assertEqual(first=other_board.topic_count, second=1)
+        self.assertEqual(first=other_board.message_count, second=3)
+        self.assertEqual(first=other_board.last_message, second=topic.last_message)
+
+    def test_should_move_board_counters_when_board_becomes_top_level(self):
+        """
+        Test should remove the counters of a child board from its parent board
+        when it becomes a top-level board
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        topic = create_topic(subject="Mysteries", board=self.child_board)
+        create_fake_messages(topic=topic, amount=3)
+        create_fake_messages(
+            topic=create_topic(subject="Theories", board=self.board), amount=1
+        )
+
+        # when
+        self.child_board.parent_board = None
+        self.child_board.save(update_fields=["parent_board"])
+
+        # then
+        self.board.refresh_from_db()
+        self.assertEqual(first=self.board.topic_count, second=1)
+        self.assertEqual(first=self.board.message_count, second=1)
+
+    def test_should_not_overwrite_counters_with_outdated_values_on_save(self):
+        """
+        Test should not overwrite the counters with the outdated values
+        of an instance in memory
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        topic = create_topic(subject="Mysteries", board=self.board)
+        outdated_topic = Topic.objects.get(pk=topic.pk)
+        outdated_board = Board.objects.get(pk=self.board.pk)
+        create_fake_messages(topic=topic, amount=3)
+
+        # when
+        outdated_topic.is_sticky = True
+        outdated_topic.save()
+        outdated_board.description = "Everything about physics"
+        outdated_board.save()
+
+        # then
+        topic.refresh_from_db()
+        self.board.refresh_from_db()
+        self.assertTrue(expr=topic.is_sticky)
+        self.assertEqual(first=topic.message_count, second=3)
+        self.assertEqual(
+            first=self.board.description, second="Everything about physics"
+        )
+        self.assertEqual(first=self.board.message_count, second=3)
+
 
 class TestPersonalMessage(BaseTestCase):
     """
@@ -1386,6 +1855,77 @@ class TestSetting(BaseTestCase):
         with self.assertRaises(expected_exception=IntegrityError):
             create_setting(pk=2)
 
+    def test_should_get_setting_without_queries_when_cached(self):
+        """
+        Test should read the settings from the database only once
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        Setting.objects.get_setting(setting_key=Setting.Field.MESSAGESPERPAGE)
+
+        # when
+        with self.assertNumQueries(num=0):
+            messages_per_page = Setting.objects.get_setting(
+                setting_key=Setting.Field.MESSAGESPERPAGE
+            )
+            topics_per_page = Setting.objects.get_setting(
+                setting_key=Setting.Field.TOPICSPERPAGE
+            )
+
+        # then
+        self.assertEqual(first=messages_per_page, second=15)
+        self.assertEqual(first=topics_per_page, second=10)
+
+    def test_should_get_setting_from_shared_cache(self):
+        """
+        Test should use the shared cache, when the settings are not cached in
+        this process
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        Setting.objects.get_setting(setting_key=Setting.Field.MESSAGESPERPAGE)
+        _setting_values_local_cache.clear()
+
+        # when
+        with self.assertNumQueries(num=0):
+            messages_per_page = Setting.objects.get_setting(
+                setting_key=Setting.Field.MESSAGESPERPAGE
+            )
+
+        # then
+        self.assertEqual(first=messages_per_page, second=15)
+
+    def test_should_get_changed_setting_after_save(self):
+        """
+        Test should not use the cached settings after they have been changed
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        Setting.objects.get_setting(setting_key=Setting.Field.MESSAGESPERPAGE)
+        setting = Setting.objects.get(pk=1)
+        setting.messages_per_page = 30
+
+        # when
+        with self.captureOnCommitCallbacks(execute=True):
+            setting.save()
+
+        # then
+        self.assertEqual(
+            first=Setting.objects.get_setting(
+                setting_key=Setting.Field.MESSAGESPERPAGE
+            ),
+            second=30,
+        )
+
     def test_cannot_be_deleted(self):
         """
         Test that the settings object cannot be deleted
@@ -4,10 +4,22 @@ Test for the providers module.
 
 # Standard Library
 import logging
+from unittest.mock import MagicMock, patch
+
+# Third Party
+import grpc
+from discordproxy.exceptions import DiscordProxyGrpcError, DiscordProxyTimeoutError
 
 # AA Forum
 from aa_forum import __title__
+from aa_forum.app_settings import DISCORDPROXY_HOST, DISCORDPROXY_PORT
 from aa_forum.providers.applogger import AppLogger
+from aa_forum.providers.discordproxy_client import (
+    DISCORDPROXY_CHANNEL_OPTIONS,
+    DiscordProxyClient,
+    _reset_after_fork,
+    get_discordproxy_client,
+)
 from aa_forum.tests import BaseTestCase
 
 
@@ -47,3 +59,178 @@ class TestAppLogger(BaseTestCase):
             app_logger.info("")
 
         self.assertIn(f"[{__title__}] ", log.output[0])
+
+
+class _UnavailableError(grpc.RpcError):
+    """
+    gRPC error for a lost connection
+    """
+
+    def code(self):
+        return grpc.StatusCode.UNAVAILABLE
+
+    def details(self):
+        return "Connection refused"
+
+
+@patch("discordproxy.discord_api_pb2_grpc.DiscordApiStub")
+@patch("grpc.insecure_channel")
+class TestDiscordProxyClient(BaseTestCase):
+    """
+    Test the DiscordProxyClient provider.
+    """
+
+    def test_reuses_channel(self, mock_channel, mock_stub):
+        """
+        Test that all requests are sent through the same gRPC channel.
+
+        :param mock_channel:
+        :type mock_channel:
+        :param mock_stub:
+        :type mock_stub:
+        :return:
+        :rtype:
+        """
+
+        # given
+        client = DiscordProxyClient(target="localhost:50051", timeout=30)
+
+        # when
+        client.create_direct_message(user_id=1, content="Hello")
+        client.create_direct_message(user_id=2, content="Hello again", timeout=5)
+
+        # then
+        mock_channel.assert_called_once_with(
+            target="localhost:50051", options=DISCORDPROXY_CHANNEL_OPTIONS
+        )
+        timeouts = [
+            call.kwargs["timeout"]
+            for call in mock_stub.return_value.SendDirectMessage.call_args_list
+        ]
+        self.assertEqual(timeouts, [30, 5])
+        self.assertEqual(
+            client.metrics,
+            {"channels_opened": 1, "requests": 2, "channel_reuses": 1},
+        )
+
+    def test_reconnects_after_connection_loss(self, mock_channel, mock_stub):
+        """
+        Test that the channel is opened again after discordproxy was unavailable.
+
+        :param mock_channel:
+        :type mock_channel:
+        :param mock_stub:
+        :type mock_stub:
+        :return:
+        :rtype:
+        """
+
+        # given
+        client = DiscordProxyClient(target="localhost:50051")
+        mock_stub.return_value.SendDirectMessage.side_effect = [
+            _UnavailableError(),
+            MagicMock(),
+        ]
+
+        # when
+        with self.assertRaises(DiscordProxyGrpcError):
+            client.create_direct_message(user_id=1, content="Hello")
+
+        client.create_direct_message(user_id=1, content="Hello")
+
+        # then
+        self.assertEqual(mock_channel.call_count, 2)
+        mock_channel.return_value.close.assert_called_once()
+
+    def test_reopens_channel_in_forked_process(self, mock_channel, mock_stub):
+        """
+        Test that a forked process doesn't use the channel of its parent.
+
+        :param mock_channel:
+        :type mock_channel:
+        :param mock_stub:
+        :type mock_stub:
+        :return:
+        :rtype:
+        """
+
+        # given
+        client = DiscordProxyClient(target="localhost:50051")
+        client.create_direct_message(user_id=1, content="Hello")
+
+        # when
+        _reset_after_fork()
+        client.create_direct_message(user_id=1, content="Hello")
+
+        # then
+        self.assertEqual(mock_channel.call_count, 2)
+        self.assertFalse(mock_channel.return_value.close.called)
+
+    def test_creates_locks_again_in_forked_process(self, mock_channel, mock_stub):
+        """
+        Test that a forked process doesn't wait for locks and request slots
+        that were held in its parent when it was forked.
+
+        :param mock_channel:
+        :type mock_channel:
+        :param mock_stub:
+        :type mock_stub:
+        :return:
+        :rtype:
+        """
+
+        # given
+        client = DiscordProxyClient(target="localhost:50051", max_concurrent_requests=1)
+        lock, slots = client._get_locks()
+        lock.acquire()  # pylint: disable=consider-using-with
+        slots.acquire()  # pylint: disable=consider-using-with
+
+        # when
+        _reset_after_fork()
+        client.create_direct_message(user_id=1, content="Hello", timeout=0.01)
+
+        # then
+        self.assertTrue(mock_stub.return_value.SendDirectMessage.called)
+
+    def test_limits_concurrent_requests(self, mock_channel, mock_stub):
+        """
+        Test that a request fails when there is no free slot in time.
+
+        :param mock_channel:
+        :type mock_channel:
+        :param mock_stub:
+        :type mock_stub:
+        :return:
+        :rtype:
+        """
+
+        # given
+        client = DiscordProxyClient(target="localhost:50051", max_concurrent_requests=1)
+        _, slots = client._get_locks()
+        slots.acquire()  # pylint: disable=consider-using-with
+
+        # when
+        with self.assertRaises(DiscordProxyTimeoutError):
+            client.create_direct_message(user_id=1, content="Hello", timeout=0.01)
+
+        # then
+        self.assertFalse(mock_stub.return_value.SendDirectMessage.called)
+
+    def test_returns_shared_client(self, mock_channel, mock_stub):
+        """
+        Test that the whole process shares one client.
+
+        :param mock_channel:
+        :type mock_channel:
+        :param mock_stub:
+        :type mock_stub:
+        :return:
+        :rtype:
+        """
+
+        # when
+        client = get_discordproxy_client()
+
+        # then
+        self.assertIs(client, get_discordproxy_client())
+        self.assertEqual(client.target, f"{DISCORDPROXY_HOST}:{DISCORDPROXY_PORT}")
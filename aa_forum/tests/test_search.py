@@ -0,0 +1,841 @@
+"""
+Tests for the search backends
+"""
+
+# Standard Library
+from unittest.mock import patch
+
+# Django
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+# AA Forum
+from aa_forum.models import Board, Category, Message, SearchIndexEntry, Topic
+from aa_forum.search.backends import (
+    IndexSearchBackend,
+    MySQLSearchBackend,
+    PythonSearchBackend,
+    SearchBackend,
+    get_search_backend,
+)
+from aa_forum.search.query import parse_query, tokenize
+from aa_forum.search.stopwords import get_stopwords, is_stopword
+from aa_forum.tests import BaseTestCase
+from aa_forum.tests.utils import create_fake_user, random_id
+
+BACKENDS_PATH = "aa_forum.search.backends"
+STOPWORDS_PATH = "aa_forum.search.stopwords"
+
+
+class TestGetSearchBackend(BaseTestCase):
+    """
+    Tests for get_search_backend
+    """
+
+    @patch(f"{BACKENDS_PATH}.AA_FORUM_SEARCH_BACKEND", "auto")
+    def test_should_use_python_fallback_for_sqlite(self):
+        """
+        Test should use the Python fallback when the database has no
+        supported full-text search
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        backend = get_search_backend()
+
+        # then
+        self.assertIsInstance(backend, PythonSearchBackend)
+
+    @patch(f"{BACKENDS_PATH}.AA_FORUM_SEARCH_BACKEND", "mysql")
+    def test_should_use_configured_backend(self):
+        """
+        Test should use the configured backend
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        backend = get_search_backend()
+
+        # then
+        self.assertIsInstance(backend, MySQLSearchBackend)
+
+    @patch(f"{BACKENDS_PATH}.AA_FORUM_SEARCH_BACKEND", "elasticsearch")
+    def test_should_raise_exception_for_unknown_backend(self):
+        """
+        Test should raise an exception for an unknown backend
+
+        :return:
+        :rtype:
+        """
+
+        # when/then
+        with self.assertRaises(ImproperlyConfigured):
+            get_search_backend()
+
+
+class TestStopwords(BaseTestCase):
+    """
+    Tests for the search stopwords
+    """
+
+    def test_should_load_stopwords_of_all_languages(self):
+        """
+        Test should use the stopwords of all languages by default
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        stopwords = get_stopwords()
+
+        # then
+        self.assertIsInstance(stopwords, frozenset)
+        self.assertTrue({"the", "und", "les", '"'}.issubset(stopwords))
+
+    @patch(f"{STOPWORDS_PATH}.AA_FORUM_SEARCH_STOPWORD_LANGUAGES", ["de", "zh-hans"])
+    def test_should_only_load_stopwords_of_configured_languages(self):
+        """
+        Test should only use the stopwords of the configured languages, and the
+        base language for language codes with a region
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        stopwords = get_stopwords()
+
+        # then
+        self.assertIn(member="und", container=stopwords)
+        self.assertIn(member="的", container=stopwords)
+        self.assertIn(member="(", container=stopwords)
+        self.assertNotIn(member="the", container=stopwords)
+
+    def test_should_load_stopwords_only_once(self):
+        """
+        Test should keep the stopwords in memory after the first search
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        get_stopwords()
+
+        # when
+        with patch(f"{STOPWORDS_PATH}.open", create=True) as mock_open:
+            stopwords = get_stopwords()
+
+        # then
+        mock_open.assert_not_called()
+        self.assertIs(stopwords, get_stopwords())
+
+    def test_should_check_stopwords_case_insensitive(self):
+        """
+        Test should find stopwords regardless of their case
+
+        :return:
+        :rtype:
+        """
+
+        # when/then
+        self.assertTrue(is_stopword(word="The"))
+        self.assertFalse(is_stopword(word="Raven"))
+
+
+class TestTokenize(BaseTestCase):
+    """
+    Tests for tokenize
+    """
+
+    def test_should_split_into_lowercase_words(self):
+        """
+        Test should split a text into lowercase words without punctuation
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        words = tokenize(text="Fleet at 19:00, bring Ravens!")
+
+        # then
+        self.assertListEqual(
+            list1=words, list2=["fleet", "at", "19", "00", "bring", "ravens"]
+        )
+
+
+class TestSearchBackend(BaseTestCase):
+    """
+    Tests for the base class of the search backends
+    """
+
+    def test_should_require_search_method(self):
+        """
+        Test should not create backends without a search method
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        class IncompleteSearchBackend(SearchBackend):
+            """
+            Backend without a search method
+            """
+
+            name = "incomplete"
+
+        # when/then
+        with self.assertRaises(TypeError):
+            IncompleteSearchBackend()
+
+
+class TestPythonSearchBackend(BaseTestCase):
+    """
+    Tests for the Python fallback search backend
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Set up a user, a category and a board
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+        cls.user = create_fake_user(
+            character_id=random_id(),
+            character_name="Bruce Wayne",
+            permissions=["aa_forum.basic_access"],
+        )
+        cls.category = Category.objects.create(name="Fleets")
+        cls.board = Board.objects.create(name="Doctrines", category=cls.category)
+
+    def setUp(self) -> None:
+        """
+        Set up topics and messages
+
+        :return:
+        :rtype:
+        """
+
+        self.topic = Topic.objects.create(subject="Raven doctrine", board=self.board)
+        self.topic_2 = Topic.objects.create(subject="Logistics", board=self.board)
+        self.message_once = self._create_message(
+            topic=self.topic_2, text="Bring a raven."
+        )
+        self.message_often = self._create_message(
+            topic=self.topic_2, text="Raven, raven and more ravens. Raven!"
+        )
+        self.message_subject = self._create_message(
+            topic=self.topic, text="Ask in the raven channel."
+        )
+        self.message_other = self._create_message(
+            topic=self.topic_2, text="Dreadnoughts only."
+        )
+
+    def _create_message(self, topic: Topic, text: str) -> Message:
+        """
+        Create a message
+
+        :param topic:
+        :type topic:
+        :param text:
+        :type text:
+        :return:
+        :rtype:
+        """
+
+        return Message.objects.create(
+            topic=topic, user_created=self.user, message=f"<p>{text}</p>"
+        )
+
+    def test_should_find_and_rank_messages(self):
+        """
+        Test should find messages with the search term, matches in the subject
+        first, then by term frequency
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        results = PythonSearchBackend().search(
+            queryset=Message.objects.all(), query="Raven"
+        )
+
+        # then
+        self.assertListEqual(
+            list1=list(results),
+            list2=[self.message_subject, self.message_often, self.message_once],
+        )
+
+    def test_should_find_messages_with_any_term(self):
+        """
+        Test should find messages that contain any of the search terms
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        results = PythonSearchBackend().search(
+            queryset=Message.objects.all(), query="bring dreadnoughts"
+        )
+
+        # then
+        self.assertSetEqual(
+            set1=set(results), set2={self.message_once, self.message_other}
+        )
+
+    def test_should_only_search_in_given_queryset(self):
+        """
+        Test should only return messages from the given queryset
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        results = PythonSearchBackend().search(
+            queryset=Message.objects.filter(topic=self.topic_2), query="raven"
+        )
+
+        # then
+        self.assertNotIn(member=self.message_subject, container=results)
+
+    def test_should_return_nothing_without_matches(self):
+        """
+        Test should return no messages when nothing matches
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        results = PythonSearchBackend().search(
+            queryset=Message.objects.all(), query="dreadnought"
+        )
+
+        # then
+        self.assertFalse(results.exists())
+
+    def test_should_find_changed_messages(self):
+        """
+        Test should find new messages and forget deleted ones
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        PythonSearchBackend().search(queryset=Message.objects.all(), query="raven")
+
+        new_message = self._create_message(
+            topic=self.topic_2, text="Dreadnought fleet tonight"
+        )
+        self.message_once.delete()
+
+        # when
+        new_results = PythonSearchBackend().search(
+            queryset=Message.objects.all(), query="dreadnought"
+        )
+        deleted_results = PythonSearchBackend().search(
+            queryset=Message.objects.all(), query="bring"
+        )
+
+        # then
+        self.assertListEqual(list1=list(new_results), list2=[new_message])
+        self.assertFalse(deleted_results.exists())
+
+    def test_should_rank_by_changed_topic_subject(self):
+        """
+        Test should rank messages by the current subject of their topic
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        PythonSearchBackend().search(queryset=Message.objects.all(), query="raven")
+
+        self.topic.subject = "Logistics doctrine"
+        self.topic.save()
+        self.topic_2.subject = "Raven logistics"
+        self.topic_2.save()
+
+        # when
+        results = PythonSearchBackend().search(
+            queryset=Message.objects.all(), query="raven"
+        )
+
+        # then
+        self.assertListEqual(
+            list1=list(results),
+            list2=[self.message_often, self.message_once, self.message_subject],
+        )
+
+    @patch(f"{BACKENDS_PATH}.PythonSearchBackend.max_results", 1)
+    def test_should_flag_capped_results(self):
+        """
+        Test should only return the best `max_results` messages and flag
+        that there are more
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        backend = PythonSearchBackend()
+
+        # when
+        results = backend.search(
+            queryset=Message.objects.filter(topic=self.topic_2), query="raven"
+        )
+
+        # then
+        self.assertListEqual(list1=list(results), list2=[self.message_often])
+        self.assertTrue(backend.results_capped)
+
+    def test_should_not_flag_complete_results(self):
+        """
+        Test should not flag the results as capped when all matches are returned
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        backend = PythonSearchBackend()
+
+        # when
+        backend.search(queryset=Message.objects.all(), query="raven")
+
+        # then
+        self.assertFalse(backend.results_capped)
+
+    @patch(f"{BACKENDS_PATH}.PythonSearchBackend.max_results", 2)
+    def test_should_show_capped_results_count_in_search_view(self):
+        """
+        Test should tell the user that there are more results than shown
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user)
+
+        # when
+        response = self.client.get(
+            path=reverse(viewname="aa_forum:search_results"), data={"q": "raven"}
+        )
+
+        # then
+        self.assertEqual(first=response.context["search_results_count"], second=2)
+        self.assertTrue(response.context["search_results_count_capped"])
+        self.assertContains(response=response, text="2+ Results")
+
+    def test_should_show_ranked_results_in_search_view(self):
+        """
+        Test should show the search results in the order of their rank
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user)
+
+        # when
+        response = self.client.get(
+            path=reverse(viewname="aa_forum:search_results"), data={"q": "raven"}
+        )
+
+        # then
+        self.assertListEqual(
+            list1=list(response.context["search_results"]),
+            list2=[self.message_subject, self.message_often, self.message_once],
+        )
+        self.assertEqual(first=response.context["search_results_count"], second=3)
+
+    def test_should_link_search_results_to_their_topic_page(self):
+        """
+        Test should link the search results directly to their page in the
+        topic instead of the redirecting message URL
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user)
+
+        # when
+        response = self.client.get(
+            path=reverse(viewname="aa_forum:search_results"), data={"q": "raven"}
+        )
+
+        # then
+        for message in response.context["search_results"]:
+            self.assertEqual(first=message.permalink, second=message.get_absolute_url())
+            self.assertContains(response=response, text=f'href="{message.permalink}"')
+
+    def test_should_count_search_results_once(self):
+        """
+        Test should count the search results only once, for the paginator
+        and the template
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user)
+
+        # when
+        with CaptureQueriesContext(connection=connection) as queries:
+            response = self.client.get(
+                path=reverse(viewname="aa_forum:search_results"), data={"q": "raven"}
+            )
+
+        # then
+        count_queries = [
+            query["sql"]
+            for query in queries
+            if 'COUNT(*) AS "__count" FROM "aa_forum_message"' in query["sql"]
+        ]
+        self.assertEqual(first=len(count_queries), second=1, msg=count_queries)
+        self.assertEqual(first=response.context["search_results_count"], second=3)
+        self.assertFalse(response.context["search_results_count_capped"])
+
+    @patch("aa_forum.views.search.AA_FORUM_SEARCH_RESULTS_COUNT_LIMIT", 2)
+    def test_should_cap_search_results_count(self):
+        """
+        Test should stop counting the search results at the configured limit
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user)
+
+        # when
+        response = self.client.get(
+            path=reverse(viewname="aa_forum:search_results"), data={"q": "raven"}
+        )
+
+        # then
+        self.assertEqual(first=response.context["search_results_count"], second=2)
+        self.assertTrue(response.context["search_results_count_capped"])
+        self.assertContains(response=response, text="2+ Results")
+
+    @patch("aa_forum.helper.highlight.AA_FORUM_SEARCH_SNIPPET_LENGTH", 40)
+    def test_should_show_snippets_in_search_view(self):
+        """
+        Test should show a highlighted snippet of long messages instead of the
+        whole message
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user)
+        self._create_message(
+            topic=self.topic,
+            text=f"{'Tackle first. ' * 20}Then the dreadnought. {'Align out. ' * 20}",
+        )
+
+        # when
+        response = self.client.get(
+            path=reverse(viewname="aa_forum:search_results"),
+            data={"q": "dreadnought"},
+        )
+
+        # then
+        self.assertContains(
+            response=response,
+            text=(
+                '<p class="aa-forum-search-result-snippet">…first. Then the '
+                '<span class="aa-forum-search-term-highlight">dreadnought</span>. '
+                "Align out. Align…</p>"
+            ),
+            html=True,
+        )
+        self.assertNotContains(response=response, text="Tackle first. Tackle first.")
+
+
+class TestParseQuery(BaseTestCase):
+    """
+    Tests for parse_query
+    """
+
+    def test_should_parse_words_phrases_and_or(self):
+        """
+        Test should parse AND-ed words, phrases and OR into clauses
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        clauses = parse_query(query='Fleet "raven doctrine" OR Logistics')
+
+        # then
+        self.assertListEqual(
+            list1=clauses,
+            list2=[
+                [((0, "fleet"),), ((0, "raven"), (1, "doctrine"))],
+                [((0, "logistics"),)],
+            ],
+        )
+
+    def test_should_keep_offsets_of_stopwords_in_phrases(self):
+        """
+        Test should leave out stopwords, but keep the offsets of the
+        following words
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        clauses = parse_query(
+            query='"the state of the art"', stopwords=frozenset({"the", "of"})
+        )
+
+        # then
+        self.assertListEqual(list1=clauses, list2=[[((0, "state"), (3, "art"))]])
+
+    def test_should_ignore_dangling_or(self):
+        """
+        Test should ignore OR without words on both sides
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        clauses = parse_query(query="OR raven OR")
+
+        # then
+        self.assertListEqual(list1=clauses, list2=[[((0, "raven"),)]])
+
+
+@patch("aa_forum.search.index.AA_FORUM_SEARCH_BACKEND", "index")
+class TestIndexSearchBackend(BaseTestCase):
+    """
+    Tests for the built-in search index and its backend
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Set up a user, a category, a board and a topic
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+        cls.user = create_fake_user(
+            character_id=random_id(),
+            character_name="Bruce Wayne",
+            permissions=["aa_forum.basic_access"],
+        )
+        cls.category = Category.objects.create(name="Fleets")
+        cls.board = Board.objects.create(name="Doctrines", category=cls.category)
+        cls.topic = Topic.objects.create(subject="Ships", board=cls.board)
+
+    def _create_message(self, text: str) -> Message:
+        """
+        Create a message
+
+        :param text:
+        :type text:
+        :return:
+        :rtype:
+        """
+
+        return Message.objects.create(
+            topic=self.topic, user_created=self.user, message=f"<p>{text}</p>"
+        )
+
+    def _search(self, query: str) -> list:
+        """
+        Search all messages
+
+        :param query:
+        :type query:
+        :return:
+        :rtype:
+        """
+
+        return list(
+            IndexSearchBackend().search(queryset=Message.objects.all(), query=query)
+        )
+
+    def test_should_index_message_on_save(self):
+        """
+        Test should index the words of a message on save, without stopwords
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        message = self._create_message(text="The Raven fleet")
+
+        # then
+        self.assertListEqual(
+            list1=list(
+                SearchIndexEntry.objects.filter(message=message)
+                .order_by("position")
+                .values_list("position", "term")
+            ),
+            list2=[(1, "raven"), (2, "fleet")],
+        )
+
+    def test_should_reindex_message_on_change(self):
+        """
+        Test should replace the index entries when a message is changed
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        message = self._create_message(text="Raven fleet")
+
+        # when
+        message.message = "<p>Dreadnought fleet</p>"
+        message.save()
+
+        # then
+        self.assertSetEqual(
+            set1=set(
+                SearchIndexEntry.objects.filter(message=message).values_list(
+                    "term", flat=True
+                )
+            ),
+            set2={"dreadnought", "fleet"},
+        )
+
+    def test_should_remove_index_entries_on_delete(self):
+        """
+        Test should remove the index entries of a deleted message
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        message = self._create_message(text="Raven fleet")
+
+        # when
+        message.delete()
+
+        # then
+        self.assertFalse(SearchIndexEntry.objects.exists())
+
+    def test_should_not_index_when_not_in_use(self):
+        """
+        Test should not maintain the index for other search backends
+
+        :return:
+        :rtype:
+        """
+
+        # when
+        with patch("aa_forum.search.index.AA_FORUM_SEARCH_BACKEND", "auto"):
+            self._create_message(text="Raven fleet")
+
+        # then
+        self.assertFalse(SearchIndexEntry.objects.exists())
+
+    def test_should_find_messages_with_all_words(self):
+        """
+        Test should only find messages containing all words
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        message_both = self._create_message(text="Raven fleet tonight")
+        self._create_message(text="Raven doctrine")
+
+        # when
+        results = self._search(query="fleet raven")
+
+        # then
+        self.assertListEqual(list1=results, list2=[message_both])
+
+    def test_should_find_messages_with_either_word(self):
+        """
+        Test should find messages with either side of OR, ranked by the
+        number of matching words
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        message_raven = self._create_message(text="Raven doctrine")
+        message_both = self._create_message(text="Raven fleet, ravens are fleet")
+        self._create_message(text="Logistics")
+
+        # when
+        results = self._search(query="raven OR fleet")
+
+        # then
+        self.assertListEqual(list1=results, list2=[message_both, message_raven])
+
+    def test_should_find_phrases(self):
+        """
+        Test should only find messages with the words of a phrase in order,
+        stopwords in between included
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        message_phrase = self._create_message(text="Join the fleet of Ravens")
+        self._create_message(text="Ravens of the fleet")
+        self._create_message(text="Fleet Ravens")
+
+        # when
+        results = self._search(query='"fleet of ravens"')
+
+        # then
+        self.assertListEqual(list1=results, list2=[message_phrase])
+
+    def test_should_find_nothing_for_stopwords_only(self):
+        """
+        Test should find nothing when the query only has stopwords
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self._create_message(text="The fleet")
+
+        # when
+        results = self._search(query="the")
+
+        # then
+        self.assertListEqual(list1=results, list2=[])
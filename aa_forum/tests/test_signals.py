@@ -2,10 +2,14 @@
 Test signals for the aa_forum app
 """
 
+# Django
+from django.core.cache import cache
+
 # Alliance Auth
 from allianceauth.groupmanagement.models import Group
 
 # AA Forum
+from aa_forum.helper.board_access import BOARD_ACCESS_GENERATION_CACHE_KEY
 from aa_forum.models import Board, Category
 from aa_forum.tests import BaseTestCase
 from aa_forum.tests.utils import create_fake_user, random_id
@@ -76,3 +80,49 @@ class TestBoard(BaseTestCase):
         board.save()
 
         self.assertEqual(first=list(board_2.groups.all()), second=[self.group])
+
+    def test_should_not_bump_board_access_generation_for_message_references(self):
+        """
+        Test should keep the cached board access when only the counters or
+        message references of a board are saved
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        board = Board.objects.create(name="Physics", category=self.category)
+        generation = cache.get(key=BOARD_ACCESS_GENERATION_CACHE_KEY)
+
+        # when
+        with self.captureOnCommitCallbacks(execute=True):
+            board.save(update_fields=["first_message", "last_message"])
+            board.save(update_fields=["topic_count", "message_count"])
+
+        # then
+        self.assertEqual(
+            first=cache.get(key=BOARD_ACCESS_GENERATION_CACHE_KEY), second=generation
+        )
+
+    def test_should_bump_board_access_generation_for_other_changes(self):
+        """
+        Test should invalidate the cached board access when other fields of
+        a board are saved
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        board = Board.objects.create(name="Physics", category=self.category)
+        generation = cache.get(key=BOARD_ACCESS_GENERATION_CACHE_KEY)
+
+        # when
+        with self.captureOnCommitCallbacks(execute=True):
+            board.save(update_fields=["name", "last_message"])
+
+        # then
+        self.assertEqual(
+            first=cache.get(key=BOARD_ACCESS_GENERATION_CACHE_KEY),
+            second=generation + 2,
+        )
@@ -0,0 +1,606 @@
+"""
+Tests for the Celery tasks
+"""
+
+# Standard Library
+from datetime import timedelta
+from unittest.mock import patch
+
+# Third Party
+import requests
+from dhooks_lite import WebhookResponse
+
+# Django
+from django.utils import timezone
+
+# AA Forum
+from aa_forum.app_settings import AA_FORUM_DISCORD_DM_TIMEOUT
+from aa_forum.models import DiscordWebhookMessage, PersonalMessage
+from aa_forum.tasks import (
+    DISCORD_WEBHOOK_MAX_ATTEMPTS,
+    DISCORD_WEBHOOK_RETRY_BACKOFF,
+    PERSONAL_MESSAGE_NOTIFICATION_MAX_ATTEMPTS,
+    PERSONAL_MESSAGE_NOTIFICATION_RETRY_BACKOFF,
+    send_discord_webhook_message,
+    send_pending_discord_webhook_messages,
+    send_personal_message_notifications,
+)
+from aa_forum.tests import BaseTestCase
+from aa_forum.tests.utils import create_fake_user, random_id
+
+TASKS_PATH = "aa_forum.tasks"
+
+
+@patch(f"{TASKS_PATH}.send_discord_webhook_message.apply_async")
+@patch(f"{TASKS_PATH}.execute_discord_webhook_message")
+class TestSendDiscordWebhookMessage(BaseTestCase):
+    """
+    Tests for send_discord_webhook_message
+    """
+
+    def setUp(self) -> None:
+        """
+        Set up a message in the outbox
+
+        :return:
+        :rtype:
+        """
+
+        self.webhook_message = DiscordWebhookMessage.objects.create(
+            webhook_url="https://discord.com/api/webhooks/1/abc",
+            content="**New topic**",
+            embeds=[{"title": "Mysteries"}],
+        )
+
+    def test_should_delete_message_after_delivery(self, mock_execute, mock_apply):
+        """
+        Test should remove the message from the outbox once it has been sent
+
+        :param mock_execute:
+        :type mock_execute:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_execute.return_value = WebhookResponse(headers={}, status_code=200)
+
+        # when
+        send_discord_webhook_message(message_id=self.webhook_message.pk)
+
+        # then
+        self.assertFalse(DiscordWebhookMessage.objects.exists())
+        self.assertFalse(mock_apply.called)
+
+    def test_should_wait_for_rate_limit_on_429(self, mock_execute, mock_apply):
+        """
+        Test should send again when the rate limit of the webhook is over
+
+        :param mock_execute:
+        :type mock_execute:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_execute.return_value = WebhookResponse(
+            headers={}, status_code=429, content={"retry_after": 7}
+        )
+
+        # when
+        send_discord_webhook_message(message_id=self.webhook_message.pk)
+
+        # then
+        self.webhook_message.refresh_from_db()
+        mock_apply.assert_called_once_with(
+            kwargs={
+                "message_id": self.webhook_message.pk,
+                "claim": self.webhook_message.time_next_attempt.isoformat(),
+            },
+            countdown=7,
+        )
+        self.assertFalse(self.webhook_message.is_failed)
+        self.assertEqual(first=self.webhook_message.attempts, second=1)
+
+    def test_should_give_up_when_rate_limited_too_often(self, mock_execute, mock_apply):
+        """
+        Test should count rate limited requests as attempts, so they aren't
+        retried forever
+
+        :param mock_execute:
+        :type mock_execute:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_execute.return_value = WebhookResponse(
+            headers={}, status_code=429, content={"retry_after": 0}
+        )
+        DiscordWebhookMessage.objects.filter(pk=self.webhook_message.pk).update(
+            attempts=DISCORD_WEBHOOK_MAX_ATTEMPTS - 1
+        )
+
+        # when
+        send_discord_webhook_message(message_id=self.webhook_message.pk)
+
+        # then
+        self.assertFalse(mock_apply.called)
+        self.webhook_message.refresh_from_db()
+        self.assertTrue(self.webhook_message.is_failed)
+
+    def test_should_not_send_while_rate_limited(self, mock_execute, mock_apply):
+        """
+        Test should not even try to send while the webhook is rate limited
+
+        :param mock_execute:
+        :type mock_execute:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_execute.return_value = WebhookResponse(
+            headers={}, status_code=429, content={"retry_after": 30}
+        )
+        send_discord_webhook_message(message_id=self.webhook_message.pk)
+        mock_execute.reset_mock()
+
+        # when
+        send_discord_webhook_message(**mock_apply.call_args.kwargs["kwargs"])
+
+        # then
+        self.assertFalse(mock_execute.called)
+        self.assertAlmostEqual(
+            first=mock_apply.call_args.kwargs["countdown"], second=30, delta=1
+        )
+        self.webhook_message.refresh_from_db()
+        self.assertEqual(first=self.webhook_message.attempts, second=1)
+
+    def test_should_retry_server_errors_with_backoff(self, mock_execute, mock_apply):
+        """
+        Test should retry server errors, waiting longer every time
+
+        :param mock_execute:
+        :type mock_execute:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_execute.return_value = WebhookResponse(headers={}, status_code=502)
+
+        # when
+        send_discord_webhook_message(message_id=self.webhook_message.pk)
+        send_discord_webhook_message(**mock_apply.call_args.kwargs["kwargs"])
+
+        # then
+        self.assertListEqual(
+            list1=[call.kwargs["countdown"] for call in mock_apply.call_args_list],
+            list2=[DISCORD_WEBHOOK_RETRY_BACKOFF, DISCORD_WEBHOOK_RETRY_BACKOFF * 2],
+        )
+        self.webhook_message.refresh_from_db()
+        self.assertEqual(first=self.webhook_message.last_error, second="HTTP 502: None")
+
+    def test_should_retry_network_errors(self, mock_execute, mock_apply):
+        """
+        Test should retry when Discord can't be reached
+
+        :param mock_execute:
+        :type mock_execute:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_execute.side_effect = requests.exceptions.ConnectionError("Offline")
+
+        # when
+        send_discord_webhook_message(message_id=self.webhook_message.pk)
+
+        # then
+        self.assertTrue(mock_apply.called)
+        self.webhook_message.refresh_from_db()
+        self.assertEqual(first=self.webhook_message.last_error, second="Offline")
+
+    def test_should_give_up_after_max_attempts(self, mock_execute, mock_apply):
+        """
+        Test should mark the message as failed after the last attempt
+
+        :param mock_execute:
+        :type mock_execute:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_execute.return_value = WebhookResponse(headers={}, status_code=503)
+        DiscordWebhookMessage.objects.filter(pk=self.webhook_message.pk).update(
+            attempts=DISCORD_WEBHOOK_MAX_ATTEMPTS - 1
+        )
+
+        # when
+        send_discord_webhook_message(message_id=self.webhook_message.pk)
+
+        # then
+        self.assertFalse(mock_apply.called)
+        self.webhook_message.refresh_from_db()
+        self.assertTrue(self.webhook_message.is_failed)
+
+    def test_should_not_retry_client_errors(self, mock_execute, mock_apply):
+        """
+        Test should not retry when Discord rejects the message, e.g. when
+        the webhook has been deleted
+
+        :param mock_execute:
+        :type mock_execute:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_execute.return_value = WebhookResponse(
+            headers={}, status_code=404, content={"message": "Unknown Webhook"}
+        )
+
+        # when
+        send_discord_webhook_message(message_id=self.webhook_message.pk)
+
+        # then
+        self.assertFalse(mock_apply.called)
+        self.webhook_message.refresh_from_db()
+        self.assertTrue(self.webhook_message.is_failed)
+        self.assertIn(
+            member="Unknown Webhook", container=self.webhook_message.last_error
+        )
+
+    def test_should_not_retry_invalid_messages(self, mock_execute, mock_apply):
+        """
+        Test should mark the message as failed, when dhooks_lite rejects its
+        content or embeds
+
+        :param mock_execute:
+        :type mock_execute:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_execute.side_effect = ValueError("content exceeds 2000")
+
+        # when
+        send_discord_webhook_message(message_id=self.webhook_message.pk)
+
+        # then
+        self.assertFalse(mock_apply.called)
+        self.webhook_message.refresh_from_db()
+        self.assertTrue(self.webhook_message.is_failed)
+        self.assertEqual(first=self.webhook_message.attempts, second=1)
+        self.assertEqual(
+            first=self.webhook_message.last_error, second="content exceeds 2000"
+        )
+
+    def test_should_only_send_once_when_queued_twice(self, mock_execute, mock_apply):
+        """
+        Test should only send a message once, when it has been queued again
+        before the first task has run
+
+        :param mock_execute:
+        :type mock_execute:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_execute.side_effect = requests.exceptions.ConnectionError("Offline")
+        claim = self.webhook_message.time_next_attempt.isoformat()
+        send_discord_webhook_message(message_id=self.webhook_message.pk)
+        mock_execute.reset_mock()
+
+        # when
+        send_discord_webhook_message(message_id=self.webhook_message.pk)
+        send_discord_webhook_message(message_id=self.webhook_message.pk, claim=claim)
+
+        # then
+        self.assertFalse(mock_execute.called)
+        self.webhook_message.refresh_from_db()
+        self.assertEqual(first=self.webhook_message.attempts, second=1)
+
+    def test_should_ignore_handled_messages(self, mock_execute, mock_apply):
+        """
+        Test should do nothing for messages that have been sent already
+
+        :param mock_execute:
+        :type mock_execute:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.webhook_message.delete()
+
+        # when
+        send_discord_webhook_message(message_id=42)
+
+        # then
+        self.assertFalse(mock_execute.called)
+        self.assertFalse(mock_apply.called)
+
+
+class TestSendPendingDiscordWebhookMessages(BaseTestCase):
+    """
+    Tests for send_pending_discord_webhook_messages
+    """
+
+    @patch(f"{TASKS_PATH}.send_discord_webhook_message.delay")
+    def test_should_queue_overdue_messages_only(self, mock_delay):
+        """
+        Test should queue messages again that are overdue
+
+        :param mock_delay:
+        :type mock_delay:
+        :return:
+        :rtype:
+        """
+
+        # given
+        overdue = DiscordWebhookMessage.objects.create(
+            webhook_url="https://discord.com/api/webhooks/1/abc",
+            content="Overdue",
+            time_next_attempt=timezone.now() - timedelta(hours=1),
+        )
+        DiscordWebhookMessage.objects.create(
+            webhook_url="https://discord.com/api/webhooks/1/abc", content="Recent"
+        )
+        DiscordWebhookMessage.objects.create(
+            webhook_url="https://discord.com/api/webhooks/1/abc",
+            content="Failed",
+            time_next_attempt=timezone.now() - timedelta(hours=1),
+            is_failed=True,
+        )
+
+        # when
+        send_pending_discord_webhook_messages()
+
+        # then
+        overdue.refresh_from_db()
+        mock_delay.assert_called_once_with(
+            message_id=overdue.pk, claim=overdue.time_next_attempt.isoformat()
+        )
+
+    @patch(f"{TASKS_PATH}.execute_discord_webhook_message")
+    @patch(f"{TASKS_PATH}.send_discord_webhook_message.delay")
+    def test_should_claim_overdue_messages_once(self, mock_delay, mock_execute):
+        """
+        Test should queue an overdue message only once and drop the task
+        that was queued for it before
+
+        :param mock_delay:
+        :type mock_delay:
+        :param mock_execute:
+        :type mock_execute:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_execute.return_value = WebhookResponse(headers={}, status_code=200)
+        overdue = DiscordWebhookMessage.objects.create(
+            webhook_url="https://discord.com/api/webhooks/1/abc",
+            content="Overdue",
+            time_next_attempt=timezone.now() - timedelta(hours=1),
+        )
+        stale_claim = overdue.time_next_attempt.isoformat()
+
+        # when
+        send_pending_discord_webhook_messages()
+        send_pending_discord_webhook_messages()
+        send_discord_webhook_message(message_id=overdue.pk, claim=stale_claim)
+
+        # then
+        self.assertEqual(first=mock_delay.call_count, second=1)
+        self.assertFalse(mock_execute.called)
+
+        send_discord_webhook_message(**mock_delay.call_args.kwargs)
+
+        self.assertEqual(first=mock_execute.call_count, second=1)
+        self.assertFalse(DiscordWebhookMessage.objects.exists())
+
+
+@patch(f"{TASKS_PATH}.send_personal_message_notifications.apply_async")
+@patch(f"{TASKS_PATH}.send_new_personal_message_notification")
+class TestSendPersonalMessageNotifications(BaseTestCase):
+    """
+    Tests for send_personal_message_notifications
+    """
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        """
+        Set up two personal messages
+
+        :return:
+        :rtype:
+        """
+
+        super().setUpClass()
+
+        cls.user = create_fake_user(
+            character_id=random_id(), character_name="Bruce Wayne"
+        )
+        cls.other_user = create_fake_user(
+            character_id=random_id(), character_name="Peter Parker"
+        )
+        cls.personal_message = PersonalMessage.objects.create(
+            sender=cls.user, recipient=cls.other_user, subject="Hi", message="Hello"
+        )
+        cls.other_personal_message = PersonalMessage.objects.create(
+            sender=cls.other_user, recipient=cls.user, subject="Re: Hi", message="Hey"
+        )
+
+    def test_should_send_all_dms_with_bounded_timeout(self, mock_send, mock_apply):
+        """
+        Test should send a DM for every message with the DM timeout
+
+        :param mock_send:
+        :type mock_send:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # when
+        send_personal_message_notifications(
+            message_ids=[self.personal_message.pk, self.other_personal_message.pk]
+        )
+
+        # then
+        self.assertEqual(first=mock_send.call_count, second=2)
+        self.assertEqual(
+            first={call.kwargs["message"] for call in mock_send.call_args_list},
+            second={self.personal_message, self.other_personal_message},
+        )
+
+        for call in mock_send.call_args_list:
+            self.assertEqual(
+                first=call.kwargs["timeout"], second=AA_FORUM_DISCORD_DM_TIMEOUT
+            )
+            self.assertFalse(call.kwargs["fallback"])
+
+        self.assertFalse(mock_apply.called)
+
+    def test_should_retry_failed_dms_only(self, mock_send, mock_apply):
+        """
+        Test should retry only the DMs that failed, with a backoff
+
+        :param mock_send:
+        :type mock_send:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        def send(message, **kwargs):
+            if message == self.other_personal_message:
+                raise requests.exceptions.ConnectionError("discordproxy is down")
+
+        mock_send.side_effect = send
+
+        # when
+        with patch(f"{TASKS_PATH}.logger.warning") as mock_logger_warning:
+            send_personal_message_notifications(
+                message_ids=[self.personal_message.pk, self.other_personal_message.pk],
+                attempt=2,
+            )
+
+        # then
+        self.assertEqual(first=mock_logger_warning.call_count, second=1)
+        mock_apply.assert_called_once_with(
+            kwargs={"message_ids": [self.other_personal_message.pk], "attempt": 3},
+            countdown=PERSONAL_MESSAGE_NOTIFICATION_RETRY_BACKOFF * 2,
+        )
+
+    def test_should_fall_back_and_log_error_on_last_attempt(
+        self, mock_send, mock_apply
+    ):
+        """
+        Test should fall back to allianceauth-discordbot on the last attempt,
+        and record and log an error when this fails as well
+
+        :param mock_send:
+        :type mock_send:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_send.side_effect = requests.exceptions.ConnectionError(
+            "discordproxy is down"
+        )
+
+        # when
+        with patch(f"{TASKS_PATH}.logger.error") as mock_logger_error:
+            send_personal_message_notifications(
+                message_ids=[self.personal_message.pk],
+                attempt=PERSONAL_MESSAGE_NOTIFICATION_MAX_ATTEMPTS,
+            )
+
+        # then
+        self.assertTrue(mock_send.call_args.kwargs["fallback"])
+        self.assertIn("Giving up", mock_logger_error.call_args.kwargs["msg"])
+        self.assertFalse(mock_apply.called)
+        self.personal_message.refresh_from_db()
+        self.assertTrue(self.personal_message.notification_failed)
+        self.assertEqual(
+            first=self.personal_message.notification_error,
+            second="discordproxy is down",
+        )
+        self.other_personal_message.refresh_from_db()
+        self.assertFalse(self.other_personal_message.notification_failed)
+
+    def test_should_not_retry_unexpected_errors(self, mock_send, mock_apply):
+        """
+        Test should not swallow errors that a retry won't fix
+
+        :param mock_send:
+        :type mock_send:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_send.side_effect = ValueError("Broken profile")
+
+        # when/then
+        with self.assertRaises(ValueError):
+            send_personal_message_notifications(message_ids=[self.personal_message.pk])
+
+        self.assertFalse(mock_apply.called)
+
+    def test_should_ignore_deleted_messages(self, mock_send, mock_apply):
+        """
+        Test should skip messages that have been deleted in the meantime
+
+        :param mock_send:
+        :type mock_send:
+        :param mock_apply:
+        :type mock_apply:
+        :return:
+        :rtype:
+        """
+
+        # when
+        send_personal_message_notifications(message_ids=[0])
+
+        # then
+        self.assertFalse(mock_send.called)
+        self.assertFalse(mock_apply.called)
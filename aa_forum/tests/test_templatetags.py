@@ -833,9 +833,9 @@ class TestHighlightSearchTerm(BaseTestCase):
 
         self.assertEqual(first=rendered_template, second=expected_result)
 
-    def test_should_add_dummy_href(self):
+    def test_should_keep_link_without_href(self):
         """
-        Test should add a dummy href
+        Test should keep an a-tag without href attribute as it is
 
         :return:
         :rtype:
@@ -849,7 +849,7 @@ class TestHighlightSearchTerm(BaseTestCase):
         rendered_template = render_template(string=self.template, context=context)
 
         expected_result = (
-            '<a href="#" title="Lorem Ipsum">'
+            '<a title="Lorem Ipsum">'
             '<span class="aa-forum-search-term-highlight">Lorem</span> Ipsum</a>'
         )
 
@@ -934,15 +934,15 @@ class TestHighlightSearchTerm(BaseTestCase):
         rendered_template = render_template(string=self.template, context=context)
 
         expected_result = (
-            '<img src="https://lorem-ipsum.com/lorem-ipsum.jpg"/> '
+            '<img src="https://lorem-ipsum.com/lorem-ipsum.jpg"> '
             '<span class="aa-forum-search-term-highlight">Lorem</span> Ipsum'
         )
 
         self.assertEqual(first=rendered_template, second=expected_result)
 
-    def test_should_add_dummy_image_src(self):
+    def test_should_keep_image_without_src(self):
         """
-        Test should add a dummy image src
+        Test should keep an img-tag without src attribute as it is
 
         :return:
         :rtype:
@@ -956,7 +956,7 @@ class TestHighlightSearchTerm(BaseTestCase):
         rendered_template = render_template(string=self.template, context=context)
 
         expected_result = (
-            '<img alt="Lorem Ipsum" src="#"/> '
+            '<img alt="Lorem Ipsum"> '
             '<span class="aa-forum-search-term-highlight">Lorem</span> Ipsum'
         )
 
@@ -978,7 +978,7 @@ class TestHighlightSearchTerm(BaseTestCase):
         rendered_template = render_template(string=self.template, context=context)
 
         expected_result = (
-            '<img alt="Lorem Ipsum" src="https://lorem-ipsum.com/lorem-ipsum.jpg"/> '
+            '<img src="https://lorem-ipsum.com/lorem-ipsum.jpg" alt="Lorem Ipsum"> '
             '<span class="aa-forum-search-term-highlight">Lorem</span> Ipsum'
         )
 
@@ -1000,7 +1000,7 @@ class TestHighlightSearchTerm(BaseTestCase):
         rendered_template = render_template(string=self.template, context=context)
 
         expected_result = (
-            '<img src="https://lorem-ipsum.com/lorem-ipsum.jpg" title="Lorem Ipsum"/> '
+            '<img src="https://lorem-ipsum.com/lorem-ipsum.jpg" title="Lorem Ipsum"> '
             '<span class="aa-forum-search-term-highlight">Lorem</span> Ipsum'
         )
 
@@ -8,13 +8,22 @@ from unittest.mock import patch
 
 # Django
 from django.contrib.messages import get_messages
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
 # Alliance Auth
 from allianceauth.groupmanagement.models import Group
 
 # AA Forum
-from aa_forum.models import Board, Category, LastMessageSeen, Message, Topic
+from aa_forum.models import (
+    Board,
+    BoardReadWatermark,
+    Category,
+    LastMessageSeen,
+    Message,
+    Topic,
+)
 from aa_forum.tests import BaseTestCase
 from aa_forum.tests.utils import (
     create_fake_messages,
@@ -144,6 +153,94 @@ class TestIndexViews(BaseTestCase):
         self.assertEqual(first=res.status_code, second=HTTPStatus.OK)
         self.assertContains(response=res, text=f"aa-forum-unread-in-{self.board_2.pk}")
 
+    def test_should_not_show_new_indicator_after_marking_all_as_read(self):
+        """
+        Test should not show new indicators after marking all topics as read,
+        until new posts are made
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user_1001)
+
+        # when
+        res_mark_all = self.client.get(
+            path=reverse(viewname="aa_forum:forum_mark_all_as_read")
+        )
+        res_after_mark_all = self.client.get(
+            path=reverse(viewname="aa_forum:forum_index")
+        )
+        Message.objects.create(
+            topic=self.board_2.topics.first(),
+            user_created=self.user_1002,
+            message="new message",
+        )
+        res_after_new_post = self.client.get(
+            path=reverse(viewname="aa_forum:forum_index")
+        )
+
+        # then
+        self.assertEqual(first=res_mark_all.status_code, second=HTTPStatus.FOUND)
+        self.assertEqual(
+            first=list(
+                BoardReadWatermark.objects.filter(user=self.user_1001).values_list(
+                    "board", flat=True
+                )
+            ),
+            second=[self.board_1.pk],
+        )
+        self.assertNotContains(
+            response=res_after_mark_all, text=f"aa-forum-unread-in-{self.board_1.pk}"
+        )
+        self.assertNotContains(
+            response=res_after_mark_all, text=f"aa-forum-unread-in-{self.board_2.pk}"
+        )
+        self.assertNotContains(
+            response=res_after_new_post, text=f"aa-forum-unread-in-{self.board_1.pk}"
+        )
+        self.assertContains(
+            response=res_after_new_post, text=f"aa-forum-unread-in-{self.board_2.pk}"
+        )
+
+    def test_should_mark_all_as_read_in_constant_number_of_queries(self):
+        """
+        Test should mark all topics as read with the same number of queries,
+        no matter how many boards and topics are unread
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user_1001)
+        url = reverse(viewname="aa_forum:forum_mark_all_as_read")
+
+        with CaptureQueriesContext(connection=connection) as few_unread:
+            self.client.get(path=url)
+
+        BoardReadWatermark.objects.all().delete()
+
+        for num in range(5):
+            board = Board.objects.create(name=f"Board {num}", category=self.category)
+
+            for topic_num in range(3):
+                topic = Topic.objects.create(subject=f"Topic {topic_num}", board=board)
+                create_fake_messages(topic=topic, amount=2)
+
+        # when
+        with CaptureQueriesContext(connection=connection) as many_unread:
+            self.client.get(path=url)
+
+        # then
+        self.assertEqual(first=len(many_unread), second=len(few_unread))
+        self.assertEqual(
+            first=BoardReadWatermark.objects.filter(user=self.user_1001).count(),
+            second=6,
+        )
+        self.assertFalse(Topic.objects.unread(user=self.user_1001).exists())
+
     def test_should_show_counts(self):
         """
         Test should show counts
@@ -640,6 +737,158 @@ class TestBoardViews(BaseTestCase):
         # then
         self.assertEqual(first=res.status_code, second=HTTPStatus.NOT_FOUND)
 
+    @patch(f"{VIEWS_PATH}.Setting.objects.get_setting")
+    def test_should_only_show_and_annotate_the_topics_of_the_requested_page(
+        self, mock_get_setting
+    ):
+        """
+        Test should only show the topics of the requested page, with their
+        number of posts and unread state
+
+        :param mock_get_setting:
+        :type mock_get_setting:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_get_setting.return_value = 1
+        self.client.force_login(user=self.user_1001)
+
+        # when
+        res_page_1 = self.client.get(
+            path=reverse(
+                viewname="aa_forum:forum_board",
+                args=[self.category.slug, self.board.slug],
+            )
+        )
+        res_page_2 = self.client.get(
+            path=reverse(
+                viewname="aa_forum:forum_board",
+                args=[self.category.slug, self.board.slug, 2],
+            )
+        )
+
+        # then
+        self.assertEqual(first=res_page_1.status_code, second=HTTPStatus.OK)
+        self.assertEqual(first=res_page_2.status_code, second=HTTPStatus.OK)
+
+        topics_page_1 = list(res_page_1.context["page_obj"])
+        topics_page_2 = list(res_page_2.context["page_obj"])
+
+        self.assertListEqual(list1=topics_page_1, list2=[self.topic_2])
+        self.assertEqual(first=topics_page_1[0].message_count, second=9)
+        self.assertFalse(expr=topics_page_1[0].has_unread_messages)
+        self.assertListEqual(list1=topics_page_2, list2=[self.topic_1])
+        self.assertEqual(first=topics_page_2[0].message_count, second=15)
+        self.assertTrue(expr=topics_page_2[0].has_unread_messages)
+
+    @patch(f"{VIEWS_PATH}.Setting.objects.get_setting")
+    def test_should_show_sticky_topics_first(self, mock_get_setting):
+        """
+        Test should show sticky topics first, also after the order changed
+
+        :param mock_get_setting:
+        :type mock_get_setting:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_get_setting.return_value = 1
+        self.client.force_login(user=self.user_1001)
+        path_page_2 = reverse(
+            viewname="aa_forum:forum_board",
+            args=[self.category.slug, self.board.slug, 2],
+        )
+        self.client.get(path=path_page_2)
+        self.topic_1.is_sticky = True
+        self.topic_1.save()
+
+        # when
+        res = self.client.get(path=path_page_2)
+
+        # then
+        self.assertEqual(first=res.status_code, second=HTTPStatus.OK)
+        self.assertListEqual(list1=list(res.context["page_obj"]), list2=[self.topic_2])
+
+    @patch(f"{VIEWS_PATH}.Setting.objects.get_setting")
+    def test_should_show_sticky_topics_first_after_sticky_state_changed(
+        self, mock_get_setting
+    ):
+        """
+        Test should show sticky topics first, when only the sticky state of
+        a topic was saved
+
+        :param mock_get_setting:
+        :type mock_get_setting:
+        :return:
+        :rtype:
+        """
+
+        # given
+        mock_get_setting.return_value = 1
+        self.client.force_login(user=self.user_1001)
+        path_page_1 = reverse(
+            viewname="aa_forum:forum_board", args=[self.category.slug, self.board.slug]
+        )
+        path_page_2 = reverse(
+            viewname="aa_forum:forum_board",
+            args=[self.category.slug, self.board.slug, 2],
+        )
+        self.client.get(path=path_page_2)
+        self.topic_1.is_sticky = True
+        self.topic_1.save(update_fields=["is_sticky"])
+
+        # when
+        res_page_1 = self.client.get(path=path_page_1)
+        res_page_2 = self.client.get(path=path_page_2)
+
+        # then
+        self.assertListEqual(
+            list1=list(res_page_1.context["page_obj"]), list2=[self.topic_1]
+        )
+        self.assertListEqual(
+            list1=list(res_page_2.context["page_obj"]), list2=[self.topic_2]
+        )
+
+    def test_should_count_topics_without_scanning_them(self):
+        """
+        Test should count the topics of a board from its counters, without
+        the topics of its child boards and without an aggregate over its topics
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        child_board = Board.objects.create(
+            name="Thermodynamics", category=self.category, parent_board=self.board
+        )
+        child_topic = Topic.objects.create(subject="Entropy", board=child_board)
+        create_fake_messages(topic=child_topic, amount=1)
+        self.client.force_login(user=self.user_1001)
+
+        # when
+        with CaptureQueriesContext(connection=connection) as queries:
+            res = self.client.get(
+                path=reverse(
+                    viewname="aa_forum:forum_board",
+                    args=[self.category.slug, self.board.slug],
+                )
+            )
+
+        # then
+        self.assertEqual(first=res.status_code, second=HTTPStatus.OK)
+        self.assertEqual(first=res.context["page_obj"].paginator.count, second=2)
+        self.assertFalse(
+            any(
+                'SUM("aa_forum_topic".' in query["sql"]
+                or 'SELECT COUNT("aa_forum_topic"."id")' in query["sql"]
+                for query in queries.captured_queries
+            )
+        )
+
     def test_should_return_board_does_not_exist_for_wrong_board_on_board_view(self):
         """
         Test should return "Board does not exist" for wrong board
@@ -863,6 +1112,87 @@ class TestTopicViews(BaseTestCase):
             first=last_message_seen.message_time, second=last_message.time_posted
         )
 
+    def test_should_only_load_the_messages_of_the_requested_page(self):
+        """
+        Test should only load the messages of the requested page
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user_1001)
+
+        # when
+        res = self.client.get(
+            path=reverse(
+                viewname="aa_forum:forum_topic",
+                args=[self.category.slug, self.board.slug, self.topic.slug, 2],
+            )
+        )
+
+        # then
+        self.assertEqual(first=res.status_code, second=HTTPStatus.OK)
+        page_obj = res.context["page_obj"]
+        expected_messages = list(self.topic.messages.order_by("time_posted")[5:10])
+        self.assertListEqual(list1=list(page_obj), list2=expected_messages)
+        self.assertEqual(first=page_obj.paginator.count, second=15)
+
+    def test_should_show_topic_in_constant_number_of_queries(self):
+        """
+        Test should show a page of a topic with the same number of queries,
+        no matter how many messages are on it, and without DISTINCT
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user_1001)
+        other_topic = Topic.objects.create(subject="Secrets", board=self.board)
+        create_fake_messages(topic=other_topic, amount=1)
+        # Cache the visible boards and mark both topics as seen
+        for topic in (self.topic, other_topic):
+            self.client.get(path=topic.get_absolute_url())
+
+        with CaptureQueriesContext(connection=connection) as one_message:
+            self.client.get(path=other_topic.get_absolute_url())
+
+        # when
+        with CaptureQueriesContext(connection=connection) as full_page:
+            res = self.client.get(path=self.topic.get_absolute_url())
+
+        # then
+        self.assertEqual(first=res.status_code, second=HTTPStatus.OK)
+        self.assertGreater(a=len(res.context["page_obj"]), b=1)
+        self.assertEqual(first=len(full_page), second=len(one_message))
+        self.assertFalse(
+            any("DISTINCT" in query["sql"] for query in full_page.captured_queries)
+        )
+
+    def test_should_find_message_without_distinct(self):
+        """
+        Test should find a message by its ID without DISTINCT
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user_1001)
+        message = self.topic.messages.order_by("time_posted")[7]
+        self.client.get(path=self.topic.get_absolute_url())
+
+        # when
+        with CaptureQueriesContext(connection=connection) as queries:
+            res = self.client.get(path=message.get_absolute_url())
+
+        # then
+        self.assertEqual(first=res.status_code, second=HTTPStatus.OK)
+        self.assertFalse(
+            any("DISTINCT" in query["sql"] for query in queries.captured_queries)
+        )
+
     def test_should_remember_last_message_seen_by_user_when_opening_previous_pages(
         self,
     ):
@@ -961,6 +1291,43 @@ class TestTopicViews(BaseTestCase):
             response=res, expected_url=first_unseen_message.get_absolute_url()
         )
 
+    def test_should_redirect_to_first_message_after_board_read_watermark(self):
+        """
+        Test should redirect to the first message after the read watermark
+        of the board, when it is newer than the last message seen
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user_1001)
+        messages_sorted = list(self.topic.messages.order_by("time_posted"))
+        LastMessageSeen.objects.create(
+            topic=self.topic,
+            user=self.user_1001,
+            message_time=messages_sorted[1].time_posted,
+        )
+        BoardReadWatermark.objects.create(
+            board=self.board,
+            user=self.user_1001,
+            read_until=messages_sorted[3].time_posted,
+        )
+
+        # when
+        res = self.client.get(
+            path=reverse(
+                viewname="aa_forum:forum_topic_first_unread_message",
+                args=[self.category.slug, self.board.slug, self.topic.slug],
+            )
+        )
+
+        # then
+        self.assertEqual(first=res.status_code, second=HTTPStatus.FOUND)
+        self.assertRedirects(
+            response=res, expected_url=messages_sorted[4].get_absolute_url()
+        )
+
     def test_should_redirect_to_first_unseen_message_when_last_seen_message_deleted(
         self,
     ):
@@ -1028,6 +1395,38 @@ class TestTopicViews(BaseTestCase):
             response=res, expected_url=last_seen_message.get_absolute_url()
         )
 
+    def test_should_redirect_to_first_unread_message_without_loading_it(self):
+        """
+        Test should build the URL of the first unread message from the slugs,
+        without loading the message, its topic, board and category one by one
+
+        :return:
+        :rtype:
+        """
+
+        # given
+        self.client.force_login(user=self.user_1001)
+        first_message = self.topic.messages.order_by("time_posted").first()
+        path = reverse(
+            viewname="aa_forum:forum_topic_first_unread_message",
+            args=[self.category.slug, self.board.slug, self.topic.slug],
+        )
+        self.client.get(path=path)
+
+        # when
+        with CaptureQueriesContext(connection=connection) as queries:
+            res = self.client.get(path=path)
+
+        # then
+        self.assertEqual(first=res.url, second=first_message.get_absolute_url())
+        message_queries = [
+            query["sql"]
+            for query in queries
+            if 'FROM "aa_forum_message"' in query["sql"]
+            and '"aa_forum_message"."message"' in query["sql"]
+        ]
+        self.assertListEqual(list1=message_queries, list2=[])
+
     def test_should_redirect_to_message_by_id_first_page(self):
         """
         Test should redirect to message by ID on the first page
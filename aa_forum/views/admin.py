@@ -300,6 +300,9 @@ def board_create(request: WSGIRequest, category_id: int) -> HttpResponseRedirect
                 category=board_category,
                 discord_webhook=discord_webhook,
                 use_webhook_for_replies=form.cleaned_data["use_webhook_for_replies"],
+                discord_webhook_reply_window=form.cleaned_data[
+                    "discord_webhook_reply_window"
+                ],
                 is_announcement_board=form.cleaned_data["is_announcement_board"],
                 order=DEFAULT_CATEGORY_AND_BOARD_SORT_ORDER,
             )
@@ -362,6 +365,9 @@ def board_create_child(
                 description=form.cleaned_data["description"],
                 discord_webhook=discord_webhook,
                 use_webhook_for_replies=form.cleaned_data["use_webhook_for_replies"],
+                discord_webhook_reply_window=form.cleaned_data[
+                    "discord_webhook_reply_window"
+                ],
                 parent_board=parent_board,
                 category=parent_board.category,
                 order=DEFAULT_CATEGORY_AND_BOARD_SORT_ORDER,
@@ -424,6 +430,9 @@ def board_edit(
             board.description = form.cleaned_data["description"]
             board.discord_webhook = discord_webhook
             board.use_webhook_for_replies = form.cleaned_data["use_webhook_for_replies"]
+            board.discord_webhook_reply_window = form.cleaned_data[
+                "discord_webhook_reply_window"
+            ]
             board.groups.set(form.cleaned_data["groups"])
             board.is_announcement_board = form.cleaned_data["is_announcement_board"]
             board.announcement_groups.set(form.cleaned_data["announcement_groups"])
@@ -6,21 +6,36 @@ Forum views
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.core.handlers.wsgi import WSGIRequest
-from django.db.models import Count, Exists, OuterRef, Prefetch, Q
+from django.db.models import Prefetch, Sum
 from django.http import HttpResponse, HttpResponseNotFound, HttpResponseRedirect
 from django.shortcuts import redirect, render
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext as _
 
 # Alliance Auth
+from allianceauth.authentication.models import User
 from allianceauth.groupmanagement.models import Group
 from allianceauth.services.hooks import get_extension_logger
 
 # AA Forum
 from aa_forum.forms import EditMessageForm, EditTopicForm, NewTopicForm
+from aa_forum.helper.board_topics import get_board_topics_version
 from aa_forum.helper.discord_messages import send_message_to_discord_webhook
-from aa_forum.helper.pagination import get_paginated_page_object
-from aa_forum.models import Board, Category, LastMessageSeen, Message, Setting, Topic
+from aa_forum.helper.pagination import get_keyset_paginated_page_object
+from aa_forum.helper.unread_topics import (
+    get_unread_topics_count,
+    invalidate_unread_topics_count,
+)
+from aa_forum.models import (
+    Board,
+    BoardReadWatermark,
+    Category,
+    LastMessageSeen,
+    Message,
+    Setting,
+    Topic,
+)
 from aa_forum.providers.applogger import AppLogger
 
 logger = AppLogger(my_logger=get_extension_logger(name=__name__))
@@ -38,15 +53,6 @@ def index(request: WSGIRequest) -> HttpResponse:
     :rtype:
     """
 
-    has_read_all_messages = LastMessageSeen.objects.filter(
-        topic=OuterRef("pk"),
-        user=request.user,
-        message_time__gte=OuterRef("last_message__time_posted"),
-    )
-    unread_topic_pks = Topic.objects.filter(
-        ~Exists(queryset=has_read_all_messages)
-    ).values_list("pk", flat=True)
-
     boards = (
         Board.objects.select_related(
             "category",
@@ -68,15 +74,6 @@ def index(request: WSGIRequest) -> HttpResponse:
                     "first_message__user_created",
                     "first_message__user_created__profile__main_character",
                 )
-                .annotate(
-                    num_posts=Count(expression="topics__messages", distinct=True),
-                    num_topics=Count(expression="topics", distinct=True),
-                    num_unread=Count(
-                        expression="topics",
-                        filter=Q(topics__in=unread_topic_pks),
-                        distinct=True,
-                    ),
-                )
                 .user_has_access(user=request.user)
                 .order_by("order", "pk"),
             )
@@ -84,20 +81,11 @@ def index(request: WSGIRequest) -> HttpResponse:
         .prefetch_related(
             Prefetch(lookup="groups", queryset=Group.objects.order_by("name"))
         )
-        .prefetch_related("topics")
         .user_has_access(user=request.user)
         .filter(parent_board__isnull=True)
-        .annotate(
-            num_posts=Count(expression="topics__messages", distinct=True),
-            num_topics=Count(expression="topics", distinct=True),
-            num_unread=Count(
-                expression="topics",
-                filter=Q(topics__in=unread_topic_pks),
-                distinct=True,
-            ),
-        )
         .order_by("category__order", "category__pk", "order", "pk")
     )
+    _add_unread_counts(boards=boards, user=request.user)
 
     categories_map = {}
 
@@ -124,6 +112,63 @@ def index(request: WSGIRequest) -> HttpResponse:
     )
 
 
+def _add_unread_counts(boards, user: User, child_boards: bool = True) -> None:
+    """
+    Add the number of unread topics (`num_unread`) to the given boards
+    and their (prefetched) child boards
+
+    :param boards:
+    :type boards:
+    :param user:
+    :type user:
+    :param child_boards:
+    :type child_boards:
+    :return:
+    :rtype:
+    """
+
+    boards = list(boards)
+
+    if child_boards:
+        boards += [
+            child_board
+            for board_in_loop in boards
+            for child_board in board_in_loop.child_boards.all()
+        ]
+
+    unread_count_per_board = Topic.objects.filter(
+        board__in=[board_in_loop.pk for board_in_loop in boards]
+    ).unread_count_per_board(user=user)
+
+    for board_in_loop in boards:
+        board_in_loop.num_unread = unread_count_per_board.get(board_in_loop.pk, 0)
+
+
+def _annotate_topics_on_page(topics: list, user: User) -> None:
+    """
+    Add the unread state to the topics of a board page
+
+    This is done in a single query for the given topics only, instead of
+    annotating every topic of the board before paginating.
+
+    :param topics:
+    :type topics:
+    :param user:
+    :type user:
+    :return:
+    :rtype:
+    """
+
+    unread_topic_pks = set(
+        Topic.objects.filter(pk__in=[topic.pk for topic in topics])
+        .unread(user=user)
+        .values_list("pk", flat=True)
+    )
+
+    for topic in topics:
+        topic.has_unread_messages = topic.pk in unread_topic_pks
+
+
 @login_required
 @permission_required(perm="aa_forum.basic_access")
 def board(
@@ -144,15 +189,6 @@ def board(
     :rtype:
     """
 
-    has_read_all_messages = LastMessageSeen.objects.filter(
-        topic=OuterRef("pk"),
-        user=request.user,
-        message_time__gte=OuterRef("last_message__time_posted"),
-    )
-    unread_topic_pks = Topic.objects.filter(
-        ~Exists(queryset=has_read_all_messages)
-    ).values_list("pk", flat=True)
-
     try:
         current_board = (
             Board.objects.select_related("category")
@@ -175,39 +211,10 @@ def board(
                             lookup="groups", queryset=Group.objects.order_by("name")
                         )
                     )
-                    .prefetch_related("topics")
-                    .annotate(
-                        num_posts=Count(expression="topics__messages", distinct=True),
-                        num_topics=Count(expression="topics", distinct=True),
-                        num_unread=Count(
-                            expression="topics",
-                            filter=Q(topics__in=unread_topic_pks),
-                            distinct=True,
-                        ),
-                    )
                     .user_has_access(user=request.user)
                     .order_by("order", "pk"),
                 )
             )
-            .prefetch_related(
-                Prefetch(
-                    lookup="topics",
-                    queryset=Topic.objects.select_related(
-                        "last_message",
-                        "last_message__user_created",
-                        "last_message__user_created__profile__main_character",
-                        "first_message",
-                        "first_message__user_created",
-                        "first_message__user_created__profile__main_character",
-                    )
-                    .annotate(num_posts=Count(expression="messages", distinct=True))
-                    .annotate(
-                        has_unread_messages=~Exists(queryset=has_read_all_messages)
-                    )
-                    .order_by("-is_sticky", "-last_message__time_posted", "-id"),
-                    to_attr="topics_sorted",
-                )
-            )
             .prefetch_related(
                 Prefetch(
                     lookup="announcement_groups",
@@ -238,13 +245,36 @@ def board(
 
         return redirect(to="aa_forum:forum_index")
 
-    page_obj = get_paginated_page_object(
-        queryset=current_board.topics_sorted,
+    _add_unread_counts(
+        boards=current_board.child_boards.all(), user=request.user, child_boards=False
+    )
+
+    # Only the topics of the requested page are fetched and annotated.
+    # The counters of the board include its child boards, which may not all
+    # be visible to the user.
+    topic_count = current_board.topic_count - (
+        Board.objects.filter(parent_board=current_board).aggregate(
+            topic_count=Sum("topic_count")
+        )["topic_count"]
+        or 0
+    )
+    # The cache key changes whenever topics are added or removed, re-ordered by
+    # a new message, or otherwise (see `aa_forum.helper.board_topics`)
+    page_obj = get_keyset_paginated_page_object(
+        queryset=Topic.objects.get_topics_for_board(board=current_board),
+        ordering=("-is_sticky", "-last_message__time_posted", "-pk"),
+        cache_key=(
+            f"board:{current_board.pk}:{current_board.topic_count}:"
+            f"{current_board.last_message_id}:"
+            f"{get_board_topics_version(board_id=current_board.pk)}"
+        ),
         items_per_page=Setting.objects.get_setting(
             setting_key=Setting.Field.TOPICSPERPAGE
         ),
         page_number=page_number,
+        count=topic_count,
     )
+    _annotate_topics_on_page(topics=page_obj.object_list, user=request.user)
 
     context = {
         "board": current_board,
@@ -474,8 +504,11 @@ def topic(
     ):
         can_modify_subject = True
 
-    page_obj = get_paginated_page_object(
-        queryset=current_topic.messages_sorted,
+    # Only the messages of the requested page are fetched from the database
+    page_obj = get_keyset_paginated_page_object(
+        queryset=Message.objects.get_messages_for_topic(topic=current_topic),
+        ordering=("time_posted", "pk"),
+        cache_key=f"topic:{current_topic.pk}:{current_topic.last_message_id}",
         items_per_page=Setting.objects.get_setting(
             setting_key=Setting.Field.MESSAGESPERPAGE
         ),
@@ -484,7 +517,9 @@ def topic(
 
     # Set this topic as "read by" by the current user
     try:
-        last_message_on_page = page_obj.object_list[-1]
+        # Indexing the page (not its sliced queryset) evaluates the page once,
+        # the template will re-use the result
+        last_message_on_page = page_obj[-1]
     except IndexError:
         pass
     else:
@@ -504,6 +539,7 @@ def topic(
                 user=request.user,
                 defaults={"message_time": last_message_on_page.time_posted},
             )
+            invalidate_unread_topics_count(user=request.user)
 
     context = {
         "topic": current_topic,
@@ -707,22 +743,35 @@ def topic_first_unread_message(
 
     messages_sorted = current_topic.messages.order_by("time_posted")
 
-    try:
-        last_message_seen = LastMessageSeen.objects.filter(
-            topic=current_topic, user=request.user
-        ).get()
-    except LastMessageSeen.DoesNotExist:
-        redirect_message = messages_sorted.first()
+    # The topic has been read up to the last message seen in it,
+    # or up to the read watermark of its board, whichever is newer
+    read_until = max(
+        [
+            *LastMessageSeen.objects.filter(
+                topic=current_topic, user=request.user
+            ).values_list("message_time", flat=True),
+            *BoardReadWatermark.objects.filter(
+                board_id=current_topic.board_id, user=request.user
+            ).values_list("read_until", flat=True),
+        ],
+        default=None,
+    )
+
+    if read_until is None:
+        unread_messages = messages_sorted
     else:
-        redirect_message = messages_sorted.filter(
-            time_posted__gt=last_message_seen.message_time
-        ).first()
+        unread_messages = messages_sorted.filter(time_posted__gt=read_until)
+
+    redirect_message_id = unread_messages.values_list("pk", flat=True).first()
 
-        if not redirect_message:
-            redirect_message = messages_sorted.last()
+    if redirect_message_id is None:
+        redirect_message_id = messages_sorted.values_list("pk", flat=True).last()
 
-    if redirect_message:
-        return redirect(to=redirect_message.get_absolute_url())
+    if redirect_message_id is not None:
+        # The URL is built from the slugs, without loading the message
+        permalinks = Message.objects.filter(pk=redirect_message_id).permalinks()
+
+        return redirect(to=permalinks[redirect_message_id])
 
     return redirect(to=current_topic.get_absolute_url())
 
@@ -737,15 +786,7 @@ def _get_boards_with_unread_topics(request: WSGIRequest):
     :rtype:
     """
 
-    has_read_all_messages = LastMessageSeen.objects.filter(
-        topic=OuterRef("pk"),
-        user=request.user,
-        message_time__gte=OuterRef("last_message__time_posted"),
-    )
-    unread_topic_pks = Topic.objects.filter(
-        ~Exists(queryset=has_read_all_messages)
-    ).values_list("pk", flat=True)
-
+    unread_topics = Topic.objects.unread(user=request.user)
     boards = (
         Board.objects.select_related(
             "category",
@@ -765,17 +806,15 @@ def _get_boards_with_unread_topics(request: WSGIRequest):
                     "first_message__user_created",
                     "first_message__user_created__profile__main_character",
                 )
-                .filter(pk__in=unread_topic_pks)
-                .annotate(num_posts=Count(expression="messages", distinct=True))
-                .annotate(has_unread_messages=~Exists(queryset=has_read_all_messages))
+                .unread(user=request.user)
+                .annotate_unread_state(user=request.user)
                 .order_by("-is_sticky", "-last_message__time_posted", "-pk"),
             )
         )
-        .filter(topics__in=unread_topic_pks)
+        .filter(pk__in=unread_topics.values("board"))
         .user_has_access(user=request.user)
         .order_by("category__order", "category__pk", "order", "pk")
         .all()
-        .distinct()
     )
 
     return boards
@@ -894,6 +933,7 @@ def topic_reply(
                     topic=current_topic,
                     message=new_message,
                     headline=f'**New reply has been posted in topic "{current_topic.subject}"**',
+                    coalesce=True,
                 )
 
             logger.info(
@@ -1429,33 +1469,23 @@ def mark_all_as_read(request: WSGIRequest) -> HttpResponseRedirect:
     :rtype:
     """
 
-    has_read_all_messages = LastMessageSeen.objects.filter(
-        topic=OuterRef("pk"),
-        user=request.user,
-        message_time__gte=OuterRef("last_message__time_posted"),
+    # All topics with messages up to now are read, newer messages are unread again
+    read_until = timezone.now()
+
+    # Only boards with unread topics need a (new) watermark
+    unread_board_ids = list(
+        Topic.objects.user_has_access(user=request.user)
+        .unread(user=request.user)
+        .order_by()
+        .values_list("board", flat=True)
+        .distinct()
     )
 
-    boards = (
-        Board.objects.prefetch_related(
-            Prefetch(
-                lookup="topics",
-                queryset=Topic.objects.select_related(
-                    "last_message",
-                ).annotate(has_unread_messages=~Exists(queryset=has_read_all_messages)),
-            )
-        )
-        .user_has_access(user=request.user)
-        .all()
+    BoardReadWatermark.set_read_until(
+        user=request.user, board_ids=unread_board_ids, read_until=read_until
     )
 
-    if boards.count() > 0:
-        for board_in_loop in boards:
-            for topic_in_loop in board_in_loop.topics.all():
-                LastMessageSeen.objects.update_or_create(
-                    topic=topic_in_loop,
-                    user=request.user,
-                    defaults={"message_time": topic_in_loop.last_message.time_posted},
-                )
+    invalidate_unread_topics_count(user=request.user)
 
     logger.info(msg=f"{request.user} marked all topics as read.")
 
@@ -1474,31 +1504,4 @@ def unread_topics_count(request: WSGIRequest) -> int:
     :rtype:
     """
 
-    has_read_all_messages = LastMessageSeen.objects.filter(
-        topic=OuterRef("pk"),
-        user=request.user,
-        message_time__gte=OuterRef("last_message__time_posted"),
-    )
-    unread_topic_pks = Topic.objects.filter(
-        ~Exists(queryset=has_read_all_messages)
-    ).values_list("pk", flat=True)
-
-    boards = (
-        Board.objects.annotate(
-            num_unread_topics=Count(
-                expression="topics",
-                filter=Q(topics__in=unread_topic_pks),
-                distinct=True,
-            ),
-        )
-        .user_has_access(user=request.user)
-        .all()
-    )
-
-    count_unread_topics = 0
-
-    if boards.count() > 0:
-        for board_in_loop in boards:
-            count_unread_topics += board_in_loop.num_unread_topics
-
-    return count_unread_topics
+    return get_unread_topics_count(user=request.user)
@@ -10,17 +10,21 @@ from http import HTTPStatus
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.core.handlers.wsgi import WSGIRequest
+from django.db.models import Count, Max
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext as _
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import etag
 
 # Alliance Auth
 from allianceauth.services.hooks import get_extension_logger
 
 # AA Forum
 from aa_forum.forms import NewPersonalMessageForm, ReplyPersonalMessageForm
-from aa_forum.helper.pagination import get_paginated_page_object
+from aa_forum.helper.pagination import get_keyset_paginated_page_object
+from aa_forum.helper.personal_messages import get_personal_messages_unread_count
 from aa_forum.helper.user import get_main_character_from_user
 from aa_forum.models import PersonalMessage, Setting
 from aa_forum.providers.applogger import AppLogger
@@ -47,13 +51,18 @@ def inbox(request: WSGIRequest, page_number: int = None) -> HttpResponse:
     personal_messages = PersonalMessage.objects.get_personal_messages_for_user(
         user=request.user
     )
+    # The newest message identifies the state of the folder for the paginator
+    folder_state = personal_messages.aggregate(count=Count("pk"), newest=Max("pk"))
 
-    page_obj = get_paginated_page_object(
+    page_obj = get_keyset_paginated_page_object(
         queryset=personal_messages,
+        ordering=("-time_sent", "-pk"),
+        cache_key=f"personal_messages_inbox:{request.user.pk}:{folder_state['newest']}",
         items_per_page=Setting.objects.get_setting(
             setting_key=Setting.Field.MESSAGESPERPAGE
         ),
         page_number=page_number,
+        count=folder_state["count"],
     )
 
     context = {"page_obj": page_obj}
@@ -152,13 +161,18 @@ def sent_messages(request: WSGIRequest, page_number: int = None) -> HttpResponse
     personal_messages = PersonalMessage.objects.get_personal_messages_sent_for_user(
         user=request.user
     )
+    # The newest message identifies the state of the folder for the paginator
+    folder_state = personal_messages.aggregate(count=Count("pk"), newest=Max("pk"))
 
-    page_obj = get_paginated_page_object(
+    page_obj = get_keyset_paginated_page_object(
         queryset=personal_messages,
+        ordering=("-time_sent", "-pk"),
+        cache_key=f"personal_messages_sent:{request.user.pk}:{folder_state['newest']}",
         items_per_page=Setting.objects.get_setting(
             setting_key=Setting.Field.MESSAGESPERPAGE
         ),
         page_number=page_number,
+        count=folder_state["count"],
     )
 
     context = {"page_obj": page_obj}
@@ -437,8 +451,26 @@ def ajax_read_message(request: WSGIRequest, folder: str) -> HttpResponse:
     )
 
 
+def _unread_messages_count_etag(request: WSGIRequest) -> str:
+    """
+    ETag for the number of unread messages of a user, so polling clients get a
+    "304 Not Modified" without a database query as long as the number is the same
+
+    :param request:
+    :type request:
+    :return:
+    :rtype:
+    """
+
+    unread_messages_count = get_personal_messages_unread_count(user=request.user)
+
+    return f"{request.user.pk}-{unread_messages_count}"
+
+
 @login_required
 @permission_required("aa_forum.basic_access")
+@cache_control(private=True, no_cache=True)
+@etag(etag_func=_unread_messages_count_etag)
 def ajax_unread_messages_count(request: WSGIRequest) -> JsonResponse:
     """
     Get the number of unread messages for a user
@@ -449,11 +481,7 @@ def ajax_unread_messages_count(request: WSGIRequest) -> JsonResponse:
     :rtype:
     """
 
-    unread_messages_count = (
-        PersonalMessage.objects.get_personal_message_unread_count_for_user(
-            user=request.user
-        )
-    )
+    unread_messages_count = get_personal_messages_unread_count(user=request.user)
 
     data = {"unread_messages_count": unread_messages_count}
 
@@ -2,14 +2,9 @@
 Search views
 """
 
-# Standard Library
-from functools import reduce
-from operator import or_
-
 # Django
 from django.contrib.auth.decorators import login_required, permission_required
 from django.core.handlers.wsgi import WSGIRequest
-from django.db.models import Q
 from django.http import HttpResponse
 from django.shortcuts import render
 
@@ -17,10 +12,11 @@ from django.shortcuts import render
 from allianceauth.services.hooks import get_extension_logger
 
 # AA Forum
-from aa_forum.constants import SEARCH_STOPWORDS
-from aa_forum.helper.pagination import get_paginated_page_object
-from aa_forum.models import Board, Message, Setting
+from aa_forum.app_settings import AA_FORUM_SEARCH_RESULTS_COUNT_LIMIT
+from aa_forum.helper.pagination import count_with_limit, get_paginated_page_object
+from aa_forum.models import Message, Setting
 from aa_forum.providers.applogger import AppLogger
+from aa_forum.search.backends import get_search_backend
 
 logger = AppLogger(my_logger=get_extension_logger(name=__name__))
 
@@ -44,31 +40,19 @@ def results(request: WSGIRequest, page_number: int = None) -> HttpResponse:
     else:
         search_phrase = ""
 
-    search_results = None
     page_obj = None
+    search_results_count = 0
+    search_results_count_capped = False
 
-    querywords = search_phrase.split()
-    search_phrase_terms = [
-        word for word in querywords if word.lower() not in SEARCH_STOPWORDS
-    ]
+    search_backend = get_search_backend()
+    search_phrase_terms = search_backend.search_terms(query=search_phrase)
 
     if len(search_phrase_terms) >= 1:
-        boards = (
-            Board.objects.user_has_access(user=request.user)
-            .distinct()
-            .values_list("pk", flat=True)
-        )
-
+        # Results only show a snippet of the plain text, not the whole message
         search_results = (
-            Message.objects.filter(
-                reduce(
-                    or_,
-                    [
-                        Q(message_plaintext__icontains=search_term)
-                        for search_term in search_phrase_terms
-                    ],
-                ),
-                topic__board__pk__in=boards,
+            search_backend.search(
+                queryset=Message.objects.user_has_access(user=request.user),
+                query=search_phrase,
             )
             .select_related(
                 "user_created",
@@ -78,22 +62,43 @@ def results(request: WSGIRequest, page_number: int = None) -> HttpResponse:
                 "topic__board",
                 "topic__board__category",
             )
-            .order_by("-time_modified")
-            .distinct()
+            .defer(
+                "message",
+                "discord_excerpt",
+                "topic__first_message__message",
+                "topic__first_message__message_plaintext",
+                "topic__first_message__discord_excerpt",
+            )
         )
 
+        # Counted once, for the paginator and the template
+        search_results_count, search_results_count_capped = count_with_limit(
+            queryset=search_results, limit=AA_FORUM_SEARCH_RESULTS_COUNT_LIMIT
+        )
+        search_results_count_capped |= search_backend.results_capped
+
         page_obj = get_paginated_page_object(
             queryset=search_results,
             items_per_page=Setting.objects.get_setting(
                 setting_key=Setting.Field.MESSAGESPERPAGE
             ),
             page_number=page_number,
+            count=search_results_count,
         )
 
+        # Link the results directly to their page in the topic
+        permalinks = Message.objects.filter(
+            pk__in=[message.pk for message in page_obj]
+        ).permalinks()
+
+        for message in page_obj:
+            message.permalink = permalinks[message.pk]
+
     context = {
         "search_term": search_phrase,
         "search_results": page_obj,
-        "search_results_count": 0 if search_results is None else search_results.count(),
+        "search_results_count": search_results_count,
+        "search_results_count_capped": search_results_count_capped,
     }
 
     logger.info(